@@ -0,0 +1,185 @@
+"""Benchmark of the consumer hot path.
+
+Measures the bars per second going from Kafka messages to the data frames
+written to the feature store, replaying a synthetic historical topic of bars
+from memory, without a Kafka broker or a feature store. Compares consuming
+and decoding the bars one message at a time into a list of dictionaries with
+the batched, columnar path of `PublishToFeatureStore`.
+
+Usage: python src/benchmark_bars.py [n_bars] [buffer_size] [batch_size]
+"""
+
+import json
+import random
+import sys
+import time
+from collections.abc import Callable
+
+import pandas as pd
+
+from hopswork.hopswork_api import bars_to_frame
+from monitoring.pipeline_metrics import EMITTED_AT, LAST_TRADE_TIME
+from utils.bar_columns import BarColumns
+from utils.kafka_batches import poll_batch
+from utils.wire_format import WIRE_FORMATS, decode, encode
+
+
+class ReplayMessage:
+    """Kafka message of the replayed topic."""
+
+    def __init__(self, value: bytes, offset: int) -> None:
+        """Initialize the message."""
+        self._value = value
+        self._offset = offset
+
+    def value(self) -> bytes:
+        """Return the value of the message."""
+        return self._value
+
+    def error(self) -> None:
+        """Return the error of the message, always None."""
+        return None
+
+    def topic(self) -> str:
+        """Return the topic of the message."""
+        return "bars_historical"
+
+    def partition(self) -> int:
+        """Return the partition of the message."""
+        return 0
+
+    def offset(self) -> int:
+        """Return the offset of the message."""
+        return self._offset
+
+
+class ReplayConsumer:
+    """Consumer replaying the messages of a topic held in memory."""
+
+    def __init__(self, values: list[bytes]) -> None:
+        """Initialize the consumer with the values of the topic."""
+        self._messages = [
+            ReplayMessage(value, offset) for offset, value in enumerate(values)
+        ]
+        self._position = 0
+
+    def poll(self, timeout: float) -> ReplayMessage | None:
+        """Return the next message, or None at the end of the topic."""
+        if self._position == len(self._messages):
+            return None
+        self._position += 1
+        return self._messages[self._position - 1]
+
+
+def synthetic_bars(n_bars: int) -> list[dict]:
+    """Build tick imbalance bars of a few products, one minute apart."""
+    product_ids = ("BTC/USD", "ETH/USD", "LTC/USD", "XRP/USD")
+    start_ms = 1_700_000_000_000
+    bars = []
+    for i in range(n_bars):
+        price = 60_000 + random.random() * 100
+        bars.append(
+            {
+                "product_id": product_ids[i % len(product_ids)],
+                "open": price,
+                "high": price + 10,
+                "low": price - 10,
+                "close": price + 1,
+                "volume": round(random.random() * 10, 4),
+                "start_time": start_ms + i * 60_000,
+                "end_time": start_ms + (i + 1) * 60_000,
+                "tick_imbalance": random.randint(-50, 50),
+                "ticks": random.randint(1, 500),
+                "cumulative_trade_amount": round(random.random() * 1e6, 4),
+                LAST_TRADE_TIME: start_ms + (i + 1) * 60_000,
+                EMITTED_AT: start_ms + (i + 1) * 60_000 + 5,
+            }
+        )
+    return bars
+
+
+def per_message(
+    consumer: ReplayConsumer, buffer_size: int, batch_size: int
+) -> int:
+    """Poll and decode the bars one at a time into a list of dictionaries."""
+    n_bars = 0
+    buffer: list[dict] = []
+    while (msg := consumer.poll(1)) is not None:
+        buffer.append(decode(msg.value()))
+        if len(buffer) >= buffer_size:
+            n_bars += len(legacy_frame(buffer))
+            buffer = []
+    if buffer:
+        n_bars += len(legacy_frame(buffer))
+    return n_bars
+
+
+def legacy_frame(buffer: list[dict]) -> pd.DataFrame:
+    """Build the frame of the bars from a list of dictionaries."""
+    for bar in buffer:
+        bar.pop(EMITTED_AT, None)
+        bar.pop(LAST_TRADE_TIME, None)
+    df = pd.DataFrame(buffer)
+    df["end_timestamp_unix"] = df["end_time"]
+    df["start_timestamp_unix"] = df["start_time"]
+    return df.assign(
+        start_time=pd.to_datetime(df["start_time"], unit="ms", utc=True),
+        end_time=pd.to_datetime(df["end_time"], unit="ms", utc=True),
+    )
+
+
+def batched(consumer: ReplayConsumer, buffer_size: int, batch_size: int) -> int:
+    """Poll the bars in batches and decode them into columns."""
+    n_bars = 0
+    buffer = BarColumns()
+    while messages := poll_batch(
+        consumer,  # type: ignore[arg-type]
+        min(batch_size, buffer_size - len(buffer)),
+        timeout=1,
+    ):
+        buffer.extend_messages([msg.value() for msg in messages])
+        if len(buffer) >= buffer_size:
+            n_bars += len(columnar_frame(buffer))
+            buffer = BarColumns()
+    if len(buffer):
+        n_bars += len(columnar_frame(buffer))
+    return n_bars
+
+
+def columnar_frame(buffer: BarColumns) -> pd.DataFrame:
+    """Build the frame of the bars from their columns."""
+    buffer.pop(EMITTED_AT)
+    buffer.pop(LAST_TRADE_TIME)
+    return bars_to_frame(buffer.columns)
+
+
+def benchmark(
+    run: Callable[[ReplayConsumer, int, int], int],
+    values: list[bytes],
+    buffer_size: int,
+    batch_size: int,
+) -> float:
+    """Return the bars per second read from the topic and framed."""
+    consumer = ReplayConsumer(values)
+    start = time.perf_counter()
+    n_bars = run(consumer, buffer_size, batch_size)
+    assert n_bars == len(values)
+    return n_bars / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    n_bars = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    buffer_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    bars = synthetic_bars(n_bars)
+    for wire_format in WIRE_FORMATS:
+        values = [
+            json.dumps(bar).encode() if wire_format == "json" else encode(bar)
+            for bar in bars
+        ]
+        for name, run in (("per-message", per_message), ("batched", batched)):
+            bars_per_sec = benchmark(run, values, buffer_size, batch_size)
+            print(
+                f"{wire_format:>6} {name:>11}: {bars_per_sec:,.0f} bars/s"
+                f" ({n_bars:,} bars, {buffer_size:,} per write)"
+            )
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+import hopsworks
+
+from utils.logging_config import logger
+
+# HTTP status of the requests rejected because the session is not valid
+SESSION_ERROR_STATUS_CODES = (401, 403)
+
+
+def is_session_error(error: Exception) -> bool:
+    """Return whether a call failed because its session is not valid.
+
+    The REST errors of Hopsworks carry the HTTP response of the request. A
+    request rejected for its session wrote nothing, so it is safe to retry.
+    """
+    response = getattr(error, "response", None)
+    status_code = getattr(response, "status_code", None)
+    return status_code in SESSION_ERROR_STATUS_CODES
+
+
+class FeatureStoreClient:
+    """Long-lived session to the Hopsworks feature store.
+
+    The client logs in once and keeps the feature group and feature view
+    handles for `handle_ttl_sec` seconds, so writing to the feature store is
+    a single insert call instead of several metadata round-trips. When a
+    call is rejected because the session expired, the session is dropped
+    and the call is retried once after logging in again. Other errors are
+    raised without retrying, since an insert that failed after reaching the
+    feature store may have been written.
+
+    The client is shared by the feature store writer threads: logging in,
+    fetching the handles and dropping the session are done under a lock, so
+    concurrent misses log in once, and a failed call only drops the session
+    it used, not the one another thread already logged in again with.
+
+    The login function is a parameter, so the client runs against any object
+    with the interface of a Hopsworks project (e.g. a local fake backend).
+    """
+
+    def __init__(
+        self,
+        project_name: str,
+        api_key: str,
+        handle_ttl_sec: float = 600,
+        login: Callable[..., Any] = hopsworks.login,
+    ) -> None:
+        """Initialize the client, without logging in yet.
+
+        Args:
+        ----
+        project_name (str): The Hopsworks project.
+        api_key (str): The API key of the project.
+        handle_ttl_sec (float): Seconds the feature group and feature view
+            handles are reused for before being fetched again.
+        login (Callable[..., Any]): Returns the project, called with the
+            `project` and `api_key_value` keyword arguments.
+
+        """
+        self.project_name = project_name
+        self.api_key = api_key
+        self.handle_ttl_sec = handle_ttl_sec
+        self._login = login
+        self._feature_store: Any | None = None
+        # Handles by key, with the time they were fetched at
+        self._handles: dict[tuple, tuple[Any, float]] = {}
+        # Reentrant, as handles are fetched from the feature store
+        self._lock = threading.RLock()
+        # Incremented by every reset of the session
+        self._session = 0
+
+    def feature_store(self) -> Any:
+        """Return the feature store of the project, logging in if needed."""
+        with self._lock:
+            if self._feature_store is None:
+                logger.info(
+                    f"Logging in to Hopsworks project {self.project_name}"
+                )
+                project = self._login(
+                    project=self.project_name, api_key_value=self.api_key
+                )
+                self._feature_store = project.get_feature_store()
+            return self._feature_store
+
+    def reset(self, session: int | None = None) -> None:
+        """Drop the session and the handles, so the next call logs in.
+
+        Args:
+        ----
+        session (int, optional): Only drop the session if it is still this
+            one. Any session is dropped if None.
+
+        """
+        with self._lock:
+            if session is not None and session != self._session:
+                return
+            self._feature_store = None
+            self._handles.clear()
+            self._session += 1
+
+    def _get_handle(self, key: tuple, fetch: Callable[[], Any]) -> Any:
+        """Return the cached handle of `key`, or fetch it if it expired."""
+        with self._lock:
+            cached = self._handles.get(key)
+            now = time.monotonic()
+            if cached is not None and now - cached[1] < self.handle_ttl_sec:
+                return cached[0]
+            handle = fetch()
+            self._handles[key] = (handle, now)
+            return handle
+
+    def feature_group(self, name: str, version: int, **kwargs) -> Any:
+        """Return a feature group, created with `kwargs` if it is missing.
+
+        Feature groups are cached by name, version and whether they are
+        online enabled.
+        """
+        return self._get_handle(
+            ("feature_group", name, version, kwargs.get("online_enabled")),
+            lambda: self.feature_store().get_or_create_feature_group(
+                name=name, version=version, **kwargs
+            ),
+        )
+
+    def feature_view(self, name: str, version: int, query: Any) -> Any:
+        """Return a feature view, created from `query` if it is missing."""
+        return self._get_handle(
+            ("feature_view", name, version),
+            lambda: self.feature_store().get_or_create_feature_view(
+                name=name, version=version, query=query
+            ),
+        )
+
+    def call(self, operation: Callable[["FeatureStoreClient"], Any]) -> Any:
+        """Run an operation on the client, logging in again if it is rejected.
+
+        Args:
+        ----
+        operation (Callable[[FeatureStoreClient], Any]): Gets its handles
+            from the client, so they are fetched again after a new login.
+
+        """
+        session = self._session
+        try:
+            return operation(self)
+        except Exception as e:
+            if not is_session_error(e):
+                raise
+            logger.warning(
+                f"Feature store call failed ({e}), logging in again."
+            )
+            self.reset(session)
+            return operation(self)
@@ -1,21 +1,24 @@
 import json
-from datetime import datetime, timezone
+from collections.abc import Callable
+from typing import Any
 
-import hopsworks
 import pandas as pd
 from hsfs.feature import Feature
 
-from settings.config import settings
+from hopswork.feature_store_client import FeatureStoreClient
+from utils.bar_windows import BarWindows
 from utils.logging_config import logger
 
 
 def push_data_to_feature_store(
+    client: FeatureStoreClient,
     feature_group_name: str,
     feature_group_version: int,
     feature_group_primary_keys: list[str],
     feature_group_event_time: str,
-    data: dict,
+    data: dict[str, list],
     online_offline: str,
+    bar_windows: BarWindows | None = None,
 ) -> None:
     """Read ohlc volume data and push it to feature store.
 
@@ -24,70 +27,107 @@ def push_data_to_feature_store(
 
     Args:
     ----
+    client (FeatureStoreClient): The session to the feature store.
     feature_group_name (str): The name of the feature group to write to.
     feature_group_version (int): The version of the feature group to write to.
     feature_group_primary_keys (List[str]): The primary key of the Feature Group
     feature_group_event_time (str): The event time of the Feature Group
-    data (dict): The data to write to the feature group.
+    data (dict[str, list]): The bars to write to the feature group, as one
+        list per field.
     online_offline (str): Whether we are saving the `data` to the online or
         offline feature group.
+    bar_windows (BarWindows, optional): The windows of the last bars of the
+        products, required to write to the online feature group.
 
     """
-    project = hopsworks.login(
-        project=settings.hopswork.project_name,
-        api_key_value=settings.hopswork.api_key,
-    )
-    fs = project.get_feature_store()
-    ohlc_feature_group = fs.get_or_create_feature_group(
-        name=feature_group_name,
-        version=feature_group_version,
-        description="OHLC data coming from Kraken/Coinbase",
-        primary_key=feature_group_primary_keys,
-        event_time=feature_group_event_time,
-        online_enabled=False,
-    )
+    df = bars_to_frame(data)
+    if online_offline == "offline":
+        client.call(
+            lambda c: c.feature_group(
+                feature_group_name,
+                feature_group_version,
+                description="OHLC data coming from Kraken/Coinbase",
+                primary_key=feature_group_primary_keys,
+                event_time=feature_group_event_time,
+                online_enabled=False,
+            ).insert(
+                df,
+                write_options={"start_offline_materialization": True},
+            )
+        )
+    else:
+        df["start_time"] = to_isoformat(df["start_time"])
+        df["end_time"] = to_isoformat(df["end_time"])
+        push_bars_to_online_feature_store(
+            client,
+            feature_group_name,
+            feature_group_version,
+            feature_group_primary_keys,
+            df.to_dict("records"),
+            bar_windows,
+        )
 
-    df = pd.DataFrame(data)
 
-    def iso_to_unix(iso_str: str) -> int:
-        """Convert iso string to unix timestamp.
+def bars_to_frame(columns: dict[str, list]) -> pd.DataFrame:
+    """Build the data frame of the bars written to the feature store.
 
-        Args:
-        ----
-        iso_str (str): Time in ISO format.
+    Bars carry their start and end times as Unix milliseconds, which are
+    kept as `start_timestamp_unix` and `end_timestamp_unix` and converted to
+    UTC datetimes a column at a time.
+    """
+    df = pd.DataFrame(columns)
+    start_ms = df["start_time"].astype("int64")
+    end_ms = df["end_time"].astype("int64")
+    return df.assign(
+        start_time=pd.to_datetime(start_ms, unit="ms", utc=True),
+        end_time=pd.to_datetime(end_ms, unit="ms", utc=True),
+        end_timestamp_unix=end_ms,
+        start_timestamp_unix=start_ms,
+    )
 
-        """
-        timestamp = datetime.fromisoformat(iso_str[:-1]).replace(
-            tzinfo=timezone.utc
-        )
-        return int(timestamp.timestamp() * 1000)
 
-    df["end_timestamp_unix"] = df["end_time"].apply(iso_to_unix)
-    df["start_timestamp_unix"] = df["start_time"].apply(iso_to_unix)
-    df = df.assign(
-        start_time=pd.to_datetime(df["start_time"], utc=True),
-        end_time=pd.to_datetime(df["end_time"], utc=True),
+def to_isoformat(timestamps: pd.Series) -> pd.Series:
+    """Format UTC datetimes like `Timestamp.isoformat`, a column at a time."""
+    return timestamps.dt.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00").str.replace(
+        ".000000+", "+", regex=False
     )
-    if online_offline == "offline":
-        ohlc_feature_group.insert(
-            df,
-            write_options={
-                "start_offline_materialization": (
-                    True if online_offline == "offline" else False
-                )
-            },
-        )
-    else:
-        df["start_time"] = df["start_time"].apply(lambda x: x.isoformat())
-        df["end_time"] = df["end_time"].apply(lambda x: x.isoformat())
 
-        product_id = df["product_id"].values[0]
 
-        online_fg = fs.get_or_create_feature_group(
-            name=feature_group_name,
-            version=feature_group_version,
+def push_bars_to_online_feature_store(
+    client: FeatureStoreClient,
+    feature_group_name: str,
+    feature_group_version: int,
+    feature_group_primary_keys: list[str],
+    bars: list[dict],
+    bar_windows: BarWindows,
+) -> None:
+    """Add the bars to the windows of their products and write the windows.
+
+    The online feature group holds the window of the last bars of every
+    product as a JSON array. The window of a product is only read from the
+    store the first time the product is seen, and all the windows updated by
+    the bars are written with a single insert.
+
+    Args:
+    ----
+    client (FeatureStoreClient): The session to the feature store.
+    feature_group_name (str): The name of the feature group to write to.
+    feature_group_version (int): The version of the feature group to write to.
+    feature_group_primary_keys (List[str]): The primary key of the Feature Group
+    bars (list[dict]): The bars to add, in the order they were emitted.
+    bar_windows (BarWindows): The windows of the products.
+
+    """
+
+    def online_feature_group(c: FeatureStoreClient):
+        return c.feature_group(
+            feature_group_name,
+            feature_group_version,
             primary_key=feature_group_primary_keys,  # ONLY product_id
-            description="Stores up to 14 bars per product in an array",
+            description=(
+                f"Stores up to {bar_windows.window_size} bars per product"
+                " in an array"
+            ),
             online_enabled=True,
             features=[
                 Feature(name="product_id", type="string"),
@@ -98,38 +138,63 @@ def push_data_to_feature_store(
                 ),
             ],
         )
-        try:
-            feature_view = fs.get_or_create_feature_view(
-                name="online_feature_view",
-                version=1,
-                query=online_fg.select_all(),
+
+    updated_products = []
+    for bar in bars:
+        product_id = bar["product_id"]
+        if product_id not in bar_windows:
+            bar_windows.load(
+                product_id,
+                read_bars_window(client, online_feature_group, product_id),
             )
-            result = feature_view.get_feature_vector({"product_id": product_id})
-            bars_array_str = result[1]  # might be JSON
-            bars_list = json.loads(bars_array_str) if bars_array_str else []
-        except Exception:
-            logger.error("Feature group doesn't exist or ...")
-            logger.error("Key is not present in the online feature store.")
-            bars_list = []
-
-        # Append new bar
-        new_bar_data = df.iloc[0].to_dict()
-        if new_bar_data not in bars_list:
-            bars_list.append(new_bar_data)
-
-            # If > 14, remove the oldest
-            if len(bars_list) > 14:
-                bars_list.pop(0)
-
-            # Write back
-            updated_row = {
+        if bar_windows.add(product_id, bar) and (
+            product_id not in updated_products
+        ):
+            updated_products.append(product_id)
+
+    if not updated_products:
+        return
+    updated_rows = pd.DataFrame(
+        [
+            {
                 "product_id": product_id,
-                "bars_array": json.dumps(bars_list),
+                "bars_array": bar_windows.to_json(product_id),
             }
-            online_fg.insert(
-                pd.DataFrame([updated_row]),
-                write_options={"start_offline_backfill": False},
-            )
+            for product_id in updated_products
+        ]
+    )
+    client.call(
+        lambda c: online_feature_group(c).insert(
+            updated_rows,
+            write_options={"start_offline_backfill": False},
+        )
+    )
+
+
+def read_bars_window(
+    client: FeatureStoreClient,
+    online_feature_group: Callable[[FeatureStoreClient], Any],
+    product_id: str,
+) -> list[dict]:
+    """Read the window of bars of a product from the online feature group.
+
+    Returns an empty window if the product is not in the feature group yet.
+    Any other error is raised, so the window is not loaded and the read is
+    retried with the next write of the product.
+    """
+    result = client.call(
+        lambda c: c.feature_view(
+            "online_feature_view",
+            1,
+            query=online_feature_group(c).select_all(),
+        ).get_feature_vector({"product_id": product_id}, allow_missing=True)
+    )
+    # Missing keys are returned as a vector of None
+    bars_array_str = result[1] if result else None
+    if not bars_array_str:
+        logger.info(f"No window of bars stored for {product_id} yet.")
+        return []
+    return json.loads(bars_array_str)
 
 
 def deserialize_timestamps(timestamps_str: str):
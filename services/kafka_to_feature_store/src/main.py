@@ -1,18 +1,21 @@
-import json
+import time
 import uuid
-from datetime import datetime, timezone
 
+from confluent_kafka import TopicPartition
+from hopswork.feature_store_client import FeatureStoreClient
 from hopswork.hopswork_api import push_data_to_feature_store
+from monitoring.monitoring_metrics import monitoring
+from monitoring.pipeline_metrics import EMITTED_AT, LAST_TRADE_TIME
 from quixstreams import Application
 from settings.config import settings
+from utils.bar_columns import BarColumns
+from utils.bar_windows import BarWindows
+from utils.feature_store_writer import FeatureStoreWriter
+from utils.flush_policy import FlushPolicy
+from utils.kafka_batches import poll_batch
 from utils.logging_config import logger
 
 
-def get_current_utc_sec() -> int:
-    """Return the current UTC time expressed in seconds since the epoch."""
-    return int(datetime.now(timezone.utc).timestamp())
-
-
 class PublishToFeatureStore:
     """Publish features to feature store."""
 
@@ -26,9 +29,16 @@ class PublishToFeatureStore:
         new_consumer_group: bool,
         feature_group: str | None,
         feature_group_version: int | None,
+        feature_store_client: FeatureStoreClient,
         buffer_size: int | None = 1,
         live_or_historical: str | None = "live",
         save_every_n_sec: int | None = 600,
+        online_window_size: int = 14,
+        max_in_flight_writes: int = 4,
+        buffer_max_bytes: int | None = None,
+        target_write_sec: float | None = None,
+        max_buffer_size: int | None = None,
+        consume_batch_size: int = 500,
     ) -> None:
         """Initialize the consumer step.
 
@@ -43,12 +53,26 @@ class PublishToFeatureStore:
         feature_group_version (int): Feature group version to write to.
         feature_group_primary_keys (List[str]): The PR of the Feature Group
         feature_group_event_time (str): The event time of the Feature Group
+        feature_store_client (FeatureStoreClient): The session to the feature
+            store, reused by every write.
         live_or_historical (str, optional): Whether we are saving live data to
             the Feature or historical data.
             Live data goes to the online feature store
             While historical data goes to the offline feature store.
-        save_every_n_sec (int, optional): The max seconds to wait before
-            writing the data to the feature store.
+        save_every_n_sec (int, optional): The max seconds a bar waits in the
+            buffer before being written to the feature store.
+        online_window_size (int, optional): The number of bars per product
+            kept in the online feature store.
+        max_in_flight_writes (int, optional): Max number of buffers written
+            to the feature store at once, while the consumer keeps polling.
+        buffer_max_bytes (int, optional): Size of the buffered messages that
+            triggers a write.
+        target_write_sec (float, optional): Target latency of a write, the
+            buffer size adapts to it if set.
+        max_buffer_size (int, optional): Max buffer size the adaptive sizing
+            can grow to, defaults to `buffer_size`.
+        consume_batch_size (int, optional): Max number of messages consumed
+            at once.
 
         """
         self.broker_address = broker_address
@@ -59,9 +83,21 @@ class PublishToFeatureStore:
         self.feature_group_version = feature_group_version
         self.feature_group_primary_keys = feature_group_primary_keys
         self.feature_group_event_time = feature_group_event_time
+        self.feature_store_client = feature_store_client
         self.buffer_size = buffer_size
         self.live_or_historical = live_or_historical
         self.save_every_n_sec = save_every_n_sec
+        # Authoritative copy of the windows of the online feature group
+        self.bar_windows = BarWindows(online_window_size)
+        self.max_in_flight_writes = max_in_flight_writes
+        self.consume_batch_size = consume_batch_size
+        self.flush_policy = FlushPolicy(
+            max_rows=buffer_size,
+            max_bytes=buffer_max_bytes,
+            max_age_sec=save_every_n_sec,
+            target_write_sec=target_write_sec,
+            max_rows_limit=max_buffer_size,
+        )
 
     def run(self) -> None:
         """Read ohlc data from kafka and writes to feature store.
@@ -81,80 +117,152 @@ class PublishToFeatureStore:
 
         input_topic = app.topic(name=self.input_topic, value_serializer="json")
 
-        last_saved_to_feature_store_ts = get_current_utc_sec()
+        buffer = BarColumns()
+        # Offset to commit once the buffer is written, by topic and partition
+        buffer_offsets: dict[tuple[str, int], int] = {}
 
-        buffer: list[dict] = []
+        writer = FeatureStoreWriter(self.push_buffer, self.max_in_flight_writes)
 
         with app.get_consumer() as consumer:
             consumer.subscribe(topics=[input_topic.name])
-            while True:
-                msg = consumer.poll(1)
-                sec_since_last_saved = (
-                    get_current_utc_sec() - last_saved_to_feature_store_ts
-                )
-                logger.info(f"Seconds since last saved: {sec_since_last_saved}")
-                if msg is None:
-                    # If no message is received/ all messages are received
-                    # then save the remaining buffer
-                    if buffer and (
-                        sec_since_last_saved >= self.save_every_n_sec
-                    ):
-                        push_data_to_feature_store(
-                            self.feature_group,
-                            self.feature_group_version,
-                            self.feature_group_primary_keys,
-                            self.feature_group_event_time,
-                            buffer,
-                            online_offline=(
-                                "online"
-                                if self.live_or_historical == "live"
-                                else "offline"
-                            ),
-                        )
-                        logger.info(
-                            f"Buffer of {len(buffer)} messages sent to feature"
-                            "store"
+            try:
+                while True:
+                    # Never consume more bars than the buffer has room for
+                    num_messages = min(
+                        self.consume_batch_size,
+                        max(self.flush_policy.max_rows - len(buffer), 1),
+                    )
+                    messages = poll_batch(consumer, num_messages, timeout=1)
+                    self.store_written_offsets(consumer, writer)
+                    values = []
+                    last_messages = {}
+                    for msg in messages:
+                        if msg.error():
+                            logger.error(f"Kafka error: {msg.error()}")
+                            continue
+                        values.append(msg.value())
+                        last_messages[(msg.topic(), msg.partition())] = msg
+                    if values:
+                        buffer.extend_messages(values)
+                        self.flush_policy.add(
+                            sum(map(len, values)), n_rows=len(values)
                         )
-                        buffer = []
-                        last_saved_to_feature_store_ts = get_current_utc_sec()
-                    if not buffer and (
-                        sec_since_last_saved >= self.save_every_n_sec
+                    for key, msg in last_messages.items():
+                        buffer_offsets[key] = msg.offset() + 1
+                        monitoring.observe_consumer_lag(consumer, msg)
+
+                    if self.flush_policy.should_flush():
+                        self.submit_buffer(writer, buffer, buffer_offsets)
+                        buffer, buffer_offsets = BarColumns(), {}
+
+                    # Historical runs drain the topic and exit, live runs
+                    # keep waiting for new bars
+                    if (
+                        not messages
+                        and self.live_or_historical == "historical"
+                        and self.is_caught_up(consumer)
                     ):
-                        logger.info(f"Seconds_since_last_saved: {sec_since_last_saved}")
-                        logger.info("No messages received. Exiting.")
+                        if buffer:
+                            self.submit_buffer(writer, buffer, buffer_offsets)
+                        self.store_written_offsets(consumer, writer, wait=True)
+                        logger.info("All the bars were written. Exiting.")
                         return
-                else:
-                    if msg.error():
-                        logger.error("Kafka error:", format(msg.error()))
-
-                    ohlc_message = json.loads(msg.value().decode("utf-8"))
-                    buffer.append(ohlc_message)
-
-                    if len(buffer) >= self.buffer_size:
-                        push_data_to_feature_store(
-                            self.feature_group,
-                            self.feature_group_version,
-                            self.feature_group_primary_keys,
-                            self.feature_group_event_time,
-                            buffer,
-                            online_offline=(
-                                "online"
-                                if self.live_or_historical == "live"
-                                else "offline"
-                            ),
-                        )
-                        logger.info(
-                            f"Buffer of {len(buffer)} messages sent to feature"
-                            "store"
-                        )
-                        buffer = []
-                        last_saved_to_feature_store_ts = get_current_utc_sec()
+            finally:
+                writer.close()
+
+    def submit_buffer(
+        self,
+        writer: FeatureStoreWriter,
+        buffer: BarColumns,
+        buffer_offsets: dict[tuple[str, int], int],
+    ) -> None:
+        """Hand the buffered bars to the writer threads.
 
-                    consumer.store_offsets(message=msg)
+        In live mode, the writes of a product are kept in order, since every
+        write holds the whole window of the product.
+        """
+        self.flush_policy.reset()
+        writer.submit(
+            buffer,
+            [
+                TopicPartition(topic, partition, offset)
+                for (topic, partition), offset in buffer_offsets.items()
+            ],
+            keys=(
+                set(buffer.columns["product_id"])
+                if self.live_or_historical == "live"
+                else set()
+            ),
+        )
+
+    @staticmethod
+    def is_caught_up(consumer) -> bool:
+        """Return whether every assigned partition was consumed to its end."""
+        partitions = consumer.assignment()
+        if not partitions:
+            return False
+        for partition in consumer.position(partitions):
+            low, high = consumer.get_watermark_offsets(partition, timeout=5)
+            # The position is invalid (< 0) until a message was consumed
+            position = partition.offset if partition.offset >= 0 else low
+            if position < high:
+                return False
+        return True
+
+    def store_written_offsets(
+        self, consumer, writer: FeatureStoreWriter, wait: bool = False
+    ) -> None:
+        """Store the offsets of the bars written to the feature store.
+
+        The offsets are committed by the consumer, so a bar is only skipped
+        on restart once it is in the feature store.
+        """
+        offsets = writer.acknowledged_offsets(wait=wait)
+        if offsets:
+            consumer.store_offsets(offsets=offsets)
+
+    def push_buffer(self, buffer: BarColumns) -> None:
+        """Write the buffered bars to the feature store, in a writer thread.
+
+        The tracing fields of the bars are not written to the feature group,
+        they are only used to record the latency of the bars and of the trades
+        that completed them.
+        """
+        traces = zip(
+            buffer.columns["product_id"],
+            buffer.pop(EMITTED_AT),
+            buffer.pop(LAST_TRADE_TIME),
+            strict=True,
+        )
+        start_time = time.perf_counter()
+        push_data_to_feature_store(
+            self.feature_store_client,
+            self.feature_group,
+            self.feature_group_version,
+            self.feature_group_primary_keys,
+            self.feature_group_event_time,
+            buffer.columns,
+            online_offline=(
+                "online" if self.live_or_historical == "live" else "offline"
+            ),
+            bar_windows=self.bar_windows,
+        )
+        write_time = time.perf_counter() - start_time
+        monitoring.observe_stage("feature_store_write", write_time)
+        self.flush_policy.observe_write(len(buffer), write_time)
+        for product_id, emitted_at, last_trade_time in traces:
+            monitoring.observe_since(
+                "bar_to_feature_store", product_id, emitted_at
+            )
+            monitoring.observe_since(
+                "trade_to_feature_store", product_id, last_trade_time
+            )
+        logger.info(f"Buffer of {len(buffer)} messages sent to feature store")
 
 
 if __name__ == "__main__":
     logger.info(settings)
+    monitoring.start_http_server(settings.app_settings.metrics_port)
     write_to_feature_store = PublishToFeatureStore(
         settings.app_settings.kafka_broker_address,
         settings.app_settings.input_topic,
@@ -164,8 +272,19 @@ if __name__ == "__main__":
         settings.app_settings.create_new_consumer_group,
         settings.app_settings.feature_group,
         settings.app_settings.feature_group_version,
+        FeatureStoreClient(
+            settings.hopswork.project_name,
+            settings.hopswork.api_key,
+            settings.hopswork.handle_ttl_sec,
+        ),
         settings.app_settings.buffer_size,
         settings.live_or_historical,
         settings.save_every_n_sec,
+        settings.app_settings.online_window_size,
+        settings.app_settings.max_in_flight_writes,
+        settings.app_settings.buffer_max_bytes,
+        settings.app_settings.target_write_sec,
+        settings.app_settings.max_buffer_size,
+        settings.app_settings.consume_batch_size,
     )
     write_to_feature_store.run()
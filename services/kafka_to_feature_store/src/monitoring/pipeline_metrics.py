@@ -0,0 +1,144 @@
+"""Prometheus metrics of the stages of the trade to feature store pipeline.
+
+Every service records how long its stages take and how old the data is when
+it reaches them. Bars carry two tracing fields, both Unix milliseconds, so
+the freshness of the data can be followed down to the feature store:
+
+- `last_trade_time`: timestamp of the trade that completed the bar.
+- `emitted_at`: time the bar was written to Kafka.
+
+This module is shared by trade_producer, processing_trades and
+kafka_to_feature_store, and must be kept identical across the services.
+"""
+
+import time
+from typing import Any
+
+from confluent_kafka import TopicPartition
+from prometheus_client import Gauge, Histogram, start_http_server
+
+LAST_TRADE_TIME = "last_trade_time"
+EMITTED_AT = "emitted_at"
+TRACE_FIELDS = (LAST_TRADE_TIME, EMITTED_AT)
+
+# Buckets of the stage durations, in seconds
+DURATION_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+)
+# Buckets of the time since the trade or the bar, in seconds
+LATENCY_BUCKETS = (
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+
+def now_ms() -> int:
+    """Return the current time in Unix milliseconds."""
+    return time.time_ns() // 1_000_000
+
+
+class PipelineMetrics:
+    """Per-stage metrics of one service of the pipeline."""
+
+    def __init__(self, service: str, lag_every_n_sec: float = 10) -> None:
+        """Initialize the metrics.
+
+        Args:
+        ----
+        service (str): Name of the service recording the metrics.
+        lag_every_n_sec (float): Min seconds between two consumer lag
+            lookups of the same partition.
+
+        """
+        self.service = service
+        self.lag_every_n_sec = lag_every_n_sec
+        self._lag_checked_at: dict[tuple[str, int], float] = {}
+
+        self.stage_duration = Histogram(
+            "pipeline_stage_duration_seconds",
+            "Time spent in a stage of the pipeline",
+            ["service", "stage"],
+            buckets=DURATION_BUCKETS,
+        )
+        self.latency = Histogram(
+            "pipeline_latency_seconds",
+            "Time from a trade or bar timestamp to a stage of the pipeline",
+            ["service", "stage", "product_id"],
+            buckets=LATENCY_BUCKETS,
+        )
+        self.consumer_lag = Gauge(
+            "pipeline_consumer_lag",
+            "Number of messages of a partition not consumed yet",
+            ["service", "topic", "partition"],
+        )
+
+    def start_http_server(self, port: int) -> None:
+        """Expose the metrics of the process on the given port."""
+        start_http_server(port)
+
+    def observe_stage(self, stage: str, duration: float) -> None:
+        """Observe the time spent in a stage, in seconds."""
+        self.stage_duration.labels(
+            service=self.service, stage=stage
+        ).observe(duration)
+
+    def observe_since(
+        self, stage: str, product_id: str, since_ms: int | None
+    ) -> None:
+        """Observe the time from a Unix milliseconds timestamp to now.
+
+        Records without the timestamp (e.g. written by an older version of
+        the upstream service) are ignored.
+        """
+        if since_ms is None:
+            return
+        self.latency.labels(
+            service=self.service, stage=stage, product_id=product_id
+        ).observe((now_ms() - since_ms) / 1000)
+
+    def observe_consumer_lag(self, consumer: Any, message: Any) -> None:
+        """Set the lag of the partition of a consumed message."""
+        self.observe_partition_lag(
+            consumer, message.topic(), message.partition(), message.offset()
+        )
+
+    def observe_partition_lag(
+        self, consumer: Any, topic: str, partition: int, offset: int
+    ) -> None:
+        """Set the lag of a partition, consumed up to `offset`.
+
+        The high watermark of the partition is looked up at most every
+        `lag_every_n_sec` seconds, since it is a broker round-trip.
+        """
+        key = (topic, partition)
+        now = time.monotonic()
+        checked_at = self._lag_checked_at.get(key)
+        if checked_at is not None and now - checked_at < self.lag_every_n_sec:
+            return
+        self._lag_checked_at[key] = now
+        _, high = consumer.get_watermark_offsets(
+            TopicPartition(topic, partition), timeout=1
+        )
+        self.consumer_lag.labels(
+            service=self.service, topic=topic, partition=partition
+        ).set(max(high - offset - 1, 0))
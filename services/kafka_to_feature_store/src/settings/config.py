@@ -19,6 +19,20 @@ class AppSettings(BaseSettings):
     feature_group_primary_keys: list[str]
     feature_group_event_time: str = "start_time"
     buffer_size: int = 1
+    # Size of the buffered messages that triggers a write, no limit if unset
+    buffer_max_bytes: int | None = None
+    # Target latency of a write: the buffer size adapts to it if set, up to
+    # max_buffer_size (buffer_size if unset)
+    target_write_sec: float | None = None
+    max_buffer_size: int | None = None
+    # Max number of messages consumed at once
+    consume_batch_size: int = 500
+    # Number of bars per product kept in the online feature group
+    online_window_size: int = 14
+    # Max number of buffers written to the feature store at once
+    max_in_flight_writes: int = 4
+    # Port exposing the Prometheus metrics
+    metrics_port: int = 8000
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -32,6 +46,8 @@ class HopsworkSettings(BaseSettings):
 
     project_name: str
     api_key: str
+    # Seconds the feature group and feature view handles are reused for
+    handle_ttl_sec: int = 600
 
     model_config = SettingsConfigDict(
         env_file="credentials.env",
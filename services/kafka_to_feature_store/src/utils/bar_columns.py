@@ -0,0 +1,165 @@
+import json
+from collections.abc import Iterable
+from typing import Any
+
+from utils.wire_format import (
+    FLOAT,
+    HEADER,
+    INT,
+    LENGTH,
+    MAGIC,
+    RECORD_SCHEMA_ID,
+    STR_LENGTH,
+    decode,
+    us_to_iso,
+)
+
+RECORD_HEADER = HEADER.pack(MAGIC, RECORD_SCHEMA_ID)
+# Type tags of the fields of binary records
+NONE_TAG = ord("n")
+BOOL_TAG = ord("?")
+INT_TAG = ord("q")
+FLOAT_TAG = ord("d")
+TIMESTAMP_TAG = ord("t")
+STR_TAG = ord("s")
+
+
+def decode_bars(values: list[bytes]) -> list[dict[str, Any]]:
+    """Decode a batch of bar messages.
+
+    A batch of JSON messages is parsed as a single JSON array, with one call
+    to the parser instead of one per message.
+    """
+    if not any(value[:1] == bytes((MAGIC,)) for value in values):
+        return json.loads(b"[" + b",".join(values) + b"]")
+    return [decode(value) for value in values]
+
+
+def decode_record_columns(values: list[bytes]) -> dict[str, list] | None:
+    """Decode a batch of binary records into one list per field.
+
+    The records written by a producer share the same fields in the same
+    order, so the layout of the first record is used to read the values of
+    all of them without decoding the field names again.
+
+    Returns None if a record does not have the layout of the first one.
+    """
+    layout = _record_layout(values[0])
+    if layout is None:
+        return None
+    n_fields = len(layout)
+    rows = []
+    for data in values:
+        if data[: HEADER.size] != RECORD_HEADER or data[2] != n_fields:
+            return None
+        offset = HEADER.size + LENGTH.size
+        row = []
+        for name, tag in layout:
+            end = offset + len(name)
+            if data[offset:end] != name or data[end] != tag:
+                return None
+            offset = end + 1
+            if tag == FLOAT_TAG:
+                row.append(FLOAT.unpack_from(data, offset)[0])
+                offset += FLOAT.size
+            elif tag == INT_TAG:
+                row.append(INT.unpack_from(data, offset)[0])
+                offset += INT.size
+            elif tag == STR_TAG:
+                (size,) = STR_LENGTH.unpack_from(data, offset)
+                offset += STR_LENGTH.size
+                row.append(data[offset : offset + size].decode("utf-8"))
+                offset += size
+            elif tag == NONE_TAG:
+                row.append(None)
+            elif tag == BOOL_TAG:
+                row.append(bool(data[offset]))
+                offset += LENGTH.size
+            else:
+                row.append(us_to_iso(INT.unpack_from(data, offset)[0]))
+                offset += INT.size
+        rows.append(row)
+    return {
+        name[LENGTH.size :].decode("utf-8"): list(column)
+        for (name, _), column in zip(layout, zip(*rows), strict=True)
+    }
+
+
+def _record_layout(data: bytes) -> list[tuple[bytes, int]] | None:
+    """Return the encoded name and the type tag of the fields of a record.
+
+    Returns None if the record has an unknown type tag.
+    """
+    (n_fields,) = LENGTH.unpack_from(data, HEADER.size)
+    offset = HEADER.size + LENGTH.size
+    layout = []
+    for _ in range(n_fields):
+        end = offset + LENGTH.size + data[offset]
+        tag = data[end]
+        layout.append((data[offset:end], tag))
+        offset = end + 1
+        if tag == STR_TAG:
+            offset += STR_LENGTH.size + STR_LENGTH.unpack_from(data, offset)[0]
+        elif tag == BOOL_TAG:
+            offset += LENGTH.size
+        elif tag in (FLOAT_TAG, INT_TAG, TIMESTAMP_TAG):
+            offset += INT.size
+        elif tag != NONE_TAG:
+            return None
+    return layout
+
+
+class BarColumns:
+    """Buffer of bars stored as one list per field.
+
+    Bars are added a batch at a time, and turned into a data frame from the
+    columns, without a dictionary per row.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty buffer."""
+        self.columns: dict[str, list[Any]] = {}
+        self.n_rows = 0
+
+    def __len__(self) -> int:
+        """Return the number of bars in the buffer."""
+        return self.n_rows
+
+    def extend_messages(self, values: list[bytes]) -> None:
+        """Decode a batch of bar messages and add them to the columns."""
+        if values and values[0][: HEADER.size] == RECORD_HEADER:
+            columns = decode_record_columns(values)
+            if columns is not None:
+                self.extend_columns(columns, len(values))
+                return
+        self.extend(decode_bars(values))
+
+    def extend(self, bars: list[dict[str, Any]]) -> None:
+        """Add a batch of bars to the columns.
+
+        Fields missing from some of the bars are set to None.
+        """
+        if not bars:
+            return
+        fields: Iterable[str] = bars[0].keys()
+        if not all(bar.keys() == fields for bar in bars):
+            fields = dict.fromkeys(field for bar in bars for field in bar)
+        self.extend_columns(
+            {field: [bar.get(field) for bar in bars] for field in fields},
+            len(bars),
+        )
+
+    def extend_columns(self, columns: dict[str, list], n_rows: int) -> None:
+        """Add `n_rows` bars given as one list per field."""
+        for field, values in columns.items():
+            if field not in self.columns:
+                self.columns[field] = [None] * self.n_rows
+            self.columns[field].extend(values)
+        for column in self.columns.values():
+            if len(column) == self.n_rows:
+                column.extend([None] * n_rows)
+        self.n_rows += n_rows
+
+    def pop(self, field: str) -> list[Any]:
+        """Remove a field from the buffer and return its column."""
+        return self.columns.pop(field, None) or [None] * self.n_rows
@@ -0,0 +1,70 @@
+import json
+from collections import deque
+
+
+def bar_key(bar: dict) -> tuple[int, int]:
+    """Return the end and start Unix milliseconds identifying a bar."""
+    return (
+        bar.get("end_timestamp_unix") or 0,
+        bar.get("start_timestamp_unix") or 0,
+    )
+
+
+class BarWindows:
+    """Last `window_size` bars of every product, oldest first.
+
+    This is the authoritative copy of the windows written to the online
+    feature group: the window of a product is loaded from the store the
+    first time the product is seen, then only updated in memory, so every
+    flush is a single write.
+    """
+
+    def __init__(self, window_size: int = 14) -> None:
+        """Initialize the windows.
+
+        Args:
+        ----
+        window_size (int): Max number of bars kept per product.
+
+        """
+        self.window_size = window_size
+        self._windows: dict[str, deque[dict]] = {}
+
+    def __contains__(self, product_id: str) -> bool:
+        """Return whether the window of the product is loaded."""
+        return product_id in self._windows
+
+    def load(self, product_id: str, bars: list[dict]) -> None:
+        """Set the window of a product from the bars read from the store."""
+        self._windows[product_id] = deque(maxlen=self.window_size)
+        for bar in sorted(bars, key=bar_key):
+            self.add(product_id, bar)
+
+    def add(self, product_id: str, bar: dict) -> bool:
+        """Add a bar to the window of its product.
+
+        A bar delivered again replaces the one already in the window, and a
+        bar older than the newest one of the window is ignored.
+
+        Returns
+        -------
+        bool: Whether the window changed.
+
+        """
+        window = self._windows.setdefault(
+            product_id, deque(maxlen=self.window_size)
+        )
+        key = bar_key(bar)
+        if window and key <= bar_key(window[-1]):
+            for i, window_bar in enumerate(window):
+                if bar_key(window_bar) == key:
+                    changed = window_bar != bar
+                    window[i] = bar
+                    return changed
+            return False
+        window.append(bar)
+        return True
+
+    def to_json(self, product_id: str) -> str:
+        """Serialize the window of a product, as stored in the feature group."""
+        return json.dumps(list(self._windows.get(product_id, ())))
@@ -0,0 +1,120 @@
+import threading
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from confluent_kafka import TopicPartition
+
+from utils.bar_columns import BarColumns
+from utils.logging_config import logger
+
+
+class FeatureStoreWriter:
+    """Pool of threads writing buffers of bars to the feature store.
+
+    Up to `max_in_flight` buffers are written at once while the Kafka poll
+    loop keeps running. Every buffer comes with the offsets of its messages,
+    which are handed back in the order the buffers were submitted, once the
+    buffer and all the ones before it were written, so the offsets committed
+    never go past a bar that is not in the feature store yet.
+
+    Writes of buffers sharing a key (e.g. a product whose window is written
+    to the online feature group) wait for the previous write of the key, so
+    an older window never overwrites a newer one.
+    """
+
+    def __init__(
+        self, write: Callable[[BarColumns], None], max_in_flight: int = 4
+    ) -> None:
+        """Initialize the writer.
+
+        Args:
+        ----
+        write (Callable[[BarColumns], None]): Writes a buffer of bars to the
+            feature store, called from the writer threads.
+        max_in_flight (int): Max number of buffers being written at once.
+
+        """
+        if max_in_flight <= 0:
+            raise ValueError(
+                f"max_in_flight must be > 0, got {max_in_flight}."
+            )
+        self.write = write
+        self.max_in_flight = max_in_flight
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="feature-store"
+        )
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._pending: deque[tuple[Future, list[TopicPartition]]] = deque()
+        self._last_write_of_key: dict[str, Future] = {}
+
+    def in_flight(self) -> int:
+        """Return the number of buffers submitted and not acknowledged."""
+        return len(self._pending)
+
+    def submit(
+        self, buffer: BarColumns, offsets: list[TopicPartition], keys: set[str]
+    ) -> None:
+        """Write a buffer in the background.
+
+        Blocks while `max_in_flight` buffers are being written.
+
+        Args:
+        ----
+        buffer (BarColumns): The bars to write.
+        offsets (list[TopicPartition]): The offsets to store once the bars
+            are written.
+        keys (set[str]): The keys whose previous writes must complete first.
+
+        """
+        self._slots.acquire()
+        previous_writes = [
+            self._last_write_of_key[key]
+            for key in keys
+            if key in self._last_write_of_key
+        ]
+        future = self._executor.submit(self._write, buffer, previous_writes)
+        future.add_done_callback(lambda _: self._slots.release())
+        for key in keys:
+            self._last_write_of_key[key] = future
+        self._pending.append((future, offsets))
+
+    def _write(
+        self, buffer: BarColumns, previous_writes: list[Future]
+    ) -> None:
+        """Wait for the previous writes of the keys of the buffer, then write.
+
+        The previous writes were submitted earlier, so they already started
+        and waiting for them cannot deadlock the pool.
+        """
+        for previous_write in previous_writes:
+            previous_write.result()
+        self.write(buffer)
+
+    def acknowledged_offsets(self, wait: bool = False) -> list[TopicPartition]:
+        """Return the offsets of the buffers written, in submission order.
+
+        Stops at the first buffer still being written, unless `wait` is
+        True, in which case it waits for all of them.
+
+        Raises the error of a failed write, so the consumer stops without
+        committing its offsets, and the bars are read again on restart.
+        """
+        offsets: dict[tuple[str, int], TopicPartition] = {}
+        while self._pending and (wait or self._pending[0][0].done()):
+            future, buffer_offsets = self._pending.popleft()
+            future.result()
+            for offset in buffer_offsets:
+                offsets[(offset.topic, offset.partition)] = offset
+        for key, future in list(self._last_write_of_key.items()):
+            if future.done():
+                del self._last_write_of_key[key]
+        return list(offsets.values())
+
+    def close(self) -> None:
+        """Wait for the writes in flight and stop the threads."""
+        if self._pending:
+            logger.info(
+                f"Waiting for {len(self._pending)} feature store writes"
+            )
+        self._executor.shutdown(wait=True)
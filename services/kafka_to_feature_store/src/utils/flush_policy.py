@@ -0,0 +1,103 @@
+import threading
+import time
+
+from utils.logging_config import logger
+
+
+class FlushPolicy:
+    """Decides when the buffer of bars is written to the feature store.
+
+    The buffer is flushed as soon as it holds `max_rows` bars, `max_bytes`
+    bytes of messages, or its oldest bar waited `max_age_sec` seconds. It is
+    checked on every iteration of the poll loop, so the age limit holds
+    under steady traffic too.
+
+    With a `target_write_sec`, the number of rows per flush adapts to the
+    observed insert latency: it is halved when an insert takes longer than
+    the target, and doubled (up to `max_rows_limit`) when it takes less
+    than half of it. Inserts are observed from the writer threads, so
+    `max_rows` is read and adapted under a lock.
+    """
+
+    def __init__(
+        self,
+        max_rows: int,
+        max_bytes: int | None = None,
+        max_age_sec: float | None = None,
+        target_write_sec: float | None = None,
+        max_rows_limit: int | None = None,
+    ) -> None:
+        """Initialize the policy.
+
+        Args:
+        ----
+        max_rows (int): Number of bars that triggers a flush.
+        max_bytes (int, optional): Size of the buffered messages that
+            triggers a flush. No limit if None.
+        max_age_sec (float, optional): Seconds the oldest bar may wait
+            before a flush. No limit if None.
+        target_write_sec (float, optional): Target latency of an insert,
+            `max_rows` is not adapted if None.
+        max_rows_limit (int, optional): Upper bound of the adapted
+            `max_rows`, defaults to `max_rows`.
+
+        """
+        if max_rows <= 0:
+            raise ValueError(f"max_rows must be > 0, got {max_rows}.")
+        self._lock = threading.Lock()
+        self._max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self.target_write_sec = target_write_sec
+        self.max_rows_limit = max_rows_limit or max_rows
+        self.reset()
+
+    @property
+    def max_rows(self) -> int:
+        """Return the number of bars that triggers a flush."""
+        with self._lock:
+            return self._max_rows
+
+    def reset(self) -> None:
+        """Start a new, empty buffer."""
+        self.n_rows = 0
+        self.n_bytes = 0
+        self.first_added_at: float | None = None
+
+    def add(self, n_bytes: int, n_rows: int = 1) -> None:
+        """Count bars added to the buffer and the size of their messages."""
+        if self.first_added_at is None:
+            self.first_added_at = time.monotonic()
+        self.n_rows += n_rows
+        self.n_bytes += n_bytes
+
+    def should_flush(self) -> bool:
+        """Return whether the buffer must be written now."""
+        if not self.n_rows:
+            return False
+        if self.n_rows >= self.max_rows:
+            return True
+        if self.max_bytes is not None and self.n_bytes >= self.max_bytes:
+            return True
+        return (
+            self.max_age_sec is not None
+            and time.monotonic() - self.first_added_at >= self.max_age_sec
+        )
+
+    def observe_write(self, n_rows: int, latency: float) -> None:
+        """Adapt the rows per flush to the latency of an insert of n_rows."""
+        if self.target_write_sec is None:
+            return
+        with self._lock:
+            max_rows = self._max_rows
+            if latency > self.target_write_sec:
+                max_rows = max(1, min(max_rows, n_rows) // 2)
+            elif latency < self.target_write_sec / 2 and n_rows >= max_rows:
+                max_rows = min(self.max_rows_limit, max_rows * 2)
+            if max_rows == self._max_rows:
+                return
+            self._max_rows = max_rows
+        logger.info(
+            f"Insert of {n_rows} rows took {latency:.2f} seconds,"
+            f" flushing every {max_rows} rows"
+        )
@@ -0,0 +1,25 @@
+import time
+
+from confluent_kafka import Message
+from quixstreams.kafka import Consumer
+
+
+def poll_batch(
+    consumer: Consumer, max_messages: int, timeout: float
+) -> list[Message]:
+    """Poll up to `max_messages` messages, waiting at most `timeout` seconds.
+
+    Returns as soon as `max_messages` messages are polled, or with the
+    messages polled so far once `timeout` seconds have passed.
+    """
+    deadline = time.monotonic() + timeout
+    messages: list[Message] = []
+    while len(messages) < max_messages:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        msg = consumer.poll(remaining)
+        if msg is None:
+            break
+        messages.append(msg)
+    return messages
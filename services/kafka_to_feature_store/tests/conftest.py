@@ -0,0 +1,15 @@
+import os
+import sys
+from pathlib import Path
+
+# The service modules are imported from src, as when running src/main.py
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+# Settings are read when the modules are imported
+os.environ.setdefault("LIVE_OR_HISTORICAL", "historical")
+os.environ.setdefault("CONSUMER_GROUP", "tests")
+os.environ.setdefault("FEATURE_GROUP", "bars")
+os.environ.setdefault("FEATURE_GROUP_VERSION", "1")
+os.environ.setdefault("FEATURE_GROUP_PRIMARY_KEYS", '["product_id"]')
+os.environ.setdefault("PROJECT_NAME", "project")
+os.environ.setdefault("API_KEY", "key")
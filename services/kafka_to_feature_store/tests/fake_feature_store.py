@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+from typing import Any
+
+
+class FakeRestAPIError(Exception):
+    """Error of the fake backend, with the HTTP status of the request."""
+
+    def __init__(self, status_code: int, message: str) -> None:
+        """Initialize the error of a request."""
+        super().__init__(message)
+        self.response = SimpleNamespace(status_code=status_code)
+
+
+class FakeFeatureGroup:
+    """Feature group of the fake backend, keeping the inserted rows."""
+
+    def __init__(self, store: "FakeFeatureStore", name: str) -> None:
+        """Initialize the feature group of a feature store session."""
+        self.store = store
+        self.name = name
+        self.rows: list[Any] = []
+
+    def insert(self, rows: list[Any], **kwargs) -> None:
+        """Insert rows, failing if the session of the handle expired."""
+        if self.store.expired:
+            raise FakeRestAPIError(401, "Hopsworks session expired")
+        self.rows.extend(rows)
+
+
+class FakeFeatureStore:
+    """Feature store of one session of the fake backend."""
+
+    def __init__(self, backend: "FakeHopsworks") -> None:
+        """Initialize the feature store of a new session."""
+        self.backend = backend
+        self.expired = False
+
+    def get_or_create_feature_group(
+        self, name: str, version: int, **kwargs
+    ) -> FakeFeatureGroup:
+        """Return a new handle of a feature group."""
+        self.backend.n_fetches += 1
+        return FakeFeatureGroup(self, name)
+
+    def get_or_create_feature_view(
+        self, name: str, version: int, query: Any
+    ) -> Any:
+        """Return a new handle of a feature view."""
+        self.backend.n_fetches += 1
+        return (name, version, query)
+
+
+class FakeProject:
+    """Hopsworks project returned by the fake login."""
+
+    def __init__(self, feature_store: FakeFeatureStore) -> None:
+        """Initialize the project of a session."""
+        self.feature_store = feature_store
+
+    def get_feature_store(self) -> FakeFeatureStore:
+        """Return the feature store of the session."""
+        return self.feature_store
+
+
+class FakeHopsworks:
+    """Local stand-in of the Hopsworks backend.
+
+    Every login opens a new session, and `expire_sessions` makes the
+    handles of the sessions opened so far fail, as when a session times out.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the backend, without any session."""
+        self.n_logins = 0
+        self.n_fetches = 0
+        self.sessions: list[FakeFeatureStore] = []
+
+    def login(self, project: str, api_key_value: str) -> FakeProject:
+        """Open a new session."""
+        self.n_logins += 1
+        self.sessions.append(FakeFeatureStore(self))
+        return FakeProject(self.sessions[-1])
+
+    def expire_sessions(self) -> None:
+        """Expire every session opened so far."""
+        for session in self.sessions:
+            session.expired = True
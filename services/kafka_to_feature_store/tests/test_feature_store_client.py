@@ -0,0 +1,149 @@
+import threading
+
+import pytest
+
+from hopswork import feature_store_client
+from hopswork.feature_store_client import FeatureStoreClient
+from tests.fake_feature_store import FakeHopsworks, FakeRestAPIError
+
+
+@pytest.fixture
+def backend() -> FakeHopsworks:
+    """Return a fresh fake Hopsworks backend."""
+    return FakeHopsworks()
+
+
+def make_client(backend: FakeHopsworks, **kwargs) -> FeatureStoreClient:
+    """Return a client of the fake backend."""
+    return FeatureStoreClient("project", "key", login=backend.login, **kwargs)
+
+
+def insert(client: FeatureStoreClient, rows: list) -> None:
+    """Insert rows into the bars feature group."""
+    client.feature_group("bars", 1, online_enabled=False).insert(rows)
+
+
+def test_logs_in_once_across_calls(backend):
+    """Calls share one login and the cached handles."""
+    client = make_client(backend)
+
+    for i in range(5):
+        client.call(lambda c, i=i: insert(c, [i]))
+    client.call(lambda c: c.feature_view("bars_view", 1, query=None))
+
+    assert backend.n_logins == 1
+    # One fetch of the feature group and one of the feature view
+    assert backend.n_fetches == 2
+    rows = client.feature_group("bars", 1, online_enabled=False).rows
+    assert rows == list(range(5))
+
+
+def test_handles_are_cached_by_online_flag(backend):
+    """Online and offline feature groups are separate handles."""
+    client = make_client(backend)
+
+    offline = client.feature_group("bars", 1, online_enabled=False)
+    online = client.feature_group("bars", 1, online_enabled=True)
+
+    assert offline is not online
+    assert client.feature_group("bars", 1, online_enabled=True) is online
+
+
+def test_handle_is_fetched_again_after_ttl(backend, monkeypatch):
+    """Handles older than the TTL are fetched again."""
+    now = [0.0]
+    monkeypatch.setattr(feature_store_client.time, "monotonic", lambda: now[0])
+    client = make_client(backend, handle_ttl_sec=10)
+
+    handle = client.feature_group("bars", 1)
+    now[0] = 9.9
+    assert client.feature_group("bars", 1) is handle
+    now[0] = 10.0
+    refreshed = client.feature_group("bars", 1)
+
+    assert refreshed is not handle
+    assert backend.n_fetches == 2
+    # The session is kept, only the handle is fetched again
+    assert backend.n_logins == 1
+
+
+def test_logs_in_again_after_failed_call(backend):
+    """A call failing on an expired session logs in again."""
+    client = make_client(backend)
+    client.call(lambda c: insert(c, [1]))
+
+    backend.expire_sessions()
+    client.call(lambda c: insert(c, [2]))
+
+    assert backend.n_logins == 2
+    assert client.feature_group("bars", 1, online_enabled=False).rows == [2]
+
+
+def test_error_is_raised_if_retry_fails(backend):
+    """The error of the retried call is raised."""
+    client = make_client(backend)
+    n_calls = []
+
+    def fail(c):
+        n_calls.append(1)
+        raise FakeRestAPIError(401, "invalid API key")
+
+    with pytest.raises(FakeRestAPIError, match="invalid API key"):
+        client.call(fail)
+    # Retried once only
+    assert len(n_calls) == 2
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ValueError("invalid rows"),
+        # The insert may have been written before the connection dropped
+        ConnectionError("connection reset"),
+        FakeRestAPIError(500, "internal server error"),
+    ],
+)
+def test_other_errors_are_not_retried(backend, error):
+    """Only calls rejected for their session are sent again."""
+    client = make_client(backend)
+    client.call(lambda c: insert(c, [1]))
+    n_calls = []
+
+    def fail(c):
+        n_calls.append(1)
+        insert(c, [2])
+        raise error
+
+    with pytest.raises(type(error)):
+        client.call(fail)
+    assert len(n_calls) == 1
+    assert backend.n_logins == 1
+    # The rows are not written twice
+    rows = client.feature_group("bars", 1, online_enabled=False).rows
+    assert rows == [1, 2]
+
+
+def test_concurrent_failures_log_in_again_once(backend):
+    """Threads failing on the same session log in again once."""
+    client = make_client(backend)
+    client.call(lambda c: insert(c, []))
+    backend.expire_sessions()
+
+    n_threads = 8
+    barrier = threading.Barrier(n_threads)
+
+    def write(i: int) -> None:
+        barrier.wait()
+        client.call(lambda c: insert(c, [i]))
+
+    threads = [
+        threading.Thread(target=write, args=(i,)) for i in range(n_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert backend.n_logins == 2
+    rows = client.feature_group("bars", 1, online_enabled=False).rows
+    assert sorted(rows) == list(range(n_threads))
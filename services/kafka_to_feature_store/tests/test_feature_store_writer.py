@@ -0,0 +1,139 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+from confluent_kafka import TopicPartition
+
+from utils.feature_store_writer import FeatureStoreWriter
+
+
+class GatedWrite:
+    """Fake write of buffers named by a string, finishing when released."""
+
+    def __init__(self, failing: tuple[str, ...] = ()) -> None:
+        """Initialize the write, failing for the `failing` buffers."""
+        self.failing = failing
+        self.gates: dict[str, threading.Event] = {}
+        self.started: list[str] = []
+        self.finished: list[str] = []
+        self.lock = threading.Lock()
+
+    def gate(self, buffer: str) -> threading.Event:
+        """Return the event releasing the write of a buffer."""
+        with self.lock:
+            return self.gates.setdefault(buffer, threading.Event())
+
+    def release(self, *buffers: str) -> None:
+        """Let the writes of the buffers finish."""
+        for buffer in buffers:
+            self.gate(buffer).set()
+
+    def __call__(self, buffer: str) -> None:
+        """Write a buffer once it is released."""
+        with self.lock:
+            self.started.append(buffer)
+        assert self.gate(buffer).wait(timeout=5)
+        with self.lock:
+            self.finished.append(buffer)
+        if buffer in self.failing:
+            raise ConnectionError(f"insert of {buffer} failed")
+
+
+def offsets(*offsets: int, partition: int = 0) -> list[TopicPartition]:
+    """Return the offsets of messages of a partition."""
+    return [TopicPartition("bars", partition, offset) for offset in offsets]
+
+
+def as_tuples(partitions: list[TopicPartition]) -> list[tuple]:
+    """Return the topic, partition and offset of every partition."""
+    return [(tp.topic, tp.partition, tp.offset) for tp in partitions]
+
+
+def wait_written(writer: FeatureStoreWriter, *indexes: int) -> None:
+    """Wait for the writes of the pending buffers at the indexes."""
+    pending = list(writer._pending)
+    wait([pending[i][0] for i in indexes], timeout=5)
+
+
+@pytest.fixture
+def write() -> GatedWrite:
+    """Return a write of released buffers."""
+    return GatedWrite()
+
+
+def test_invalid_max_in_flight_raises(write):
+    """At least one buffer must be written at once."""
+    with pytest.raises(ValueError, match="max_in_flight"):
+        FeatureStoreWriter(write, max_in_flight=0)
+
+
+def test_offsets_are_acknowledged_in_submit_order(write):
+    """Offsets stop at the first buffer still being written."""
+    writer = FeatureStoreWriter(write, max_in_flight=3)
+    writer.submit("a", offsets(10), keys=set())
+    writer.submit("b", offsets(20) + offsets(5, partition=1), keys=set())
+    writer.submit("c", offsets(30), keys=set())
+
+    write.release("c")
+    wait_written(writer, 2)
+    assert writer.acknowledged_offsets() == []
+
+    write.release("a")
+    wait_written(writer, 0)
+    assert as_tuples(writer.acknowledged_offsets()) == [("bars", 0, 10)]
+    assert writer.in_flight() == 2
+
+    write.release("b")
+    wait_written(writer, 0)
+    # The offsets of the buffers written are merged by partition
+    assert as_tuples(writer.acknowledged_offsets()) == [
+        ("bars", 0, 30),
+        ("bars", 1, 5),
+    ]
+    assert writer.in_flight() == 0
+    writer.close()
+
+
+def test_wait_acknowledges_every_buffer(write):
+    """Waiting returns the offsets once every buffer is written."""
+    writer = FeatureStoreWriter(write, max_in_flight=2)
+    writer.submit("a", offsets(10), keys=set())
+    writer.submit("b", offsets(20), keys=set())
+    threading.Timer(0.05, write.release, ("a", "b")).start()
+
+    assert as_tuples(writer.acknowledged_offsets(wait=True)) == [
+        ("bars", 0, 20)
+    ]
+    writer.close()
+
+
+def test_writes_of_a_key_are_kept_in_order(write):
+    """A buffer waits for the previous write of its keys only."""
+    writer = FeatureStoreWriter(write, max_in_flight=3)
+    writer.submit("a", offsets(10), keys={"BTC/USD"})
+    writer.submit("b", offsets(20), keys={"BTC/USD", "ETH/USD"})
+    writer.submit("c", offsets(30), keys={"XRP/USD"})
+
+    write.release("b", "c")
+    wait_written(writer, 2)
+    assert write.finished == ["c"]
+    assert "b" not in write.started
+
+    write.release("a")
+    writer.acknowledged_offsets(wait=True)
+    assert write.finished == ["c", "a", "b"]
+    writer.close()
+
+
+def test_failed_write_raises_before_its_offsets_are_acknowledged():
+    """The offsets of a failed buffer and the ones after it are not returned."""
+    write = GatedWrite(failing=("a",))
+    writer = FeatureStoreWriter(write, max_in_flight=2)
+    writer.submit("a", offsets(10), keys=set())
+    writer.submit("b", offsets(20), keys=set())
+    write.release("a", "b")
+    wait_written(writer, 0, 1)
+
+    with pytest.raises(ConnectionError, match="insert of a failed"):
+        writer.acknowledged_offsets()
+    writer.close()
@@ -0,0 +1,118 @@
+import pytest
+
+from utils import flush_policy
+from utils.flush_policy import FlushPolicy
+
+
+@pytest.fixture
+def now(monkeypatch) -> list[float]:
+    """Run the policy on a fake clock, advanced by the tests."""
+    now = [1_000.0]
+    monkeypatch.setattr(flush_policy.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_invalid_max_rows_raises():
+    """A flush needs at least one row."""
+    with pytest.raises(ValueError, match="max_rows must be > 0"):
+        FlushPolicy(max_rows=0)
+
+
+def test_empty_buffer_is_never_flushed(now):
+    """Limits only apply once a bar is buffered."""
+    policy = FlushPolicy(max_rows=1, max_bytes=0, max_age_sec=0)
+
+    assert not policy.should_flush()
+
+
+def test_flush_at_max_rows():
+    """The buffer is flushed once it holds max_rows bars."""
+    policy = FlushPolicy(max_rows=3)
+
+    policy.add(100, n_rows=2)
+    assert not policy.should_flush()
+    policy.add(50)
+    assert policy.should_flush()
+
+    policy.reset()
+    assert not policy.should_flush()
+
+
+def test_flush_at_max_bytes():
+    """The buffer is flushed once its messages reach max_bytes."""
+    policy = FlushPolicy(max_rows=100, max_bytes=1_000)
+
+    policy.add(999, n_rows=10)
+    assert not policy.should_flush()
+    policy.add(1)
+    assert policy.should_flush()
+
+
+def test_flush_at_max_age(now):
+    """The buffer is flushed once its oldest bar waited max_age_sec."""
+    policy = FlushPolicy(max_rows=100, max_age_sec=10)
+    policy.add(100)
+
+    now[0] += 9
+    policy.add(100)
+    assert not policy.should_flush()
+    now[0] += 1
+    assert policy.should_flush()
+
+    # The age counts from the first bar of the new buffer
+    policy.reset()
+    policy.add(100)
+    assert not policy.should_flush()
+
+
+def test_slow_insert_halves_max_rows():
+    """An insert slower than the target halves the rows per flush."""
+    policy = FlushPolicy(max_rows=1_000, target_write_sec=2)
+
+    policy.observe_write(1_000, latency=3)
+    assert policy.max_rows == 500
+
+    # A smaller insert that was slow halves its own size
+    policy.observe_write(100, latency=3)
+    assert policy.max_rows == 50
+
+    for _ in range(10):
+        policy.observe_write(policy.max_rows, latency=3)
+    assert policy.max_rows == 1
+
+
+def test_fast_insert_doubles_max_rows_up_to_the_limit():
+    """A full insert faster than half the target doubles the rows."""
+    policy = FlushPolicy(
+        max_rows=100, target_write_sec=2, max_rows_limit=300
+    )
+
+    # Partial buffers flushed by age do not grow the size
+    policy.observe_write(50, latency=0.5)
+    assert policy.max_rows == 100
+
+    policy.observe_write(100, latency=0.5)
+    assert policy.max_rows == 200
+    policy.observe_write(200, latency=0.5)
+    assert policy.max_rows == 300
+
+
+def test_insert_close_to_the_target_keeps_max_rows():
+    """Inserts between half the target and the target change nothing."""
+    policy = FlushPolicy(max_rows=100, target_write_sec=2, max_rows_limit=400)
+
+    policy.observe_write(100, latency=1.5)
+
+    assert policy.max_rows == 100
+
+
+def test_max_rows_is_fixed_without_a_target():
+    """Without a target latency, the rows per flush never change."""
+    policy = FlushPolicy(max_rows=100, max_rows_limit=400)
+
+    policy.observe_write(100, latency=60)
+    policy.observe_write(100, latency=0)
+
+    assert policy.max_rows == 100
+    # The limit defaults to max_rows
+    assert FlushPolicy(max_rows=100).max_rows_limit == 100
@@ -0,0 +1,94 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from hopswork.hopswork_api import (
+    push_bars_to_online_feature_store,
+    read_bars_window,
+)
+from utils.bar_windows import BarWindows
+
+
+def make_bar(i: int, product_id: str = "BTC/USD") -> dict:
+    """Return a bar of a product, one minute after the previous one."""
+    return {
+        "product_id": product_id,
+        "close": 60_000.0 + i,
+        "start_timestamp_unix": 1_700_000_000_000 + i * 60_000,
+        "end_timestamp_unix": 1_700_000_000_000 + (i + 1) * 60_000,
+    }
+
+
+def make_client(get_feature_vector) -> MagicMock:
+    """Return a client whose feature view reads vectors with the callable."""
+    session = MagicMock()
+    session.feature_view.return_value.get_feature_vector.side_effect = (
+        get_feature_vector
+    )
+    client = MagicMock()
+    client.call.side_effect = lambda operation: operation(session)
+    client.session = session
+    return client
+
+
+def inserted_rows(client: MagicMock) -> list:
+    """Return the rows of the windows inserted into the feature group."""
+    insert = client.session.feature_group.return_value.insert
+    (rows,), _ = insert.call_args
+    return rows.to_dict("records")
+
+
+@pytest.mark.parametrize("vector", [[None, None], ["BTC/USD", ""], []])
+def test_missing_key_is_an_empty_window(vector):
+    """A product not in the feature group yet has an empty window."""
+    client = make_client(lambda entry, allow_missing: vector)
+
+    assert read_bars_window(client, MagicMock(), "BTC/USD") == []
+    get_feature_vector = (
+        client.session.feature_view.return_value.get_feature_vector
+    )
+    get_feature_vector.assert_called_once_with(
+        {"product_id": "BTC/USD"}, allow_missing=True
+    )
+
+
+def test_stored_window_is_read():
+    """The stored JSON array of bars is the window of the product."""
+    bars = [make_bar(0), make_bar(1)]
+    client = make_client(
+        lambda entry, allow_missing: ["BTC/USD", json.dumps(bars)]
+    )
+
+    assert read_bars_window(client, MagicMock(), "BTC/USD") == bars
+
+
+def test_failed_read_is_retried_with_the_next_write():
+    """A window that could not be read is not overwritten by new bars."""
+    stored = [make_bar(0), make_bar(1)]
+    reads = iter(
+        [ConnectionError("online store down"), ["BTC/USD", json.dumps(stored)]]
+    )
+
+    def get_feature_vector(entry, allow_missing):
+        read = next(reads)
+        if isinstance(read, Exception):
+            raise read
+        return read
+
+    client = make_client(get_feature_vector)
+    bar_windows = BarWindows(window_size=14)
+
+    with pytest.raises(ConnectionError):
+        push_bars_to_online_feature_store(
+            client, "bars", 1, ["product_id"], [make_bar(2)], bar_windows
+        )
+    assert "BTC/USD" not in bar_windows
+    assert not client.session.feature_group.return_value.insert.called
+
+    push_bars_to_online_feature_store(
+        client, "bars", 1, ["product_id"], [make_bar(2)], bar_windows
+    )
+
+    (row,) = inserted_rows(client)
+    assert json.loads(row["bars_array"]) == [*stored, make_bar(2)]
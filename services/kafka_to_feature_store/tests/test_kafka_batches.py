@@ -0,0 +1,46 @@
+from unittest.mock import MagicMock
+
+import pytest
+from quixstreams.kafka import Consumer
+
+from utils import kafka_batches
+from utils.kafka_batches import poll_batch
+
+
+def make_consumer(messages: list) -> MagicMock:
+    """Return a consumer polling the messages, then timing out."""
+    consumer = MagicMock(spec=Consumer)
+    consumer.poll.side_effect = [*messages, None]
+    return consumer
+
+
+def test_poll_batch_stops_at_max_messages():
+    """Polling stops once the batch is full."""
+    consumer = make_consumer(list(range(10)))
+
+    assert poll_batch(consumer, 3, timeout=1) == [0, 1, 2]
+    assert consumer.poll.call_count == 3
+
+
+def test_poll_batch_returns_messages_polled_before_timeout():
+    """A poll returning no message ends the batch early."""
+    consumer = make_consumer([1, 2])
+
+    assert poll_batch(consumer, 10, timeout=1) == [1, 2]
+
+
+def test_poll_batch_waits_the_remaining_time(monkeypatch):
+    """Every poll waits at most until the batch deadline."""
+    now = [100.0]
+    monkeypatch.setattr(kafka_batches.time, "monotonic", lambda: now[0])
+    consumer = make_consumer([])
+
+    def poll(timeout):
+        now[0] += 0.4
+        return "msg"
+
+    consumer.poll.side_effect = poll
+
+    assert poll_batch(consumer, 10, timeout=1) == ["msg"] * 3
+    timeouts = [call.args[0] for call in consumer.poll.call_args_list]
+    assert timeouts == pytest.approx([1, 0.6, 0.2])
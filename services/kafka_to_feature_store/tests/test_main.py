@@ -0,0 +1,180 @@
+import json
+from unittest.mock import MagicMock, Mock
+
+import pytest
+from confluent_kafka import TopicPartition
+from quixstreams.kafka import Consumer
+
+import main
+from main import PublishToFeatureStore
+
+
+class FakeMessage:
+    """Kafka message of a bar."""
+
+    def __init__(self, bar: dict, offset: int) -> None:
+        """Initialize the message of a bar at an offset."""
+        self._value = json.dumps(bar).encode()
+        self._offset = offset
+
+    def value(self) -> bytes:
+        """Return the value of the message."""
+        return self._value
+
+    def error(self) -> None:
+        """Return no error."""
+        return None
+
+    def topic(self) -> str:
+        """Return the topic of the message."""
+        return "bars"
+
+    def partition(self) -> int:
+        """Return the partition of the message."""
+        return 0
+
+    def offset(self) -> int:
+        """Return the offset of the message."""
+        return self._offset
+
+
+def make_bar(i: int) -> dict:
+    """Return a bar of BTC, one minute after the previous one."""
+    return {
+        "product_id": "BTC/USD",
+        "close": 60_000.0 + i,
+        "start_time": 1_700_000_000_000 + i * 60_000,
+        "last_trade_time": 1_700_000_000_000 + (i + 1) * 60_000,
+        "emitted_at": 1_700_000_000_000 + (i + 1) * 60_000,
+    }
+
+
+def make_consumer(messages: list, end_offset: int) -> MagicMock:
+    """Return a consumer of a partition holding the messages.
+
+    Polls return None once the messages are consumed.
+    """
+    consumer = MagicMock(spec=Consumer)
+    consumer.__enter__.return_value = consumer
+    consumer.poll.side_effect = [*messages, *[None] * 10]
+    consumer.assignment.return_value = [TopicPartition("bars", 0)]
+    consumer.position.return_value = [TopicPartition("bars", 0, end_offset)]
+    consumer.get_watermark_offsets.return_value = (0, end_offset)
+    return consumer
+
+
+def make_publisher(
+    monkeypatch, consumer: MagicMock, buffer_size: int
+) -> tuple[PublishToFeatureStore, list]:
+    """Return a historical publisher reading from the consumer.
+
+    The bars written are appended to the returned list.
+    """
+    app = Mock()
+    app.get_consumer.return_value = consumer
+    app.topic.return_value.name = "bars"
+    monkeypatch.setattr(main, "Application", Mock(return_value=app))
+    publisher = PublishToFeatureStore(
+        "localhost:9092",
+        "bars",
+        ["product_id"],
+        "start_time",
+        "tests",
+        new_consumer_group=False,
+        feature_group="bars",
+        feature_group_version=1,
+        feature_store_client=Mock(),
+        buffer_size=buffer_size,
+        live_or_historical="historical",
+        save_every_n_sec=None,
+    )
+    written: list = []
+    publisher.push_buffer = lambda buffer: written.append(  # type: ignore
+        buffer.columns["close"]
+    )
+    return publisher, written
+
+
+@pytest.mark.parametrize("buffer_size", [2, 10])
+def test_historical_run_writes_every_bar_and_exits(monkeypatch, buffer_size):
+    """The bars are polled in buffers, written, and their offsets stored."""
+    messages = [FakeMessage(make_bar(i), i) for i in range(5)]
+    consumer = make_consumer(messages, end_offset=5)
+    publisher, written = make_publisher(monkeypatch, consumer, buffer_size)
+
+    publisher.run()
+
+    assert [close for buffer in written for close in buffer] == [
+        make_bar(i)["close"] for i in range(5)
+    ]
+    assert max(map(len, written)) <= buffer_size
+    offsets = consumer.store_offsets.call_args.kwargs["offsets"]
+    assert [(tp.topic, tp.partition, tp.offset) for tp in offsets] == [
+        ("bars", 0, 5)
+    ]
+
+
+def test_failed_write_stops_the_run_without_storing_offsets(monkeypatch):
+    """Bars that could not be written are read again on restart."""
+    messages = [FakeMessage(make_bar(i), i) for i in range(5)]
+    consumer = make_consumer(messages, end_offset=5)
+    publisher, _ = make_publisher(monkeypatch, consumer, buffer_size=2)
+
+    def push_buffer(buffer):
+        raise ConnectionError("feature store down")
+
+    publisher.push_buffer = push_buffer  # type: ignore
+
+    with pytest.raises(ConnectionError):
+        publisher.run()
+    assert not consumer.store_offsets.called
+
+
+@pytest.mark.parametrize(
+    "positions, high, caught_up",
+    [
+        # No message consumed yet from a partition with messages
+        ([-1001, 5], 5, False),
+        ([3, 5], 5, False),
+        ([5, 5], 5, True),
+        # Empty partition, the position stays invalid
+        ([-1001, 5], 0, True),
+    ],
+)
+def test_is_caught_up(positions, high, caught_up):
+    """Every assigned partition must be consumed up to its end."""
+    consumer = MagicMock(spec=Consumer)
+    partitions = [TopicPartition("bars", p) for p in range(len(positions))]
+    consumer.assignment.return_value = partitions
+    consumer.position.return_value = [
+        TopicPartition("bars", p, offset) for p, offset in enumerate(positions)
+    ]
+    consumer.get_watermark_offsets.side_effect = lambda tp, timeout: (
+        0,
+        high if tp.partition == 0 else 5,
+    )
+
+    assert PublishToFeatureStore.is_caught_up(consumer) is caught_up
+
+
+def test_is_not_caught_up_before_the_assignment():
+    """No partition is assigned until the consumer group rebalanced."""
+    consumer = MagicMock(spec=Consumer)
+    consumer.assignment.return_value = []
+
+    assert not PublishToFeatureStore.is_caught_up(consumer)
+
+
+def test_live_run_keeps_waiting_for_bars(monkeypatch):
+    """Live runs do not exit once the topic is consumed."""
+    messages = [FakeMessage(make_bar(i), i) for i in range(5)]
+    consumer = make_consumer(messages, end_offset=5)
+    consumer.poll.side_effect = [*messages, None, None, KeyboardInterrupt()]
+    publisher, written = make_publisher(monkeypatch, consumer, buffer_size=2)
+    publisher.live_or_historical = "live"
+
+    with pytest.raises(KeyboardInterrupt):
+        publisher.run()
+    assert not consumer.assignment.called
+    # The last bar waits for the buffer to fill or to be old enough
+    assert sum(map(len, written)) == 4
@@ -164,9 +164,15 @@ class Predictor:
         )
         ohlc_data_dict = json.loads(ohlc_data[1])
         ohlc_data_df = pd.DataFrame(ohlc_data_dict)
+        # Build the datetimes from the Unix milliseconds stored with every
+        # bar instead of parsing the ISO dates
         ohlc_data_df = ohlc_data_df.assign(
-            start_time=pd.to_datetime(ohlc_data_df["start_time"], utc=True),
-            end_time=pd.to_datetime(ohlc_data_df["end_time"], utc=True),
+            start_time=pd.to_datetime(
+                ohlc_data_df["start_timestamp_unix"], unit="ms", utc=True
+            ),
+            end_time=pd.to_datetime(
+                ohlc_data_df["end_timestamp_unix"], unit="ms", utc=True
+            ),
         )
         logger.info("Creating features for inference")
         feature_engineering = FeatureEngineer(config=self.features_config)
@@ -1,18 +1,85 @@
 from abc import abstractmethod
-from collections import defaultdict
-from typing import Any
+from typing import Any, ClassVar, Self
 
 from quixstreams import State
+
+from monitoring.pipeline_metrics import EMITTED_AT, LAST_TRADE_TIME, now_ms
+from settings.config import PRODUCT_ID_MAPPING, ProductId
 from utils.logging_config import logger
 
 
+class InMemoryState:
+    """Dict-backed state with the subset of the quixstreams State interface.
+
+    Runs the bar engines outside of a quixstreams application, with the bar
+    state of each product kept in memory.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty state."""
+        self._data: dict[str, Any] = {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get the value for a key, or default if it is not set."""
+        return self._data.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        """Set the value for a key."""
+        self._data[key] = value
+
+    def delete(self, key: str) -> None:
+        """Delete a key, if it is set."""
+        self._data.pop(key, None)
+
+
+class BarState:
+    """Base class for the bar in progress of a single product.
+
+    Subclasses are slotted dataclasses. They are stored in the state store as
+    one flat record whose first element is the schema version, so the whole
+    bar state is read and written with a single state round-trip.
+    """
+
+    __slots__: tuple[str, ...] = ()
+
+    SCHEMA_VERSION: ClassVar[int] = 1
+
+    def to_record(self) -> list[Any]:
+        """Pack the state into a versioned flat record."""
+        return [
+            self.SCHEMA_VERSION,
+            *(getattr(self, field) for field in self.__slots__),
+        ]
+
+    @classmethod
+    def from_record(cls, record: list[Any]) -> Self:
+        """Unpack a versioned flat record."""
+        version, *fields = record
+        if version != cls.SCHEMA_VERSION:
+            raise ValueError(f"Unsupported state schema version: {version}")
+        return cls(*fields)
+
+
 class FinanceDataStructure:
-    """Finance data structure base class."""
+    """Finance data structure base class.
+
+    Implements the hot path shared by every bar engine: the bar state of the
+    trade's product is loaded once, updated by `update_bar` and written back
+    once, and completed bars are written to the output topic. Every bar is
+    tagged with the timestamp of the trade that completed it and the time it
+    was emitted at, to trace its latency down to the feature store.
+    """
+
+    # State store key of the engine's bar state. Engines use different keys,
+    # so several of them can share the state of a product.
+    STATE_KEY: ClassVar[str]
+    STATE_CLASS: ClassVar[type[BarState]]
 
     def __init__(
         self,
         output_producer: Any,
         ouput_topic: Any,
+        products: list[ProductId],
     ) -> None:
         """Initialize generic financial data structure.
 
@@ -20,46 +87,89 @@ class FinanceDataStructure:
         ----
         output_producer (Any): Kafka producer.
         ouput_topic (Any): Kafka topic.
-        threshold_interval (float): Threshold to create a bar.
+        products (list[ProductId]): Products the engine creates bars for.
 
         """
         self.output_producer = output_producer
         self.output_topic = ouput_topic
-        self.bars: defaultdict[Any, Any] = defaultdict(
-            lambda: self.initialize_bar(None, None, None)
-        )
+        self.products = products
+        self.threshold_intervals = {
+            PRODUCT_ID_MAPPING.get(product.coin): product.aggregation.interval
+            for product in products
+        }
+        # When buffering, completed bars are kept until `flush_bars` is called
+        # instead of being produced as soon as they are complete.
+        self.buffer_bars = False
+        self.pending_bars: list[Any] = []
+        # Timestamp of the trade being processed
+        self.last_trade_time: int | None = None
 
-    @abstractmethod
-    def initialize_bar(
-        self, price: float, timestamp: int, product_id: str
-    ) -> dict:
-        """Initialize the data structure."""
-        pass
+    def load_state(self, state: State) -> BarState:
+        """Read the bar state of the product from the state store."""
+        record = state.get(self.STATE_KEY)
+        if record is None:
+            return self.STATE_CLASS()
+        return self.STATE_CLASS.from_record(record)
 
-    @abstractmethod
-    def process_trade(self, trade: dict, state: State | None) -> None:
+    def process_trade(
+        self, trade: dict[str, Any], state: State
+    ) -> dict[str, Any]:
         """Process the trade and update the data structure."""
-        pass
+        bar_state = self.load_state(state)
+        self.last_trade_time = trade["timestamp"]
+        self.update_bar(bar_state, trade)
+        state.set(self.STATE_KEY, bar_state.to_record())
+        return trade
+
+    def process_trades(
+        self, trades: list[dict[str, Any]], state: State
+    ) -> list[dict[str, Any]]:
+        """Process a batch of trades of a single product, in order.
+
+        The bar state is read once before and written once after the whole
+        batch.
+        """
+        bar_state = self.load_state(state)
+        for trade in trades:
+            self.last_trade_time = trade["timestamp"]
+            self.update_bar(bar_state, trade)
+        state.set(self.STATE_KEY, bar_state.to_record())
+        return trades
 
     @abstractmethod
-    def is_bar_complete(
-        self, bar: dict[str, Any], trade: dict[str, Any]
-    ) -> bool:
-        """Check if the bar is complete."""
+    def update_bar(self, bar_state: Any, trade: dict[str, Any]) -> None:
+        """Update the bar in progress with a trade, emitting it if complete."""
         pass
 
-    def get_bar(self, product_id: str) -> dict[str, Any]:
-        """Get the current bar for a given product."""
-        return self.bars[product_id]
-
     def write_bar_to_topic(
         self,
         product_id: str,
         bar: dict,
     ) -> None:
         """Write the completed bar to the output topic."""
-        logger.info(f"Volume bar for {product_id}: {bar}")
+        bar[LAST_TRADE_TIME] = self.last_trade_time
+        bar[EMITTED_AT] = now_ms()
+        logger.info(f"{self.__class__.__name__} bar for {product_id}: {bar}")
         message = self.output_topic.serialize(product_id, value=bar)
+        if self.buffer_bars:
+            self.pending_bars.append(message)
+            return
         self.output_producer.produce(
             self.output_topic.name, value=message.value, key=message.key
         )
+
+    def flush_bars(self) -> int:
+        """Produce all the buffered bars to the output topic.
+
+        Returns
+        -------
+        int: The number of bars produced.
+
+        """
+        for message in self.pending_bars:
+            self.output_producer.produce(
+                self.output_topic.name, value=message.value, key=message.key
+            )
+        n_bars = len(self.pending_bars)
+        self.pending_bars = []
+        return n_bars
@@ -0,0 +1,127 @@
+import time
+from collections import defaultdict
+from typing import Any
+
+from finance_data_structures.base import FinanceDataStructure
+from finance_data_structures.tick_imbalance_bars import TickImbalanceBars
+from finance_data_structures.time_bars import TimeBars
+from finance_data_structures.volume_bars import DollarBars, VolumeBars
+from monitoring.monitoring_metrics import monitoring
+from settings.config import PRODUCT_ID_MAPPING, ProductId
+from utils.logging_config import logger
+
+# Bar engine for each `aggregation.type`
+BAR_ENGINES: dict[str, type[FinanceDataStructure]] = {
+    "tick imbalance": TickImbalanceBars,
+    "volume": VolumeBars,
+    "dollar": DollarBars,
+    "time": TimeBars,
+}
+
+
+class BarEngines:
+    """Route each trade to the bar engines of its product.
+
+    One engine is created per aggregation type in use, with the products
+    configured with that type, so a single consumer builds the bars of every
+    product whatever their aggregation type. A coin listed with several
+    aggregation types is dispatched to each of their engines, so the trades
+    are consumed and deserialized once for all the bar types. Each engine
+    keeps its bar state under its own state key and writes to its own output
+    topic.
+    """
+
+    def __init__(
+        self,
+        output_producer: Any,
+        output_topic: Any,
+        products: list[ProductId],
+        output_topics: dict[str, Any] | None = None,
+    ) -> None:
+        """Create the bar engines for the configured products.
+
+        Args:
+        ----
+        output_producer (Any): Kafka producer.
+        output_topic (Any): Default Kafka topic of the bars.
+        products (list[ProductId]): Products and their aggregation methods.
+        output_topics (dict[str, Any] | None): Kafka topic of each
+            aggregation type. Types not listed write to `output_topic`.
+
+        """
+        output_topics = output_topics or {}
+        products_by_type: defaultdict[str, list[ProductId]] = defaultdict(list)
+        for product in products:
+            products_by_type[product.aggregation.type].append(product)
+
+        self.engines = {
+            aggregation_type: BAR_ENGINES[aggregation_type](
+                output_producer,
+                output_topics.get(aggregation_type, output_topic),
+                type_products,
+            )
+            for aggregation_type, type_products in products_by_type.items()
+        }
+        self.engines_by_product: defaultdict[
+            str, list[FinanceDataStructure]
+        ] = defaultdict(list)
+        for product in products:
+            product_id = PRODUCT_ID_MAPPING.get(product.coin)
+            self.engines_by_product[product_id].append(
+                self.engines[product.aggregation.type]
+            )
+
+    def get_engines(
+        self, trade: dict[str, Any]
+    ) -> list[FinanceDataStructure]:
+        """Return the bar engines of the trade's product."""
+        engines = self.engines_by_product.get(
+            PRODUCT_ID_MAPPING.get(trade["product_id"]), []
+        )
+        if not engines:
+            logger.warning(f"No bar engine for {trade['product_id']}")
+        return engines
+
+    def process_trade(
+        self, trade: dict[str, Any], state: Any
+    ) -> dict[str, Any]:
+        """Process the trade with every bar engine of its product."""
+        monitoring.observe_since(
+            "trade_ingest", trade["product_id"], trade["timestamp"]
+        )
+        start_time = time.perf_counter()
+        for engine in self.get_engines(trade):
+            engine.process_trade(trade, state)
+        monitoring.observe_stage(
+            "bar_formation", time.perf_counter() - start_time
+        )
+        return trade
+
+    def process_trades(
+        self, trades: list[dict[str, Any]], state: Any
+    ) -> list[dict[str, Any]]:
+        """Process a batch of trades of a single product."""
+        monitoring.observe_since(
+            "trade_ingest", trades[-1]["product_id"], trades[-1]["timestamp"]
+        )
+        start_time = time.perf_counter()
+        for engine in self.get_engines(trades[0]):
+            engine.process_trades(trades, state)
+        monitoring.observe_stage(
+            "bar_formation", time.perf_counter() - start_time
+        )
+        return trades
+
+    @property
+    def buffer_bars(self) -> bool:
+        """Whether the engines buffer completed bars until flushed."""
+        return all(engine.buffer_bars for engine in self.engines.values())
+
+    @buffer_bars.setter
+    def buffer_bars(self, value: bool) -> None:
+        for engine in self.engines.values():
+            engine.buffer_bars = value
+
+    def flush_bars(self) -> int:
+        """Produce the buffered bars of every engine."""
+        return sum(engine.flush_bars() for engine in self.engines.values())
@@ -1,83 +1,182 @@
-from dataclasses import asdict, dataclass
-from datetime import datetime
+import math
+from dataclasses import dataclass
 from typing import Any
 
-import numpy as np
 from quixstreams import State
 
-from finance_data_structures.base import FinanceDataStructure
-from settings.config import PRODUCT_ID_MAPPING, ProductId
+from finance_data_structures.base import BarState, FinanceDataStructure
+from settings.config import PRODUCT_ID_MAPPING
+from utils.timestamps import to_ms
 
+# Per-field state keys used before the bar state was packed into one record.
+# They are only read to migrate existing state stores.
+LEGACY_STATE_KEYS = (
+    "product_id",
+    "cumulative_imbalance",
+    "ticks_counter",
+    "buy_trades",
+    "open",
+    "high",
+    "low",
+    "volume",
+    "cumulative_trade_amount",
+    "start_time",
+    "end_time",
+    "price_mean",
+    "price_m2",
+    "run_side",
+    "run_length",
+    "max_buy_run",
+    "max_sell_run",
+    "price_path",
+    "trade_sequences",
+)
 
-@dataclass
-class TradeSequence:
-    """Helper class to track trade sequences within a bar."""
+SIDE_TO_CODE = {None: 0, "buy": 1, "sell": -1}
 
-    side: str
-    count: int = 1
 
-    def to_dict(self) -> dict[str, Any]:
-        """Convert TradeSequence to dictionary for serialization."""
-        return asdict(self)
+@dataclass(slots=True)
+class TickImbalanceState(BarState):
+    """Tick imbalance bar in progress for a single product."""
+
+    cumulative_imbalance: int = 0
+    ticks: int = 0
+    buy_trades: int = 0
+    open: float | None = None
+    high: float = 0
+    low: float = 99999999999
+    volume: float = 0
+    cumulative_trade_amount: float = 0
+    start_time: int | None = None
+    previous_end_time: int | None = None
+    price_mean: float = 0.0
+    price_m2: float = 0.0
+    run_side: int = 0
+    run_length: int = 0
+    max_buy_run: int = 0
+    max_sell_run: int = 0
 
     @classmethod
-    def from_dict(cls, data: dict[str, Any]) -> "TradeSequence":
-        """Create TradeSequence from dictionary."""
-        return cls(**data)
+    def from_legacy_state(cls, state: State) -> "TickImbalanceState | None":
+        """Build the packed record from the legacy per-field state keys.
+
+        Supports both the price_path/trade_sequences lists and the running
+        accumulators layouts. Returns None if no legacy state is present.
+        """
+        if (
+            state.get("ticks_counter") is None
+            and state.get("end_time") is None
+        ):
+            return None
+
+        bar_state = cls(
+            cumulative_imbalance=state.get("cumulative_imbalance", default=0),
+            ticks=state.get("ticks_counter", default=0),
+            buy_trades=state.get("buy_trades", default=0),
+            open=state.get("open"),
+            high=state.get("high", default=0),
+            low=state.get("low", default=99999999999),
+            volume=state.get("volume", default=0),
+            cumulative_trade_amount=state.get(
+                "cumulative_trade_amount", default=0
+            ),
+            start_time=to_ms(state.get("start_time")),
+            previous_end_time=to_ms(state.get("end_time") or None),
+            price_mean=state.get("price_mean", default=0.0),
+            price_m2=state.get("price_m2", default=0.0),
+            run_side=SIDE_TO_CODE[state.get("run_side")],
+            run_length=state.get("run_length", default=0),
+            max_buy_run=state.get("max_buy_run", default=0),
+            max_sell_run=state.get("max_sell_run", default=0),
+        )
+
+        price_path = state.get("price_path", default=[])
+        for count, price in enumerate(price_path, start=1):
+            bar_state.update_price(price, count)
+        for sequence in state.get("trade_sequences", default=[]):
+            bar_state.run_side = SIDE_TO_CODE[sequence["side"]]
+            bar_state.run_length = sequence["count"]
+            bar_state.update_max_runs()
+
+        return bar_state
+
+    def update_price(self, price: float, count: int) -> None:
+        """Update the running price mean and M2 (Welford's algorithm)."""
+        delta = price - self.price_mean
+        self.price_mean += delta / count
+        self.price_m2 += delta * (price - self.price_mean)
+
+    def update_run(self, side: str) -> None:
+        """Update the current run of consecutive trades on the same side."""
+        side_code = SIDE_TO_CODE[side]
+        if self.run_side == side_code:
+            self.run_length += 1
+        else:
+            self.run_side = side_code
+            self.run_length = 1
+        self.update_max_runs()
+
+    def update_max_runs(self) -> None:
+        """Update the max buy/sell runs with the current run."""
+        if self.run_side == SIDE_TO_CODE["buy"]:
+            self.max_buy_run = max(self.max_buy_run, self.run_length)
+        elif self.run_side == SIDE_TO_CODE["sell"]:
+            self.max_sell_run = max(self.max_sell_run, self.run_length)
+
+    def reset(self, end_time: int) -> None:
+        """Reset the accumulators after a bar has been emitted.
+
+        The open price and start time are kept, as they are only overwritten
+        by the first trade of the next bar.
+        """
+        self.cumulative_imbalance = 0
+        self.ticks = 0
+        self.buy_trades = 0
+        self.high = 0
+        self.low = 99999999999
+        self.volume = 0
+        self.cumulative_trade_amount = 0
+        self.previous_end_time = end_time
+        self.price_mean = 0.0
+        self.price_m2 = 0.0
+        self.run_side = 0
+        self.run_length = 0
+        self.max_buy_run = 0
+        self.max_sell_run = 0
 
 
 class TickImbalanceBars(FinanceDataStructure):
-    """Enhanced tick imbalance bars data structure with additional features."""
+    """Enhanced tick imbalance bars data structure with additional features.
 
-    def __init__(
-        self, output_producer: Any, output_topic: Any, products: list[ProductId]
-    ) -> None:
-        """Initialize the tick imbalance-based financial data structure."""
-        super().__init__(output_producer, output_topic)
-        self.threshold_intervals = {
-            PRODUCT_ID_MAPPING.get(product.coin): product.aggregation.interval
-            for product in products
-        }
+    The bar in progress is kept as a fixed set of running accumulators in the
+    state store (Welford mean/M2 for the price volatility, current run and
+    max buy/sell runs), so processing a trade is constant time and the state
+    size does not grow with the number of ticks in the bar. The accumulators
+    are packed into a single record per product key.
+    """
 
-    def initialize_bar(
-        self, price: float, timestamp: int, product_id: str
-    ) -> dict:
-        """Initialize the data structure with additional features."""
-        return {
-            "product_id": product_id,
-            "open": price,
-            "high": price,
-            "low": price,
-            "close": price,
-            "volume": 0,
-            "start_time": timestamp,
-            "end_time": timestamp,
-            "tick_imbalance": 0,
-            "ticks": 0,
-            "cumulative_trade_amount": 0,
-            # New features
-            "net_buy_ratio": 0.0,
-            "bar_formation_time_seconds": 0.0,
-            "trade_intensity": 0.0,
-            "max_buy_run": 0,
-            "max_sell_run": 0,
-            "price_volatility": 0.0,
-            "inter_bar_gap_seconds": 0,
-        }
+    STATE_KEY = "tick_imbalance_bar"
+    STATE_CLASS = TickImbalanceState
+
+    def load_state(self, state: State) -> TickImbalanceState:
+        """Read the packed bar state, migrating legacy state if needed."""
+        record = state.get(self.STATE_KEY)
+        if record is not None:
+            return TickImbalanceState.from_record(record)
+
+        bar_state = TickImbalanceState.from_legacy_state(state)
+        if bar_state is None:
+            return TickImbalanceState()
+        for key in LEGACY_STATE_KEYS:
+            state.delete(key)
+        return bar_state
 
     def calculate_features(
-        self,
-        state: State,
-        current_time: str,
-        prices: list[float],
-        trade_sequences: list[
-            dict[str, Any]
-        ],  # Now expects serialized sequences
+        self, bar_state: TickImbalanceState, current_time: int
     ) -> dict:
-        """Calculate additional bar features."""
-        buy_trades = state.get("buy_trades", default=0)
-        total_ticks = state.get("ticks_counter", default=0)
-        start_time = state.get("start_time")
+        """Calculate additional bar features from the running accumulators."""
+        buy_trades = bar_state.buy_trades
+        total_ticks = bar_state.ticks
 
         # 1. Net Buy Ratio (-1 to 1)
         net_buy_ratio = (
@@ -85,50 +184,29 @@ class TickImbalanceBars(FinanceDataStructure):
         )
 
         # 2. Bar Formation Time (seconds)
-        end_time = datetime.fromisoformat(current_time.rstrip("Z"))
-        start_time = datetime.fromisoformat(start_time.rstrip("Z"))
-        bar_formation_time = (
-            end_time - start_time
-        ).total_seconds()  # Convert to seconds
+        bar_formation_time = (current_time - bar_state.start_time) / 1000
 
         # 3. Intrabar Trade Intensity (trades per second)
         trade_intensity = (
             (total_ticks / bar_formation_time) if bar_formation_time > 0 else 0
         )
 
-        # 4. Max Consecutive Buy/Sell Runs
-        max_buy_run = 0
-        max_sell_run = 0
-        current_run = 0
-
-        for seq in trade_sequences:
-            if seq["side"] == "buy":
-                if current_run > 0:
-                    current_run += seq["count"]
-                else:
-                    current_run = seq["count"]
-                max_buy_run = max(max_buy_run, current_run)
-            else:  # sell
-                if current_run < 0:
-                    current_run -= seq["count"]
-                else:
-                    current_run = -seq["count"]
-                max_sell_run = max(max_sell_run, abs(current_run))
+        # 4. Max Consecutive Buy/Sell Runs, tracked while processing trades
+        max_buy_run = bar_state.max_buy_run
+        max_sell_run = bar_state.max_sell_run
 
         # 5. Intrabar Price Volatility
-        # Using standard deviation of price changes
-        price_volatility = np.std(prices) if len(prices) > 1 else 0
+        # Population standard deviation of the prices from the Welford M2
+        price_volatility = (
+            math.sqrt(bar_state.price_m2 / total_ticks)
+            if total_ticks > 1
+            else 0
+        )
 
-        if state.get("end_time", default=0) != 0:
-            previous_candle_end_time = datetime.fromisoformat(
-                state.get("end_time").rstrip("Z")
-            )
-            start_time = datetime.fromisoformat(
-                state.get("start_time").rstrip("Z")
-            )
+        if bar_state.previous_end_time is not None:
             inter_bar_gap_seconds = (
-                start_time - previous_candle_end_time
-            ).total_seconds()
+                bar_state.start_time - bar_state.previous_end_time
+            ) / 1000
         else:
             inter_bar_gap_seconds = 0
 
@@ -142,113 +220,66 @@ class TickImbalanceBars(FinanceDataStructure):
             "inter_bar_gap_seconds": inter_bar_gap_seconds,
         }
 
-    def process_trade(
-        self, trade: dict[str, Any], state: State
-    ) -> dict[str, Any]:
-        """Create a new tick imbalance bar with enhanced features."""
-        product_id = PRODUCT_ID_MAPPING.get(trade["product_id"])
-        cumulative_imbalance = state.get("cumulative_imbalance", default=0)
-        buy_trades = state.get("buy_trades", default=0)
-        ticks_counter = state.get("ticks_counter", default=0)
-        high = state.get("high", default=0)
-        low = state.get("low", default=99999999999)
-        volume = state.get("volume", default=0)
-        cumulative_trade_amount = state.get(
-            "cumulative_trade_amount", default=0
+    def is_bar_complete(
+        self, bar_state: TickImbalanceState, product_id: str
+    ) -> bool:
+        """Check if the tick imbalance reached the product's threshold."""
+        return (
+            abs(bar_state.cumulative_imbalance)
+            >= self.threshold_intervals[product_id]
         )
 
-        # Get or initialize price path and trade sequence lists
-        price_path = state.get("price_path", default=[])
-        trade_sequences_data = state.get("trade_sequences", default=[])
-        trade_sequences = [
-            TradeSequence.from_dict(seq) for seq in trade_sequences_data
-        ]
-        # Update total ticker
-        ticks_counter += 1
-        state.set("ticks_counter", ticks_counter)
-
-        # Update price path
-        price_path.append(trade["price"])
-        state.set("price_path", price_path)
-
-        # Update trade sequences for tracking consecutive trades
-        if trade_sequences and trade_sequences[-1].side == trade["side"]:
-            trade_sequences[-1].count += 1
-        else:
-            trade_sequences.append(TradeSequence(side=trade["side"]))
+    def update_bar(
+        self, bar_state: TickImbalanceState, trade: dict[str, Any]
+    ) -> None:
+        """Update the bar in progress with a trade, emitting it if complete."""
+        if trade["side"] not in ("buy", "sell"):
+            raise ValueError(f"Invalid trade side: {trade['side']}")
+
+        product_id = PRODUCT_ID_MAPPING.get(trade["product_id"])
+        price = trade["price"]
 
-        # Serialize trade sequences before storing in state
-        state.set("trade_sequences", [seq.to_dict() for seq in trade_sequences])
+        bar_state.ticks += 1
+        bar_state.update_price(price, bar_state.ticks)
+        bar_state.update_run(trade["side"])
         if trade["side"] == "buy":
-            cumulative_imbalance += 1
-            buy_trades += 1
-            state.set("buy_trades", buy_trades)
-            state.set("cumulative_imbalance", cumulative_imbalance)
-        elif trade["side"] == "sell":
-            cumulative_imbalance -= 1
-            state.set("cumulative_imbalance", cumulative_imbalance)
+            bar_state.cumulative_imbalance += 1
+            bar_state.buy_trades += 1
         else:
-            raise ValueError(f"Invalid trade side: {trade['side']}")
-
-        if abs(cumulative_imbalance) >= self.threshold_intervals[product_id]:
-            bar = self.get_bar(product_id)
+            bar_state.cumulative_imbalance -= 1
 
+        if self.is_bar_complete(bar_state, product_id):
             # Calculate additional features
             additional_features = self.calculate_features(
-                state,
-                trade["timestamp"],
-                price_path,
-                [
-                    seq.to_dict() for seq in trade_sequences
-                ],  # Convert to list of dicts
-            )
-            state.set("end_time", trade["timestamp"])
-            bar.update(
-                {
-                    "product_id": product_id,
-                    "open": state.get("open"),
-                    "high": max(high, trade["price"]),
-                    "low": min(low, trade["price"]),
-                    "close": trade["price"],
-                    "volume": round(volume + trade["volume"], 4),
-                    "end_time": trade["timestamp"],
-                    "start_time": state.get("start_time"),
-                    "tick_imbalance": cumulative_imbalance,
-                    "ticks": state.get("ticks_counter"),
-                    "cumulative_trade_amount": round(
-                        cumulative_trade_amount
-                        + trade["volume"] * trade["price"],
-                        4,
-                    ),
-                    **additional_features,  # Add the new features
-                }
+                bar_state, trade["timestamp"]
             )
+            bar = {
+                "product_id": product_id,
+                "open": bar_state.open,
+                "high": max(bar_state.high, price),
+                "low": min(bar_state.low, price),
+                "close": price,
+                "volume": round(bar_state.volume + trade["volume"], 4),
+                "start_time": bar_state.start_time,
+                "end_time": trade["timestamp"],
+                "tick_imbalance": bar_state.cumulative_imbalance,
+                "ticks": bar_state.ticks,
+                "cumulative_trade_amount": round(
+                    bar_state.cumulative_trade_amount
+                    + trade["volume"] * price,
+                    4,
+                ),
+                **additional_features,  # Add the new features
+            }
 
             self.write_bar_to_topic(product_id, bar)
-
-            # Reset state
-            state.set("product_id", None)
-            state.set("cumulative_imbalance", 0)
-            state.set("ticks_counter", 0)
-            state.set("buy_trades", 0)
-            state.set("high", 0)
-            state.set("low", 99999999999)
-            state.set("volume", 0)
-            state.set("cumulative_trade_amount", 0)
-            state.set("price_path", [])
-            state.set("trade_sequences", [])
-            self.bars[product_id] = self.initialize_bar(None, None, None)
+            bar_state.reset(end_time=trade["timestamp"])
 
         else:
-            if ticks_counter == 1:
-                state.set("start_time", trade["timestamp"])
-                state.set("open", trade["price"])
-            state.set("high", max(high, trade["price"]))
-            state.set("low", min(low, trade["price"]))
-            state.set("volume", volume + trade["volume"])
-            state.set(
-                "cumulative_trade_amount",
-                cumulative_trade_amount + trade["volume"] * trade["price"],
-            )
-
-        return trade
+            if bar_state.ticks == 1:
+                bar_state.start_time = trade["timestamp"]
+                bar_state.open = price
+            bar_state.high = max(bar_state.high, price)
+            bar_state.low = min(bar_state.low, price)
+            bar_state.volume += trade["volume"]
+            bar_state.cumulative_trade_amount += trade["volume"] * price
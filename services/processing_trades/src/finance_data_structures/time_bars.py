@@ -0,0 +1,165 @@
+from dataclasses import dataclass, field
+from typing import Any, Self
+
+from finance_data_structures.base import BarState, FinanceDataStructure
+from settings.config import PRODUCT_ID_MAPPING, ProductId
+from utils.logging_config import logger
+from utils.timestamps import ms_to_iso
+
+
+@dataclass(slots=True)
+class TimeWindow:
+    """Open time window of a product."""
+
+    start_ms: int
+    open: float
+    open_ms: int
+    high: float
+    low: float
+    close: float
+    close_ms: int
+    volume: float = 0
+    ticks: int = 0
+
+    def add_trade(self, price: float, volume: float, ts: int) -> None:
+        """Add a trade, which may arrive out of order, to the window."""
+        if ts < self.open_ms:
+            self.open, self.open_ms = price, ts
+        if ts >= self.close_ms:
+            self.close, self.close_ms = price, ts
+        self.high = max(self.high, price)
+        self.low = min(self.low, price)
+        self.volume += volume
+        self.ticks += 1
+
+
+@dataclass(slots=True)
+class TimeBarState(BarState):
+    """Open time windows of a single product."""
+
+    max_event_ms: int | None = None
+    late_trades: int = 0
+    windows: list[TimeWindow] = field(default_factory=list)
+
+    def to_record(self) -> list[Any]:
+        """Pack the state into a versioned flat record."""
+        return [
+            self.SCHEMA_VERSION,
+            self.max_event_ms,
+            self.late_trades,
+            [
+                [getattr(window, name) for name in TimeWindow.__slots__]
+                for window in self.windows
+            ],
+        ]
+
+    @classmethod
+    def from_record(cls, record: list[Any]) -> Self:
+        """Unpack a versioned flat record."""
+        version, max_event_ms, late_trades, windows = record
+        if version != cls.SCHEMA_VERSION:
+            raise ValueError(f"Unsupported state schema version: {version}")
+        return cls(
+            max_event_ms,
+            late_trades,
+            [TimeWindow(*window) for window in windows],
+        )
+
+
+class TimeBars(FinanceDataStructure):
+    """Time bars data structure.
+
+    Trades are assigned to fixed windows of `interval` seconds by their
+    exchange timestamp. A window is emitted once the watermark, the latest
+    trade timestamp seen minus the product's `allowed_lateness`, passes the
+    end of the window. Trades for windows that were already emitted are
+    dropped and counted.
+    """
+
+    STATE_KEY = "time_bar"
+    STATE_CLASS = TimeBarState
+
+    def __init__(
+        self, output_producer: Any, output_topic: Any, products: list[ProductId]
+    ) -> None:
+        """Initialize the time-based financial data structure."""
+        super().__init__(output_producer, output_topic, products)
+        self.allowed_lateness_ms = {
+            PRODUCT_ID_MAPPING.get(product.coin): int(
+                product.aggregation.allowed_lateness * 1000
+            )
+            for product in products
+        }
+
+    def update_bar(
+        self, bar_state: TimeBarState, trade: dict[str, Any]
+    ) -> None:
+        """Add the trade to its window, emitting the windows that closed."""
+        product_id = PRODUCT_ID_MAPPING.get(trade["product_id"])
+        interval_ms = int(self.threshold_intervals[product_id] * 1000)
+        lateness_ms = self.allowed_lateness_ms[product_id]
+        ts = trade["timestamp"]
+        window_start = ts - ts % interval_ms
+
+        if (
+            bar_state.max_event_ms is not None
+            and window_start + interval_ms
+            <= bar_state.max_event_ms - lateness_ms
+        ):
+            bar_state.late_trades += 1
+            logger.debug(
+                f"Dropped late trade for {product_id} at {ms_to_iso(ts)}"
+                f" ({bar_state.late_trades} late trades so far)"
+            )
+            return
+
+        window = next(
+            (w for w in bar_state.windows if w.start_ms == window_start), None
+        )
+        if window is None:
+            window = TimeWindow(
+                start_ms=window_start,
+                open=trade["price"],
+                open_ms=ts,
+                high=trade["price"],
+                low=trade["price"],
+                close=trade["price"],
+                close_ms=ts,
+            )
+            bar_state.windows.append(window)
+            bar_state.windows.sort(key=lambda w: w.start_ms)
+        window.add_trade(trade["price"], trade["volume"], ts)
+
+        if bar_state.max_event_ms is None or ts > bar_state.max_event_ms:
+            bar_state.max_event_ms = ts
+        watermark = bar_state.max_event_ms - lateness_ms
+        while bar_state.windows and self.is_bar_complete(
+            bar_state.windows[0], interval_ms, watermark
+        ):
+            self.write_bar_to_topic(
+                product_id,
+                self.to_bar(bar_state.windows.pop(0), product_id, interval_ms),
+            )
+
+    def is_bar_complete(
+        self, window: TimeWindow, interval_ms: int, watermark: int
+    ) -> bool:
+        """Check if the watermark passed the end of the window."""
+        return window.start_ms + interval_ms <= watermark
+
+    @staticmethod
+    def to_bar(
+        window: TimeWindow, product_id: str, interval_ms: int
+    ) -> dict[str, Any]:
+        """Build the bar written to the output topic."""
+        return {
+            "product_id": product_id,
+            "open": window.open,
+            "high": window.high,
+            "low": window.low,
+            "close": window.close,
+            "volume": round(window.volume, 4),
+            "ticks": window.ticks,
+            "start_time": window.start_ms,
+            "end_time": window.start_ms + interval_ms,
+        }
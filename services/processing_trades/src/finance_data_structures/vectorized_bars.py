@@ -0,0 +1,278 @@
+import math
+from typing import Any
+
+import numpy as np
+
+from utils.twitter_snowflake import sf_id_generator
+
+
+def _segment_max_runs(
+    is_buy: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the longest run of buy and sell trades of each segment.
+
+    Args:
+    ----
+    is_buy (np.ndarray): Whether each trade is a buy.
+    starts (np.ndarray): First trade index of each segment.
+    ends (np.ndarray): Last trade index of each segment (inclusive).
+
+    """
+    n_trades = ends[-1] + 1
+    sides = is_buy[:n_trades]
+    # A new run starts whenever the side changes or a new segment starts
+    run_breaks = np.empty(n_trades, dtype=bool)
+    run_breaks[0] = True
+    run_breaks[1:] = sides[1:] != sides[:-1]
+    run_breaks[starts] = True
+    run_starts = np.flatnonzero(run_breaks)
+    run_lengths = np.diff(np.append(run_starts, n_trades))
+    run_is_buy = sides[run_starts]
+
+    segment_first_run = np.searchsorted(run_starts, starts)
+    max_buy_run = np.maximum.reduceat(
+        np.where(run_is_buy, run_lengths, 0), segment_first_run
+    )
+    max_sell_run = np.maximum.reduceat(
+        np.where(run_is_buy, 0, run_lengths), segment_first_run
+    )
+    return max_buy_run, max_sell_run
+
+
+def _tick_imbalance_bar_ends(signs: np.ndarray, threshold: float) -> np.ndarray:
+    """Find the index of the trade that completes each tick imbalance bar.
+
+    The imbalance moves by one tick per trade, so a bar starting after trade
+    `s` with cumulative imbalance `c[s]` ends exactly at the first later
+    trade where the cumulative imbalance reaches `c[s] +/- threshold`. The
+    positions of each cumulative imbalance level are grouped once, so every
+    bar boundary is found with a binary search.
+
+    Args:
+    ----
+    signs (np.ndarray): +1 for buy trades and -1 for sell trades.
+    threshold (float): Absolute tick imbalance that completes a bar.
+
+    """
+    ticks_threshold = max(1, math.ceil(threshold))
+    cumulative = np.cumsum(signs)
+    order = np.argsort(cumulative, kind="stable")
+    sorted_cumulative = cumulative[order]
+
+    def next_position(level: int, start: int) -> int:
+        """First trade index >= start whose cumulative imbalance is level."""
+        lo = np.searchsorted(sorted_cumulative, level, side="left")
+        hi = np.searchsorted(sorted_cumulative, level, side="right")
+        positions = order[lo:hi]
+        idx = np.searchsorted(positions, start)
+        return positions[idx] if idx < len(positions) else len(signs)
+
+    ends = []
+    start, base = 0, 0
+    while start < len(signs):
+        end = min(
+            next_position(base + ticks_threshold, start),
+            next_position(base - ticks_threshold, start),
+        )
+        if end == len(signs):
+            break
+        ends.append(end)
+        start, base = end + 1, cumulative[end]
+    return np.asarray(ends, dtype=np.int64)
+
+
+def build_tick_imbalance_bars(
+    product_id: str,
+    threshold: float,
+    prices: np.ndarray,
+    volumes: np.ndarray,
+    is_buy: np.ndarray,
+    timestamps: np.ndarray,
+) -> list[dict[str, Any]]:
+    """Build the complete tick imbalance bars of a product's trades.
+
+    Produces the same bars as `TickImbalanceBars` streaming the trades one at
+    a time from an empty state. Trades after the last complete bar are
+    ignored.
+
+    Args:
+    ----
+    product_id (str): The product id written to the bars.
+    threshold (float): Absolute tick imbalance that completes a bar.
+    prices (np.ndarray): Trade prices, in trade order.
+    volumes (np.ndarray): Trade volumes.
+    is_buy (np.ndarray): Whether each trade is a buy.
+    timestamps (np.ndarray): Trade timestamps in Unix milliseconds.
+
+    """
+    signs = np.where(is_buy, 1, -1)
+    ends = _tick_imbalance_bar_ends(signs, threshold)
+    if len(ends) == 0:
+        return []
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    ticks = ends - starts + 1
+
+    prices = prices[: ends[-1] + 1]
+    volumes = volumes[: ends[-1] + 1]
+    buy_trades = np.add.reduceat(
+        is_buy[: ends[-1] + 1].astype(np.int64), starts
+    )
+    imbalance = 2 * buy_trades - ticks
+
+    volume = np.add.reduceat(volumes, starts)
+    trade_amount = np.add.reduceat(volumes * prices, starts)
+
+    # Population standard deviation of the prices of each bar
+    mean_price = np.add.reduceat(prices, starts) / ticks
+    deviations = prices - np.repeat(mean_price, ticks)
+    price_volatility = np.where(
+        ticks > 1,
+        np.sqrt(np.add.reduceat(deviations * deviations, starts) / ticks),
+        0.0,
+    )
+
+    formation_time = (timestamps[ends] - timestamps[starts]) / 1000
+    trade_intensity = np.divide(
+        ticks,
+        formation_time,
+        out=np.zeros(len(ticks)),
+        where=formation_time > 0,
+    )
+    inter_bar_gap = np.concatenate(
+        ([0], (timestamps[starts[1:]] - timestamps[ends[:-1]]) / 1000)
+    )
+    max_buy_run, max_sell_run = _segment_max_runs(is_buy, starts, ends)
+
+    columns = {
+        "open": prices[starts],
+        "high": np.maximum.reduceat(prices, starts),
+        "low": np.minimum.reduceat(prices, starts),
+        "close": prices[ends],
+        "volume": np.round(volume, 4),
+        "start_time": timestamps[starts],
+        "end_time": timestamps[ends],
+        "tick_imbalance": imbalance,
+        "ticks": ticks,
+        "cumulative_trade_amount": np.round(trade_amount, 4),
+        "net_buy_ratio": np.round(2 * buy_trades / ticks - 1, 4),
+        "bar_formation_time_seconds": np.round(formation_time, 4),
+        "trade_intensity": np.round(trade_intensity, 4),
+        "max_buy_run": max_buy_run,
+        "max_sell_run": max_sell_run,
+        "price_volatility": np.round(price_volatility, 4),
+        "inter_bar_gap_seconds": inter_bar_gap,
+    }
+    return _columns_to_bars(product_id, columns)
+
+
+def _volume_bar_ends(volumes: np.ndarray, threshold: float) -> np.ndarray:
+    """Find the index of the trade that completes each volume bar.
+
+    Follows the arithmetic of `VolumeBars` trade by trade, so float rounding
+    never moves a boundary as it would comparing the cumulative volume of
+    all the trades to multiples of the threshold: the volume of each bar is
+    summed from the part of the trade that opened it, and a trade completes
+    the bar once its volume reaches what is left of the threshold. The part
+    of the trade above it opens the next bar, and completes it too if it is
+    a whole threshold. A single pass over the volumes is linear, whereas the
+    bars themselves are built a column at a time.
+
+    Args:
+    ----
+    volumes (np.ndarray): Trade volumes, all positive.
+    threshold (float): Traded volume that completes a bar.
+
+    """
+    ends = []
+    bar_volume = 0.0
+    for i, size in enumerate(volumes.tolist()):
+        remaining = threshold - bar_volume
+        if size < remaining:
+            bar_volume += size
+            continue
+        ends.append(i)
+        size -= remaining
+        while size >= threshold:
+            ends.append(i)
+            size -= threshold
+        bar_volume = 0.0 + size
+    return np.asarray(ends, dtype=np.int64)
+
+
+def build_volume_bars(
+    product_id: str,
+    threshold: float,
+    prices: np.ndarray,
+    volumes: np.ndarray,
+    timestamps: np.ndarray,
+) -> list[dict[str, Any]]:
+    """Build the complete volume bars of a product's trades.
+
+    Produces the same bars as `VolumeBars` streaming the trades one at a
+    time from an empty state. A bar completes at the trade where its volume
+    reaches `threshold`, and the next bar opens with the trade that
+    completed the previous one. Trades without volume are ignored, as are
+    the trades after the last complete bar.
+
+    Args:
+    ----
+    product_id (str): The product id written to the bars.
+    threshold (float): Traded volume that completes a bar.
+    prices (np.ndarray): Trade prices, in trade order.
+    volumes (np.ndarray): Trade volumes.
+    timestamps (np.ndarray): Trade timestamps in Unix milliseconds.
+
+    """
+    traded = volumes > 0
+    prices, volumes, timestamps = (
+        prices[traded],
+        volumes[traded],
+        timestamps[traded],
+    )
+    ends = _volume_bar_ends(volumes, threshold)
+    n_bars = len(ends)
+    if n_bars == 0:
+        return []
+    starts = np.concatenate(([0], ends[:-1]))
+
+    # Bars overlap on the trade that completes the previous bar, so reduce
+    # over the trades after it and combine with its price afterwards.
+    previous_ends = np.concatenate(([-1], ends[:-1]))
+    non_empty = ends > previous_ends
+    prices_in_bars = prices[: ends[-1] + 1]
+    high = prices[starts].copy()
+    low = prices[starts].copy()
+    high[non_empty] = np.maximum(
+        high[non_empty],
+        np.maximum.reduceat(prices_in_bars, previous_ends[non_empty] + 1),
+    )
+    low[non_empty] = np.minimum(
+        low[non_empty],
+        np.minimum.reduceat(prices_in_bars, previous_ends[non_empty] + 1),
+    )
+
+    columns = {
+        "unique_id": np.array(
+            [sf_id_generator.generate_id() for _ in range(n_bars)]
+        ),
+        "open": prices[starts],
+        "high": high,
+        "low": low,
+        "close": prices[ends],
+        "volume": np.full(n_bars, threshold),
+        "start_time": timestamps[starts],
+        "end_time": timestamps[ends],
+    }
+    return _columns_to_bars(product_id, columns)
+
+
+def _columns_to_bars(
+    product_id: str, columns: dict[str, np.ndarray]
+) -> list[dict[str, Any]]:
+    """Turn per-bar column arrays into a list of bar dictionaries."""
+    names = ["product_id", *columns]
+    values = [column.tolist() for column in columns.values()]
+    return [
+        dict(zip(names, (product_id, *row), strict=True))
+        for row in zip(*values, strict=True)
+    ]
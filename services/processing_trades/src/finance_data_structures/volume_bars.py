@@ -1,81 +1,160 @@
+from dataclasses import dataclass
 from typing import Any
 
-from finance_data_structures.base import FinanceDataStructure
-from settings.config import PRODUCT_ID_MAPPING, ProductId
+from finance_data_structures.base import BarState, FinanceDataStructure
+from settings.config import PRODUCT_ID_MAPPING
 from utils.twitter_snowflake import sf_id_generator
 
 
+@dataclass(slots=True)
+class ThresholdBarState(BarState):
+    """Volume or dollar bar in progress for a single product."""
+
+    open: float | None = None
+    high: float | None = None
+    low: float | None = None
+    close: float | None = None
+    volume: float = 0
+    dollar_volume: float = 0
+    start_time: int | None = None
+    end_time: int | None = None
+
+    def start(self, price: float, timestamp: int) -> None:
+        """Open a new bar at the given trade."""
+        self.open = self.high = self.low = self.close = price
+        self.volume = 0
+        self.dollar_volume = 0
+        self.start_time = self.end_time = timestamp
+
+
 class VolumeBars(FinanceDataStructure):
-    """Volume bars data structure."""
+    """Volume bars data structure.
 
-    def __init__(
-        self, output_producer: Any, output_topic: Any, products: list[ProductId]
-    ) -> None:
-        """Initialize the volume-based financial data structure."""
-        super().__init__(output_producer, output_topic)
-        self.threshold_intervals = {
-            PRODUCT_ID_MAPPING.get(product.coin): product.aggregation.interval
-            for product in products
-        }
+    A bar is complete every time the traded volume reaches the product's
+    threshold. Trades larger than what is left to complete the bar are split
+    across bars, and the next bar opens with the trade that completed the
+    previous one.
+    """
 
-    def initialize_bar(
-        self, price: float, timestamp: int, product_id: str
-    ) -> dict[str, Any]:
-        """Initialize the data structure."""
-        return {
-            "unique_id": sf_id_generator.generate_id(),
-            "product_id": product_id,
-            "open": price,
-            "high": price,
-            "low": price,
-            "close": price,
-            "volume": 0,
-            "start_time": timestamp,
-            "end_time": timestamp,
-        }
+    STATE_KEY = "volume_bar"
+    STATE_CLASS = ThresholdBarState
+
+    def trade_size(self, trade: dict[str, Any]) -> float:
+        """Return the size of the trade measured in bar units."""
+        return trade["volume"]
+
+    def bar_size(self, bar_state: ThresholdBarState) -> float:
+        """Return the size of the bar in progress measured in bar units."""
+        return bar_state.volume
 
-    def process_trade(self, trade: dict[str, Any]) -> dict[str, Any]:
-        """Create a new volume bar at every X trade volume.
+    def size_to_volume(self, size: float, price: float) -> float:
+        """Convert a size in bar units to traded volume."""
+        return size
+
+    def update_bar(
+        self, bar_state: ThresholdBarState, trade: dict[str, Any]
+    ) -> None:
+        """Add the trade to the bar in progress, emitting complete bars.
 
         Args:
         ----
+        bar_state (ThresholdBarState): The bar in progress.
         trade (dict[str, Any]): trade object.
 
         """
         product_id = PRODUCT_ID_MAPPING.get(trade["product_id"])
         price = trade["price"]
-        volume = trade["volume"]
         timestamp = trade["timestamp"]
+        size = self.trade_size(trade)
+        if size <= 0:
+            return
 
-        while volume > 0:
-            bar = self.get_bar(product_id)
+        if bar_state.open is None:
+            bar_state.start(price, timestamp)
+        bar_state.high = max(bar_state.high, price)
+        bar_state.low = min(bar_state.low, price)
+        bar_state.close = price
+        bar_state.end_time = timestamp
 
-            if bar["open"] is None:
-                bar.update(self.initialize_bar(price, timestamp, product_id))
-
-            bar["high"] = max(bar["high"], price)
-            bar["low"] = min(bar["low"], price)
-            bar["close"] = price
-            bar["end_time"] = timestamp
+        while size > 0:
+            remaining_size = (
+                self.threshold_intervals[product_id]
+                - self.bar_size(bar_state)
+            )
+            if not self.is_bar_complete(size, remaining_size):
+                self.add_size(bar_state, size, price)
+                break
 
-            remaining_volume = (
-                self.threshold_intervals[product_id] - bar["volume"]
+            self.add_size(bar_state, remaining_size, price)
+            size -= remaining_size
+            self.write_bar_to_topic(
+                product_id, self.to_bar(bar_state, product_id)
             )
+            bar_state.start(price, timestamp)
+
+    def add_size(
+        self, bar_state: ThresholdBarState, size: float, price: float
+    ) -> None:
+        """Add part of a trade, measured in bar units, to the bar."""
+        volume = self.size_to_volume(size, price)
+        bar_state.volume += volume
+        bar_state.dollar_volume += volume * price
 
-            if self.is_bar_complete(volume, remaining_volume):
-                bar["volume"] = self.threshold_intervals[product_id]
-                volume -= remaining_volume
-
-                # Write bar to topic
-                self.write_bar_to_topic(product_id, bar)
-                self.bars[product_id] = self.initialize_bar(
-                    price, timestamp, product_id
-                )
-            else:
-                bar["volume"] += volume
-                volume = 0
-        return trade
-
-    def is_bar_complete(self, volume: float, remaining_volume: float) -> bool:
-        """Verify if new trade completes volume bar."""
-        return volume >= remaining_volume
+    def is_bar_complete(self, size: float, remaining_size: float) -> bool:
+        """Verify if new trade completes the bar."""
+        return size >= remaining_size
+
+    def to_bar(
+        self, bar_state: ThresholdBarState, product_id: str
+    ) -> dict[str, Any]:
+        """Build the bar written to the output topic."""
+        return {
+            "unique_id": sf_id_generator.generate_id(),
+            "product_id": product_id,
+            "open": bar_state.open,
+            "high": bar_state.high,
+            "low": bar_state.low,
+            "close": bar_state.close,
+            "volume": self.threshold_intervals[product_id],
+            "start_time": bar_state.start_time,
+            "end_time": bar_state.end_time,
+        }
+
+
+class DollarBars(VolumeBars):
+    """Dollar bars data structure.
+
+    Same as volume bars, but a bar is complete every time the traded dollar
+    value (price * volume) reaches the product's threshold.
+    """
+
+    STATE_KEY = "dollar_bar"
+
+    def trade_size(self, trade: dict[str, Any]) -> float:
+        """Return the traded dollar value of the trade."""
+        return trade["volume"] * trade["price"]
+
+    def bar_size(self, bar_state: ThresholdBarState) -> float:
+        """Return the traded dollar value of the bar in progress."""
+        return bar_state.dollar_volume
+
+    def size_to_volume(self, size: float, price: float) -> float:
+        """Convert a dollar value to traded volume at the given price."""
+        return size / price
+
+    def to_bar(
+        self, bar_state: ThresholdBarState, product_id: str
+    ) -> dict[str, Any]:
+        """Build the bar written to the output topic."""
+        return {
+            "unique_id": sf_id_generator.generate_id(),
+            "product_id": product_id,
+            "open": bar_state.open,
+            "high": bar_state.high,
+            "low": bar_state.low,
+            "close": bar_state.close,
+            "volume": round(bar_state.volume, 4),
+            "dollar_volume": self.threshold_intervals[product_id],
+            "start_time": bar_state.start_time,
+            "end_time": bar_state.end_time,
+        }
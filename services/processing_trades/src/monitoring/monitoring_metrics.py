@@ -0,0 +1,3 @@
+from monitoring.pipeline_metrics import PipelineMetrics
+
+monitoring = PipelineMetrics(service="processing_trades")
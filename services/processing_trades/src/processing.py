@@ -1,7 +1,43 @@
+import time
+from collections import defaultdict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+from confluent_kafka import Message, TopicPartition
 from quixstreams import Application
+from quixstreams.kafka import Consumer
+from quixstreams.state.rocksdb import RocksDBPartitionTransaction, RocksDBStore
 
-from finance_data_structures.tick_imbalance_bars import TickImbalanceBars
+from finance_data_structures.registry import BarEngines
+from monitoring.monitoring_metrics import monitoring
 from settings.config import settings
+from utils.logging_config import logger
+from utils.wire_format import WireDeserializer, get_serializer
+
+# State store of the bars built in micro-batches
+BATCHED_STORE_NAME = "batched_bars"
+
+
+def poll_batch(
+    consumer: Consumer, max_messages: int, timeout: float
+) -> list[Message]:
+    """Poll up to `max_messages` messages, waiting at most `timeout` seconds.
+
+    Returns as soon as `max_messages` messages are polled, or with the
+    messages polled so far once `timeout` seconds have passed.
+    """
+    deadline = time.monotonic() + timeout
+    messages: list[Message] = []
+    while len(messages) < max_messages:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        msg = consumer.poll(remaining)
+        if msg is None:
+            break
+        messages.append(msg)
+    return messages
 
 
 class Preprocessing:
@@ -13,48 +49,237 @@ class Preprocessing:
         input_topic: str,
         output_topic: str,
         kafka_consumer_group: str,
+        batch_size: int = 0,
+        batch_max_latency_ms: int = 500,
+        output_topics: dict[str, str] | None = None,
+        wire_format: str = "json",
+        state_dir: str = "state",
     ) -> None:
-        """Initialize the preprocessing step."""
+        """Initialize the preprocessing step.
+
+        Args:
+        ----
+        broker_address (str): The kafka broker address.
+        input_topic (str): The kafka topic to read trades from.
+        output_topic (str): The kafka topic to write bars to.
+        kafka_consumer_group (str): The kafka consumer group.
+        batch_size (int): Number of trades consumed per batch. 0 processes
+            the trades one at a time through the streaming dataframe.
+        batch_max_latency_ms (int): Max time to wait for a batch to fill.
+        output_topics (dict[str, str] | None): The kafka topic to write the
+            bars of each aggregation type to. Types not listed write to
+            `output_topic`.
+        wire_format (str): Format of the bars written, "json" or "binary".
+            The format of the trades read is detected from each message.
+        state_dir (str): Directory of the state stores of the bars.
+
+        """
         self.broker_address = broker_address
         self.input_topic = input_topic
         self.output_topic = output_topic
         self.kafka_consumer_group = kafka_consumer_group
+        self.batch_size = batch_size
+        self.batch_max_latency_ms = batch_max_latency_ms
+        self.output_topics = output_topics or {}
+        self.wire_format = wire_format
+        self.state_dir = state_dir
+        # Looks up the end offsets of the partitions consumed by the
+        # streaming dataframe
+        self.lag_consumer: Consumer | None = None
 
     def run(self) -> None:
-        """Create trade bars for the defined methods."""
-        # TODO: add support for run with different methods.
-        # Idea is to iterate over every method and create bars for each
-        # Need to create validation/tests for available methods.
+        """Create trade bars for the defined methods.
+
+        Every configured aggregation method is built from the same consumer,
+        so each trade is consumed and deserialized once whatever the number
+        of bar types, and the bars of each type are written to their own
+        output topic.
+        """
         app = Application(
             broker_address=self.broker_address,
             consumer_group=self.kafka_consumer_group,
             auto_offset_reset="earliest",
+            state_dir=self.state_dir,
+            on_message_processed=self.observe_lag,
         )
 
-        input_topic = app.topic(name=self.input_topic, value_serializer="json")
+        input_topic = app.topic(
+            name=self.input_topic, value_deserializer=WireDeserializer()
+        )
         output_topic = app.topic(
-            name=self.output_topic, value_serializer="json"
+            name=self.output_topic,
+            value_serializer=get_serializer(self.wire_format),
         )
+        output_topics = {
+            aggregation_type: app.topic(
+                name=name, value_serializer=get_serializer(self.wire_format)
+            )
+            for aggregation_type, name in self.output_topics.items()
+        }
+
+        if self.batch_size:
+            self.run_batched(app, input_topic, output_topic, output_topics)
+            return
 
         # Create a streaming dataframe to apply transformations to incoming data
         sdf = app.dataframe(input_topic)
         with app.get_producer() as producer:
-            tick_imbalance_bars = TickImbalanceBars(
-                producer, output_topic, settings.product_ids
+            bar_engines = BarEngines(
+                producer, output_topic, settings.product_ids, output_topics
             )
             # Apply the process_trade function to each incoming message
-            sdf = sdf.apply(tick_imbalance_bars.process_trade, stateful=True)
+            sdf = sdf.apply(bar_engines.process_trade, stateful=True)
 
         # Run the application
-        app.run(sdf)
+        with app.get_consumer() as lag_consumer:
+            self.lag_consumer = lag_consumer
+            app.run(sdf)
+
+    def observe_lag(self, topic: str, partition: int, offset: int) -> None:
+        """Set the lag of a partition once a trade of it is processed.
+
+        Called by the application for every message of the streaming
+        dataframe, whose consumer is not exposed, so the end of the
+        partition is looked up with a consumer of its own.
+        """
+        if self.lag_consumer is not None:
+            monitoring.observe_partition_lag(
+                self.lag_consumer, topic, partition, offset
+            )
+
+    def run_batched(
+        self,
+        app: Application,
+        input_topic: Any,
+        output_topic: Any,
+        output_topics: dict[str, Any],
+    ) -> None:
+        """Create trade bars consuming the trades in micro-batches.
+
+        Up to `batch_size` trades (or as many as arrive within
+        `batch_max_latency_ms`) are consumed at once, grouped by product and
+        folded into the bar state in one pass. The completed bars are produced
+        together.
+
+        The bar state is kept in a quixstreams state store, with the offset of
+        the last trade it includes. It is written once the bars are flushed,
+        and every assigned partition is consumed from the offset of its state,
+        so a bar in progress when the process stops is resumed rather than
+        rebuilt from part of its trades.
+        """
+        store = RocksDBStore(
+            name=BATCHED_STORE_NAME,
+            topic=input_topic.name,
+            base_dir=str(Path(self.state_dir) / self.kafka_consumer_group),
+        )
+        timeout = self.batch_max_latency_ms / 1000
+
+        def on_assign(consumer: Any, partitions: list[TopicPartition]) -> None:
+            for tp in partitions:
+                store_partition = store.assign_partition(tp.partition)
+                processed_offset = store_partition.get_processed_offset()
+                if processed_offset is not None:
+                    tp.offset = processed_offset + 1
+            consumer.incremental_assign(partitions)
+
+        def on_revoke(consumer: Any, partitions: list[TopicPartition]) -> None:
+            consumer.incremental_unassign(partitions)
+            on_lost(consumer, partitions)
+
+        def on_lost(consumer: Any, partitions: list[TopicPartition]) -> None:
+            for tp in partitions:
+                store.revoke_partition(tp.partition)
+
+        try:
+            with (
+                app.get_consumer() as consumer,
+                app.get_producer() as producer,
+            ):
+                bar_engines = BarEngines(
+                    producer, output_topic, settings.product_ids, output_topics
+                )
+                bar_engines.buffer_bars = True
+                consumer.subscribe(
+                    topics=[input_topic.name],
+                    on_assign=on_assign,
+                    on_revoke=on_revoke,
+                    on_lost=on_lost,
+                )
+                while True:
+                    messages = poll_batch(consumer, self.batch_size, timeout)
+                    if not messages:
+                        continue
+
+                    trades_by_partition: defaultdict[
+                        int, defaultdict[str, list[dict[str, Any]]]
+                    ] = defaultdict(lambda: defaultdict(list))
+                    last_messages = {}
+                    for msg in messages:
+                        if msg.error():
+                            logger.error(f"Kafka error: {msg.error()}")
+                            continue
+                        trade = input_topic.deserialize(msg).value
+                        trades_by_partition[msg.partition()][
+                            trade["product_id"]
+                        ].append(trade)
+                        last_messages[msg.partition()] = msg
+
+                    transactions = self.process_batch(
+                        bar_engines, trades_by_partition, store
+                    )
+                    producer.flush()
+                    for partition, transaction in transactions.items():
+                        msg = last_messages[partition]
+                        transaction.flush(processed_offset=msg.offset())
+                        consumer.store_offsets(message=msg)
+                        monitoring.observe_consumer_lag(consumer, msg)
+        finally:
+            store.close()
+
+    @staticmethod
+    def process_batch(
+        bar_engines: BarEngines,
+        trades_by_partition: Mapping[int, Mapping[str, list[dict[str, Any]]]],
+        store: RocksDBStore,
+    ) -> dict[int, RocksDBPartitionTransaction]:
+        """Fold a batch of trades grouped by partition and product.
+
+        The bar state of every partition is updated in a state transaction,
+        and the completed bars are produced.
+
+        Returns
+        -------
+        dict[int, RocksDBPartitionTransaction]: The transaction of every
+            partition, to flush once the bars are delivered.
+
+        """
+        transactions = {}
+        n_trades = 0
+        for partition, trades_by_product in trades_by_partition.items():
+            transaction = store.start_partition_transaction(partition)
+            for product_id, trades in trades_by_product.items():
+                bar_engines.process_trades(
+                    trades, transaction.as_state(prefix=product_id.encode())
+                )
+                n_trades += len(trades)
+            transactions[partition] = transaction
+        n_bars = bar_engines.flush_bars()
+        logger.debug(f"Processed {n_trades} trades, produced {n_bars} bars")
+        return transactions
 
 
 if __name__ == "__main__":
     print(settings)
+    monitoring.start_http_server(settings.processing.metrics_port)
     preprocessing = Preprocessing(
         settings.kafka.kafka_broker_address,
         settings.kafka.kafka_input_topic,
         settings.kafka.kafka_output_topic,
         settings.kafka.kafka_consumer_group,
+        settings.processing.batch_size,
+        settings.processing.batch_max_latency_ms,
+        settings.kafka.kafka_output_topics,
+        settings.kafka.kafka_wire_format,
+        settings.processing.state_dir,
     )
     preprocessing.run()
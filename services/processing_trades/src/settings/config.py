@@ -1,5 +1,7 @@
 from pydantic import field_validator
 
+from utils.wire_format import WIRE_FORMATS
+
 from pydantic_settings import (  # isort:skip
     BaseSettings,
     PydanticBaseSettingsSource,
@@ -26,23 +28,71 @@ class KafkaSettings(BaseSettings):
     kafka_broker_address: str | None = None
     kafka_input_topic: str
     kafka_output_topic: str
+    # Output topic of each aggregation type, e.g. {"time": "time_bars_live"}.
+    # Aggregation types not listed write to `kafka_output_topic`.
+    kafka_output_topics: dict[str, str] = {}
     kafka_consumer_group: str
+    # Format of the bars written to Kafka: "json" or "binary". The format of
+    # the trades read is detected from each message.
+    kafka_wire_format: str = "json"
 
     model_config = SettingsConfigDict(
         env_file=".env", env_nested_delimiter="__"
     )
 
+    @field_validator("kafka_wire_format")
+    def validate_wire_format(cls, value):
+        """Validate the wire format of the messages."""
+        if value not in WIRE_FORMATS:
+            raise ValueError(
+                f"Unsupported wire format: {value}. Supported wire formats"
+                f" are: {WIRE_FORMATS}"
+            )
+        return value
+
+
+class ProcessingSettings(BaseSettings):
+    """Trade processing settings."""
+
+    # Number of trades consumed per batch. 0 processes trades one at a time
+    # through the streaming dataframe.
+    batch_size: int = 0
+    # Max time to wait for a batch to fill before processing it.
+    batch_max_latency_ms: int = 500
+    # Directory (or file) with parquet trades to build bars from offline.
+    offline_trades_path: str | None = None
+    # Port exposing the Prometheus metrics
+    metrics_port: int = 8000
+    # Directory of the state stores of the bars in progress
+    state_dir: str = "state"
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_nested_delimiter="__", extra="ignore"
+    )
+
+    @field_validator("batch_size", "batch_max_latency_ms")
+    def validate_non_negative(cls, value):
+        """Validate that batch settings are not negative."""
+        if value < 0:
+            raise ValueError(f"Batch settings must be >= 0, got {value}.")
+        return value
+
 
 class AggregationMethod(BaseSettings):
     """Generic class for different data aggregation strategies."""
 
     type: str
-    interval: float  # Generic interval, can represent volume, time, or tick
+    # Generic interval, can represent volume, dollar value, time (seconds) or
+    # tick imbalance
+    interval: float
+    # Time bars only: how late (seconds) a trade can arrive and still be
+    # added to its window
+    allowed_lateness: float = 0
 
     @field_validator("type")
     def validate_type(cls, value):
         """Validate if data aggregation type is supported."""
-        allowed_types = {"volume", "time", "tick imbalance"}
+        allowed_types = {"volume", "dollar", "time", "tick imbalance"}
         if value not in allowed_types:
             raise ValueError(
                 f"Type '{value}' not allowed. Must be one of {allowed_types}."
@@ -79,6 +129,7 @@ class Settings(BaseSettings):
     """Settings."""
 
     kafka: KafkaSettings = KafkaSettings()
+    processing: ProcessingSettings = ProcessingSettings()
     exchanges: list[Exchange]
     product_ids: list[ProductId]
 
@@ -86,6 +137,24 @@ class Settings(BaseSettings):
         yaml_file="src/configs/tick_imbalance_config.yaml",
     )
 
+    @field_validator("product_ids")
+    def validate_unique_aggregations(cls, value):
+        """Validate that a coin is not aggregated twice with the same type.
+
+        A coin can be listed several times to build several bar types from
+        the same trades, but each engine keeps a single bar state per coin.
+        """
+        seen = set()
+        for product in value:
+            key = (product.coin, product.aggregation.type)
+            if key in seen:
+                raise ValueError(
+                    f"Duplicated '{product.aggregation.type}' aggregation"
+                    f" for {product.coin}."
+                )
+            seen.add(key)
+        return value
+
     @classmethod
     def settings_customise_sources(
         cls,
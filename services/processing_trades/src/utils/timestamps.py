@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MILLISECOND = timedelta(milliseconds=1)
+
+
+def iso_to_ms(iso_str: str) -> int:
+    """Transform an ISO 8601 UTC date to Unix milliseconds.
+
+    Args:
+    ----
+    iso_str (str): A date like `2024-01-01T00:00:00.000000Z`.
+
+    """
+    dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // ONE_MILLISECOND
+
+
+def ms_to_iso(ts: int) -> str:
+    """Transform Unix milliseconds to an ISO 8601 UTC date.
+
+    Args:
+    ----
+    ts (int): A timestamp in Unix milliseconds.
+
+    """
+    return (EPOCH + ts * ONE_MILLISECOND).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def to_ms(ts: str | int | None) -> int | None:
+    """Transform a timestamp stored as an ISO 8601 date to Unix milliseconds.
+
+    Used to migrate state written before timestamps were kept as Unix
+    milliseconds. Unix milliseconds and None are returned as they are.
+
+    Args:
+    ----
+    ts (str | int | None): An ISO 8601 date or a Unix milliseconds timestamp.
+
+    """
+    return iso_to_ms(ts) if isinstance(ts, str) else ts
@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+# The service modules are imported from src, as when running src/processing.py
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+# Settings are read when the modules are imported
+os.environ.setdefault("KAFKA_INPUT_TOPIC", "trades")
+os.environ.setdefault("KAFKA_OUTPUT_TOPIC", "bars")
+os.environ.setdefault("KAFKA_CONSUMER_GROUP", "tests")
@@ -0,0 +1,184 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock
+
+import pytest
+from confluent_kafka import TopicPartition
+from prometheus_client import REGISTRY
+from quixstreams.kafka import Consumer
+
+import processing
+from processing import Preprocessing, poll_batch
+
+
+class FakeMessage:
+    """Kafka message of a trade."""
+
+    def __init__(self, trade: dict, offset: int, partition: int = 0) -> None:
+        """Initialize the message of a trade at an offset."""
+        self.trade = trade
+        self._offset = offset
+        self._partition = partition
+
+    def error(self) -> None:
+        """Return no error."""
+        return None
+
+    def topic(self) -> str:
+        """Return the topic of the message."""
+        return "trades"
+
+    def partition(self) -> int:
+        """Return the partition of the message."""
+        return self._partition
+
+    def offset(self) -> int:
+        """Return the offset of the message."""
+        return self._offset
+
+
+class StopConsuming(Exception):
+    """Raised by the fake consumer once its messages are consumed."""
+
+
+def make_consumer(messages: list) -> Mock:
+    """Return a consumer polling the messages, then stopping the loop.
+
+    The last batch ends with a poll timing out.
+    """
+    consumer = MagicMock(spec=Consumer)
+    consumer.__enter__.return_value = consumer
+    consumer.poll.side_effect = [*messages, None, StopConsuming()]
+    consumer.get_watermark_offsets.return_value = (0, 1_000)
+    return consumer
+
+
+def make_trade(offset: int) -> dict:
+    """Return an ETH buy trade, one second after the previous one."""
+    return {
+        "product_id": "ETH/USD",
+        "side": "buy",
+        "price": 3_000.0 + offset,
+        "volume": 0.5,
+        "timestamp": 1_700_000_000_000 + offset * 1_000,
+        "exchange": "Kraken",
+    }
+
+
+def test_poll_batch_stops_at_max_messages():
+    """Polling stops once the batch is full."""
+    consumer = make_consumer(range(10))
+
+    assert poll_batch(consumer, 3, timeout=1) == [0, 1, 2]
+    assert consumer.poll.call_count == 3
+
+
+def test_poll_batch_returns_messages_polled_before_timeout():
+    """A poll returning no message ends the batch early."""
+    consumer = make_consumer([1, 2, None, 3])
+
+    assert poll_batch(consumer, 10, timeout=1) == [1, 2]
+
+
+def test_poll_batch_waits_the_remaining_time(monkeypatch):
+    """Every poll waits at most until the batch deadline."""
+    now = [100.0]
+    monkeypatch.setattr(processing.time, "monotonic", lambda: now[0])
+    consumer = make_consumer([])
+
+    def poll(timeout):
+        now[0] += 0.4
+        return "msg"
+
+    consumer.poll.side_effect = poll
+
+    assert poll_batch(consumer, 10, timeout=1) == ["msg"] * 3
+    timeouts = [call.args[0] for call in consumer.poll.call_args_list]
+    assert timeouts == pytest.approx([1, 0.6, 0.2])
+
+
+def run_batched(state_dir, messages: list) -> tuple[list, Mock]:
+    """Run the batched mode over the messages.
+
+    Returns the bars produced and the consumer assigned the partition.
+    """
+    preprocessing = Preprocessing(
+        "localhost:9092",
+        "trades",
+        "bars",
+        "tests",
+        batch_size=100,
+        state_dir=str(state_dir),
+    )
+    consumer = make_consumer(messages)
+    assigned = MagicMock()
+
+    def subscribe(topics, on_assign, on_revoke, on_lost):
+        on_assign(assigned, [TopicPartition("trades", 0)])
+
+    consumer.subscribe.side_effect = subscribe
+    producer = MagicMock()
+    producer.__enter__.return_value = producer
+    app = Mock()
+    app.get_consumer.return_value = consumer
+    app.get_producer.return_value = producer
+    input_topic = Mock()
+    input_topic.name = "trades"
+    input_topic.deserialize = lambda msg: SimpleNamespace(value=msg.trade)
+    output_topic = Mock()
+    output_topic.serialize = lambda key, value: SimpleNamespace(
+        key=key, value=value
+    )
+
+    with pytest.raises(StopConsuming):
+        preprocessing.run_batched(app, input_topic, output_topic, {})
+
+    bars = [call.kwargs["value"] for call in producer.produce.call_args_list]
+    return bars, assigned
+
+
+def test_batched_bars_resume_after_restart(tmp_path):
+    """A bar in progress when the process stops is resumed on restart."""
+    # ETH tick imbalance bars close every 80 net buys
+    first_run = [FakeMessage(make_trade(i), i) for i in range(100)]
+    bars, assigned = run_batched(tmp_path, first_run)
+
+    assert [bar["ticks"] for bar in bars] == [80]
+    (partitions,), _ = assigned.incremental_assign.call_args
+    assert partitions[0].offset < 0
+
+    second_run = [FakeMessage(make_trade(i), i) for i in range(100, 160)]
+    bars, assigned = run_batched(tmp_path, second_run)
+
+    # The bar started before the restart is completed with its 20 trades
+    (partitions,), _ = assigned.incremental_assign.call_args
+    assert partitions[0].offset == 100
+    assert [bar["ticks"] for bar in bars] == [80]
+    assert bars[0]["start_time"] == make_trade(80)["timestamp"]
+    assert bars[0]["end_time"] == make_trade(159)["timestamp"]
+
+
+def test_streaming_mode_exports_the_consumer_lag(monkeypatch):
+    """The lag of the partitions is set as the trades are processed."""
+    lag_consumer = make_consumer([])
+    lag_consumer.get_watermark_offsets.return_value = (0, 100)
+    app = MagicMock()
+    app.get_consumer.return_value = lag_consumer
+    application = Mock(return_value=app)
+    monkeypatch.setattr(processing, "Application", application)
+
+    def run(sdf):
+        on_message_processed = application.call_args.kwargs[
+            "on_message_processed"
+        ]
+        on_message_processed("trades", 3, 41)
+
+    app.run.side_effect = run
+    Preprocessing("localhost:9092", "trades", "bars", "tests").run()
+
+    lag = REGISTRY.get_sample_value(
+        "pipeline_consumer_lag",
+        {"service": "processing_trades", "topic": "trades", "partition": "3"},
+    )
+    assert lag == 58
+    (partition,), _ = lag_consumer.get_watermark_offsets.call_args
+    assert (partition.topic, partition.partition) == ("trades", 3)
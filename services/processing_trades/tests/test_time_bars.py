@@ -0,0 +1,143 @@
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+
+from finance_data_structures.base import InMemoryState
+from finance_data_structures.time_bars import TimeBars
+from settings.config import ProductId
+
+# Start of a one minute window, in Unix milliseconds
+WINDOW = 28_333_334 * 60_000
+
+
+def at(seconds: float) -> int:
+    """Return the timestamp `seconds` after the start of the window."""
+    return WINDOW + int(seconds * 1000)
+
+
+def make_trade(seconds: float, price: float, volume: float = 1.0) -> dict:
+    """Return an ETH trade `seconds` after the start of the window."""
+    return {
+        "product_id": "ETH/USD",
+        "side": "buy",
+        "price": price,
+        "volume": volume,
+        "timestamp": at(seconds),
+    }
+
+
+class Engine:
+    """Time bars of ETH, one minute long, with the bars emitted so far."""
+
+    def __init__(self, allowed_lateness: float = 5) -> None:
+        """Initialize the engine and an empty state."""
+        output_topic = Mock()
+        output_topic.serialize = lambda key, value: SimpleNamespace(
+            key=key, value=value
+        )
+        product = ProductId(
+            coin="ETH-USD",
+            aggregation={
+                "type": "time",
+                "interval": 60,
+                "allowed_lateness": allowed_lateness,
+            },
+        )
+        self.bars = TimeBars(Mock(), output_topic, [product])
+        self.bars.buffer_bars = True
+        self.state = InMemoryState()
+
+    def process(self, *trades: dict) -> list[dict]:
+        """Process the trades one at a time and return the bars emitted."""
+        for trade in trades:
+            self.bars.process_trade(trade, self.state)
+        emitted = [message.value for message in self.bars.pending_bars]
+        self.bars.pending_bars = []
+        return emitted
+
+    @property
+    def late_trades(self) -> int:
+        """Return the number of late trades dropped so far."""
+        return self.bars.load_state(self.state).late_trades
+
+
+def test_window_is_emitted_once_the_watermark_passes_its_end():
+    """A window waits `allowed_lateness` after its end before closing."""
+    engine = Engine(allowed_lateness=5)
+
+    assert engine.process(make_trade(0, 100), make_trade(30, 110, 2)) == []
+    assert engine.process(make_trade(61, 105), make_trade(64.9, 104)) == []
+    (bar,) = engine.process(make_trade(65, 103))
+
+    assert bar["product_id"] == "ETH-USD"
+    assert (bar["open"], bar["high"], bar["low"], bar["close"]) == (
+        100,
+        110,
+        100,
+        110,
+    )
+    assert (bar["volume"], bar["ticks"]) == (3, 2)
+    assert (bar["start_time"], bar["end_time"]) == (at(0), at(60))
+
+
+def test_late_trades_are_dropped_and_counted():
+    """Trades of a window already emitted do not change any bar."""
+    engine = Engine(allowed_lateness=5)
+    engine.process(make_trade(10, 100), make_trade(65, 101))
+
+    assert engine.process(make_trade(59, 200)) == []
+    assert engine.late_trades == 1
+
+    (bar,) = engine.process(make_trade(125, 102))
+    assert bar["start_time"] == at(60)
+    assert (bar["high"], bar["ticks"]) == (101, 1)
+
+
+def test_out_of_order_trades_within_the_lateness():
+    """Trades of open windows are added in timestamp order."""
+    engine = Engine(allowed_lateness=5)
+
+    engine.process(
+        make_trade(20, 100),
+        make_trade(10, 90),
+        make_trade(62, 120),
+        # Earlier than the last trade, but its window is still open
+        make_trade(58, 80),
+        make_trade(30, 95),
+    )
+    first, second = engine.process(make_trade(125, 130))
+
+    assert engine.late_trades == 0
+    assert (first["open"], first["close"]) == (90, 80)
+    assert (first["high"], first["low"], first["ticks"]) == (100, 80, 4)
+    assert (second["open"], second["close"], second["ticks"]) == (120, 120, 1)
+    assert second["start_time"] == at(60)
+
+
+def test_windows_without_trades_are_skipped():
+    """A gap in the trades emits no empty bars."""
+    engine = Engine(allowed_lateness=0)
+    engine.process(make_trade(0, 100))
+
+    (bar,) = engine.process(make_trade(300, 100))
+
+    assert bar["start_time"] == at(0)
+    assert engine.bars.load_state(engine.state).windows[0].start_ms == at(300)
+
+
+@pytest.mark.parametrize("allowed_lateness", [0, 5])
+def test_batches_emit_the_bars_of_single_trades(allowed_lateness):
+    """Processing a batch of trades emits the bars of one at a time."""
+    trades = [make_trade(s, 100 + s) for s in (0, 50, 30, 70, 59, 140, 200)]
+    one_by_one = Engine(allowed_lateness)
+    batched = Engine(allowed_lateness)
+
+    expected = one_by_one.process(*trades)
+    batched.bars.process_trades(trades, batched.state)
+
+    emitted = [message.value for message in batched.bars.pending_bars]
+    assert [bar["start_time"] for bar in emitted] == [
+        bar["start_time"] for bar in expected
+    ]
+    assert batched.late_trades == one_by_one.late_trades
@@ -0,0 +1,198 @@
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from finance_data_structures.base import InMemoryState
+from finance_data_structures.tick_imbalance_bars import TickImbalanceBars
+from finance_data_structures.vectorized_bars import (
+    build_tick_imbalance_bars,
+    build_volume_bars,
+)
+from finance_data_structures.volume_bars import VolumeBars
+from monitoring.pipeline_metrics import EMITTED_AT, LAST_TRADE_TIME
+from offline_bars import OfflineBarBuilder
+from settings.config import ProductId
+
+# Fields that differ between two runs building the same bars
+RUN_FIELDS = ("unique_id", EMITTED_AT, LAST_TRADE_TIME)
+
+
+def make_product(aggregation_type: str, interval: float) -> ProductId:
+    """Return the ETH product aggregated with the given type."""
+    return ProductId(
+        coin="ETH-USD",
+        aggregation={"type": aggregation_type, "interval": interval},
+    )
+
+
+def make_trades(
+    n_trades: int, seed: int, volumes: np.ndarray | None = None
+) -> dict[str, np.ndarray]:
+    """Return random trades of a product as one array per field."""
+    rng = np.random.default_rng(seed)
+    return {
+        "price": np.round(3_000 + rng.normal(0, 5, n_trades).cumsum(), 2),
+        "volume": (
+            np.round(rng.exponential(0.5, n_trades), 4)
+            if volumes is None
+            else volumes
+        ),
+        "is_buy": rng.random(n_trades) < 0.55,
+        # Several trades may share a millisecond
+        "timestamp": 1_700_000_000_000
+        + rng.integers(0, 3, n_trades).cumsum(),
+    }
+
+
+def stream_bars(engine_class: type, product: ProductId, trades: dict) -> list:
+    """Return the bars of the streaming engine processing the trades."""
+    output_topic = Mock()
+    output_topic.serialize = lambda key, value: SimpleNamespace(
+        key=key, value=value
+    )
+    engine = engine_class(Mock(), output_topic, [product])
+    engine.buffer_bars = True
+    engine.process_trades(
+        [
+            {
+                "product_id": "ETH/USD",
+                "side": "buy" if is_buy else "sell",
+                "price": price,
+                "volume": volume,
+                "timestamp": timestamp,
+            }
+            for price, volume, is_buy, timestamp in zip(
+                trades["price"].tolist(),
+                trades["volume"].tolist(),
+                trades["is_buy"].tolist(),
+                trades["timestamp"].tolist(),
+                strict=True,
+            )
+        ],
+        InMemoryState(),
+    )
+    return without_run_fields([msg.value for msg in engine.pending_bars])
+
+
+def without_run_fields(bars: list[dict]) -> list[dict]:
+    """Return the bars without the fields specific to a run."""
+    return [
+        {name: value for name, value in bar.items() if name not in RUN_FIELDS}
+        for bar in bars
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("threshold", [5, 20])
+def test_tick_imbalance_bars_match_streaming(seed, threshold):
+    """The vectorized tick imbalance bars are the streamed ones."""
+    trades = make_trades(2_000, seed)
+    product = make_product("tick imbalance", threshold)
+
+    bars = build_tick_imbalance_bars(
+        "ETH-USD",
+        threshold,
+        trades["price"],
+        trades["volume"],
+        trades["is_buy"],
+        trades["timestamp"],
+    )
+
+    streamed = stream_bars(TickImbalanceBars, product, trades)
+    assert len(bars) == len(streamed) > 0
+    for bar, streamed_bar in zip(bars, streamed, strict=True):
+        assert bar == pytest.approx(streamed_bar)
+
+
+@pytest.mark.parametrize(
+    "threshold, volumes",
+    [
+        (1.5, None),
+        (0.2, None),
+        # Trades split across several bars
+        (0.05, None),
+        # Cumulative volumes landing within rounding error of the boundaries
+        (0.3, np.full(2_000, 0.1)),
+        (0.7, np.tile([0.1, 0.2, 0.3, 0.1], 500)),
+        (1.0, np.tile([0.1, 0.7, 0.2, 1e-9], 500)),
+    ],
+)
+def test_volume_bars_match_streaming(threshold, volumes):
+    """The vectorized volume bars are the streamed ones."""
+    trades = make_trades(2_000, seed=1, volumes=volumes)
+    product = make_product("volume", threshold)
+
+    bars = build_volume_bars(
+        "ETH-USD",
+        threshold,
+        trades["price"],
+        trades["volume"],
+        trades["timestamp"],
+    )
+
+    streamed = stream_bars(VolumeBars, product, trades)
+    assert len(bars) == len(streamed) > 0
+    assert without_run_fields(bars) == streamed
+
+
+def test_volume_bars_ignore_trades_without_volume():
+    """Trades without volume do not move the prices of the bars."""
+    trades = make_trades(2_000, seed=2)
+    trades["volume"][::7] = 0
+    product = make_product("volume", 1.0)
+
+    bars = build_volume_bars(
+        "ETH-USD",
+        1.0,
+        trades["price"],
+        trades["volume"],
+        trades["timestamp"],
+    )
+
+    assert without_run_fields(bars) == stream_bars(VolumeBars, product, trades)
+
+
+def test_offline_bars_are_built_per_product_and_type():
+    """Trades of the cache are split by product and sorted by timestamp."""
+    eth = make_trades(1_000, seed=3)
+    eth["timestamp"] = 1_700_000_000_000 + np.arange(1_000)
+    # Pages of the cache are not stored in order
+    order = np.concatenate((np.arange(500, 1_000), np.arange(500)))
+    table = pa.table(
+        {
+            "product_id": ["ETH/USD"] * 1_000 + ["BTC/USD"] * 10,
+            "side": ["buy" if b else "sell" for b in eth["is_buy"][order]]
+            + ["buy"] * 10,
+            "price": np.concatenate((eth["price"][order], np.ones(10))),
+            "volume": np.concatenate((eth["volume"][order], np.ones(10))),
+            "timestamp": np.concatenate(
+                (eth["timestamp"][order], np.arange(10))
+            ),
+        }
+    )
+    products = [make_product("tick imbalance", 10), make_product("volume", 2)]
+
+    bars = OfflineBarBuilder(products).build(table)
+
+    assert set(bars) == {("ETH-USD", "tick imbalance"), ("ETH-USD", "volume")}
+    assert without_run_fields(bars["ETH-USD", "volume"]) == stream_bars(
+        VolumeBars, products[1], eth
+    )
+    assert len(bars["ETH-USD", "tick imbalance"]) == len(
+        stream_bars(TickImbalanceBars, products[0], eth)
+    )
+
+
+@pytest.mark.parametrize("aggregation_type", ["time", "dollar"])
+def test_offline_builder_rejects_unsupported_types(aggregation_type):
+    """Only the types with a vectorized builder can be built offline."""
+    products = [
+        make_product("volume", 2),
+        make_product(aggregation_type, 60),
+    ]
+
+    with pytest.raises(ValueError, match="not supported offline"):
+        OfflineBarBuilder(products)
@@ -0,0 +1,150 @@
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+
+from finance_data_structures.base import InMemoryState
+from finance_data_structures.volume_bars import DollarBars, VolumeBars
+from settings.config import ProductId
+
+T0 = 1_700_000_000_000
+
+
+def make_trade(i: int, price: float, volume: float) -> dict:
+    """Return the `i`-th ETH trade, one second after the previous one."""
+    return {
+        "product_id": "ETH/USD",
+        "side": "buy",
+        "price": price,
+        "volume": volume,
+        "timestamp": T0 + i * 1000,
+    }
+
+
+def make_engine(engine_class: type, interval: float) -> VolumeBars:
+    """Return an engine of ETH bars, buffering the bars it emits."""
+    output_topic = Mock()
+    output_topic.serialize = lambda key, value: SimpleNamespace(
+        key=key, value=value
+    )
+    aggregation_type = "dollar" if engine_class is DollarBars else "volume"
+    product = ProductId(
+        coin="ETH-USD",
+        aggregation={"type": aggregation_type, "interval": interval},
+    )
+    engine = engine_class(Mock(), output_topic, [product])
+    engine.buffer_bars = True
+    return engine
+
+
+def process(engine_class: type, interval: float, trades: list) -> list[dict]:
+    """Return the bars of the engine processing the trades one at a time."""
+    engine = make_engine(engine_class, interval)
+    state = InMemoryState()
+    for trade in trades:
+        engine.process_trade(trade, state)
+    return [message.value for message in engine.pending_bars]
+
+
+def ohlc(bar: dict) -> tuple:
+    """Return the prices and times of a bar."""
+    return (
+        bar["open"],
+        bar["high"],
+        bar["low"],
+        bar["close"],
+        bar["start_time"],
+        bar["end_time"],
+    )
+
+
+def test_dollar_bar_completes_at_the_dollar_threshold():
+    """A bar is complete once the traded dollar value reaches the interval."""
+    bars = process(
+        DollarBars,
+        1_000,
+        [make_trade(0, 100, 4), make_trade(1, 120, 4), make_trade(2, 150, 4)],
+    )
+
+    (bar,) = bars
+    assert ohlc(bar) == (100, 150, 100, 150, T0, T0 + 2000)
+    # 400 + 480 dollars, then 120 of the 600 of the last trade
+    assert bar["volume"] == pytest.approx(8.8)
+    assert bar["dollar_volume"] == 1_000
+    assert bar["product_id"] == "ETH-USD"
+
+
+def test_dollar_trade_is_split_across_bars():
+    """A trade worth several bars completes them all, the rest carries on."""
+    bars = process(
+        DollarBars,
+        1_000,
+        [
+            make_trade(0, 100, 4),
+            # 3000 dollars: 600 complete the bar, 2000 make two more bars
+            make_trade(1, 200, 15),
+            make_trade(2, 100, 6),
+        ],
+    )
+
+    assert [ohlc(bar) for bar in bars] == [
+        (100, 200, 100, 200, T0, T0 + 1000),
+        (200, 200, 200, 200, T0 + 1000, T0 + 1000),
+        (200, 200, 200, 200, T0 + 1000, T0 + 1000),
+        # The 400 dollars left of the trade and 600 of the next one
+        (200, 200, 100, 100, T0 + 1000, T0 + 2000),
+    ]
+    assert [bar["volume"] for bar in bars] == [7, 5, 5, 8]
+
+
+def test_volume_trade_is_split_across_bars():
+    """The volume bars split trades the same way."""
+    bars = process(
+        VolumeBars,
+        2,
+        [
+            make_trade(0, 100, 1.5),
+            # 0.5 complete the bar, 4 make two more bars
+            make_trade(1, 110, 5),
+            make_trade(2, 90, 1.5),
+        ],
+    )
+
+    assert [ohlc(bar) for bar in bars] == [
+        (100, 110, 100, 110, T0, T0 + 1000),
+        (110, 110, 110, 110, T0 + 1000, T0 + 1000),
+        (110, 110, 110, 110, T0 + 1000, T0 + 1000),
+        # The 0.5 left of the trade and 1.5 of the next one
+        (110, 110, 90, 90, T0 + 1000, T0 + 2000),
+    ]
+    assert {bar["volume"] for bar in bars} == {2}
+
+
+@pytest.mark.parametrize("engine_class", [VolumeBars, DollarBars])
+def test_trades_without_volume_are_ignored(engine_class):
+    """Trades without volume do not open or change a bar."""
+    bars = process(
+        engine_class,
+        1,
+        [make_trade(0, 50, 0), make_trade(1, 100, 2), make_trade(2, 1, 0)],
+    )
+
+    assert ohlc(bars[0])[:4] == (100, 100, 100, 100)
+    assert bars[0]["start_time"] == T0 + 1000
+
+
+def test_bar_in_progress_is_kept_in_the_state():
+    """Processing the trades in batches emits the same bars."""
+    trades = [make_trade(i, 100 + i % 7, 0.3 + i % 3) for i in range(50)]
+
+    bars = process(DollarBars, 500, trades)
+
+    engine = make_engine(DollarBars, 500)
+    state = InMemoryState()
+    engine_bars = []
+    for start in range(0, 50, 7):
+        engine.process_trades(trades[start : start + 7], state)
+        engine_bars.extend(message.value for message in engine.pending_bars)
+        engine.pending_bars = []
+
+    assert [ohlc(bar) for bar in engine_bars] == [ohlc(bar) for bar in bars]
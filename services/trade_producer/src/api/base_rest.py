@@ -1,12 +1,11 @@
 import asyncio
-import hashlib
-from pathlib import Path
+import json
 
 import aiohttp
 import backoff
-import pandas as pd
-from api.trade import Trade
 from utils.logging_config import logger
+from utils.rate_limiter import CallCounterRateLimiter
+from utils.trade_cache import TradeCache
 
 
 class BaseExchangeRestAPI:
@@ -19,6 +18,7 @@ class BaseExchangeRestAPI:
         last_n_days: int,
         cache_dir: str | None = None,
         api_key: str | None = None,
+        rate_limiter: CallCounterRateLimiter | None = None,
     ) -> None:
         """Initialize the REST API.
 
@@ -29,6 +29,8 @@ class BaseExchangeRestAPI:
         last_n_days: The number of days from which we want to get trades.
         api_key: The API key to use for authentication.
         cache_dir: The directory to store the cached trade data.
+        rate_limiter: Rate limiter shared by the REST clients of the
+            exchange. Requests are not rate limited if None.
 
         """
         self.url = url
@@ -37,10 +39,13 @@ class BaseExchangeRestAPI:
         self.last_n_days = last_n_days
         self._session: aiohttp.ClientSession | None = None
         self.semaphore = asyncio.Semaphore(10)
+        self.rate_limiter = rate_limiter
+        # Size of the response bodies received
+        self.downloaded_bytes = 0
         self.use_cache = False
         if cache_dir:
             self.use_cache = True
-            self.cache = CachedTradeData(cache_dir)
+            self.cache = TradeCache(cache_dir)
 
     async def __aenter__(self):
         """Initialize connection upon entering async context manager."""
@@ -78,6 +83,8 @@ class BaseExchangeRestAPI:
         logger.debug(f"Preparing request to {self.url} with params={payload}")
 
         async with self.semaphore:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
             try:
                 # Make sure the request is awaited
                 async with self.session.get(
@@ -87,7 +94,9 @@ class BaseExchangeRestAPI:
                 ) as response:
                     response.raise_for_status()
                     logger.info(f"Request successful: {self.url}")
-                    response_data = await response.json()
+                    body = await response.read()
+                    self.downloaded_bytes += len(body)
+                    response_data = json.loads(body)
 
                     # Check if API returns "too many requests" in its own error
                     # field
@@ -158,77 +167,3 @@ class BaseExchangeRestAPI:
         except Exception as e:
             logger.error(f"Error while receiving trades: {e}")
             raise e
-
-
-class CachedTradeData:
-    """Class for handling cached trade data."""
-
-    def __init__(self, cache_dir: str) -> None:
-        """Initialize the CachedTradeData class.
-
-        Args:
-        ----
-        cache_dir: The directory to store the cached trade data.
-
-        """
-        self.cache_dir = Path(cache_dir)
-        if not self.cache_dir.exists():
-            self.cache_dir.mkdir(parents=True)
-
-    def read(self, url: str) -> tuple[list[Trade], int]:
-        """Read trade data from the cache, given the URL.
-
-        Args:
-        ----
-        url: The URL to read trade data from.
-
-        """
-        file_path = self._get_file_path(url)
-        if file_path.exists():
-            data = pd.read_parquet(file_path)
-            return [
-                Trade(**trade) for trade in data.to_dict(orient="records")
-            ], data["last_trade_id"][0]
-        return [], None
-
-    def write(self, url: str, trades: list[Trade], last_trade_id: int) -> None:
-        """Write trade data to the cache, given the URL.
-
-        Args:
-        ----
-        url: The URL to write trade data to.
-        trades: The trade data to write to the cache.
-        last_trade_id: The last trade ID written to the cache.
-
-        """
-        if not trades:
-            return
-        file_path = self._get_file_path(url)
-        data = pd.DataFrame([trade.model_dump() for trade in trades])
-        data["last_trade_id"] = last_trade_id
-        data.to_parquet(file_path, index=False)
-
-    def has(self, url: str) -> bool:
-        """Return True if the cache has the trade data given the url.
-
-        Args:
-        ----
-        url: The URL to check if the cache has trade data for.
-
-        """
-        file_path = self._get_file_path(url)
-        return file_path.exists()
-
-    def _get_file_path(self, url: str) -> Path:
-        """Get the file path for the given URL.
-
-        Specifically, return the file where the trade data for the given
-        url is (or will be) stored.
-
-        Args:
-        ----
-        url: The URL to get the file path for.
-
-        """
-        url_hash = hashlib.md5(url.encode("utf-8")).hexdigest()
-        return self.cache_dir / f"{url_hash}.parquet"
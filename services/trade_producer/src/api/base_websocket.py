@@ -1,16 +1,35 @@
 import asyncio
+import itertools
 import json
-from typing import Any
+import random
 
 import websockets
+from api.trade import Trade
+from monitoring.monitoring_metrics import monitoring
+from utils.json_decoder import AUTO, get_json_loads
 from utils.logging_config import logger
 
 
 class BaseExchangeWebSocket:
-    """Base class for exchange websockets APIs."""
+    """Base class for exchange websockets APIs.
+
+    `run` supervises the connection: when no message (trade or heartbeat) is
+    received for `heartbeat_timeout` seconds, or the connection drops, it
+    reconnects with jittered exponential backoff and backfills the trades
+    missed while disconnected with `backfill_gap`. The backfill and the first
+    live trades of every product after the reconnection drop the trades
+    whose id is not after the last one seen, so the overlap between the
+    backfill and the live feed is not produced twice.
+    """
 
     def __init__(
-        self, url: str, product_ids: list[str], channels: list[str]
+        self,
+        url: str,
+        product_ids: list[str],
+        channels: list[str],
+        json_backend: str = AUTO,
+        heartbeat_timeout: float = 30,
+        max_backoff: float = 60,
     ) -> None:
         """Initialize the Websocket connection.
 
@@ -19,12 +38,28 @@ class BaseExchangeWebSocket:
         url: Websocket API url.
         product_ids: List of product ids to subscribe to.
         channels: List of channels to subscribe to.
+        json_backend: JSON library decoding the received messages.
+        heartbeat_timeout: Seconds without any message after which the
+            connection is considered stale.
+        max_backoff: Max seconds to wait between two reconnection attempts.
 
         """
         self.url = url
         self.product_ids = product_ids
         self.channels = channels
+        self.loads = get_json_loads(json_backend)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_backoff = max_backoff
         self._ws: websockets.WebSocketClientProtocol | None = None
+        # Last trade seen of each product
+        self._last_trades: dict[str, Trade] = {}
+        # Products whose next live trades may overlap the backfill
+        self._products_to_dedup: set[str] = set()
+
+    @property
+    def name(self) -> str:
+        """Return the name of the exchange."""
+        raise NotImplementedError
 
     async def __aenter__(self):
         """Initialize connection upon entering async context manager."""
@@ -48,9 +83,7 @@ class BaseExchangeWebSocket:
         """Create a websocket connection."""
         try:
             headers = {"Sec-WebSocket-Extensions": "permessage-deflate"}
-            self._ws = await websockets.connect(
-                url, ping_interval=None, extra_headers=headers
-            )
+            self._ws = await websockets.connect(url, extra_headers=headers)
             logger.info(f"Connection established to {url}.")
             await self._subscribe()
         except Exception as e:
@@ -68,6 +101,11 @@ class BaseExchangeWebSocket:
         except Exception as e:
             logger.info(f"Subscription error: {e}")
 
+    async def _recv(self) -> str | bytes:
+        """Receive the next message, failing if the connection is stale."""
+        async with asyncio.timeout(self.heartbeat_timeout):
+            return await self._ws.recv()
+
     def _create_subscribe_message(self) -> dict:
         """Create the subscribe message."""
         raise NotImplementedError
@@ -82,12 +120,69 @@ class BaseExchangeWebSocket:
         """
         raise NotImplementedError
 
-    async def run(self) -> list[dict[str, Any]]:
+    async def backfill_gap(self) -> list[Trade]:
+        """Return the trades missed since the last trade seen.
+
+        Exchanges without a REST API to backfill from return no trades.
+        """
+        return []
+
+    async def run(self) -> list[Trade]:
         """Run the WebSocket listener."""
-        while True:
+        try:
+            trades = await self.get_trades()  # type: ignore
+        except Exception as e:
+            logger.error(f"Error while receiving trades: {e}")
+            return await self.reconnect()
+        if self._products_to_dedup:
+            trades = self._drop_seen_trades(trades)
+            self._products_to_dedup.difference_update(
+                trade.product_id for trade in trades
+            )
+        self._last_trades.update((trade.product_id, trade) for trade in trades)
+        return trades
+
+    async def reconnect(self) -> list[Trade]:
+        """Reconnect and return the trades missed while disconnected."""
+        for attempt in itertools.count():
+            await asyncio.sleep(
+                random.uniform(0, min(self.max_backoff, 2**attempt))
+            )
+            if self._ws:
+                await self._ws.close()
             try:
-                trades = await self.get_trades()  # type: ignore
-                return trades
+                await self.connect(self.url)
+                break
             except Exception as e:
-                logger.error(f"Error while receiving trades: {e}")
-                await asyncio.sleep(5)
+                logger.error(f"Reconnection attempt {attempt + 1} failed: {e}")
+        monitoring.increment_reconnect_count(self.name)
+        self._products_to_dedup = set(self._last_trades)
+
+        try:
+            trades = self._drop_seen_trades(await self.backfill_gap())
+        except Exception as e:
+            logger.error(f"Error while backfilling the gap: {e}")
+            return []
+        self._last_trades.update((trade.product_id, trade) for trade in trades)
+        logger.info(f"Backfilled {len(trades)} trades missed by {self.name}.")
+        monitoring.increment_backfilled_trades(self.name, len(trades))
+        return trades
+
+    def _drop_seen_trades(self, trades: list[Trade]) -> list[Trade]:
+        """Drop the trades whose id is not after the last trade id seen.
+
+        Trade ids increase per product, so only the last trade seen of every
+        product has to be remembered. Trades without an id are kept.
+        """
+        new_trades = []
+        last_trades = self._last_trades
+        for trade in trades:
+            last = last_trades.get(trade.product_id)
+            if (
+                trade.trade_id is None
+                or last is None
+                or last.trade_id is None
+                or trade.trade_id > last.trade_id
+            ):
+                new_trades.append(trade)
+        return new_trades
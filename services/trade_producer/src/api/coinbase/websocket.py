@@ -1,10 +1,11 @@
-import json
 from typing import Any
 
 from api.base_websocket import BaseExchangeWebSocket
-from api.trade import Trade
+from api.trade import Trade, validate_trades
 from monitoring.monitoring_metrics import monitoring
+from utils.json_decoder import AUTO
 from utils.logging_config import logger
+from utils.timestamps import date_to_ts
 
 
 class CoinBaseWebsocketTradeAPI(BaseExchangeWebSocket):
@@ -13,9 +14,21 @@ class CoinBaseWebsocketTradeAPI(BaseExchangeWebSocket):
     URL = "wss://ws-feed.exchange.coinbase.com"
     FAILOVER_URL = "wss://ws-feed.exchange.coinbase.com"
 
-    def __init__(self, product_ids: list[str], channels: list[str]) -> None:
+    def __init__(
+        self,
+        product_ids: list[str],
+        channels: list[str],
+        json_backend: str = AUTO,
+        heartbeat_timeout: float = 30,
+    ) -> None:
         """Initialize the Coinbase API with the provided websocket URL."""
-        super().__init__(self.URL, product_ids, channels)
+        super().__init__(
+            self.URL,
+            product_ids,
+            channels,
+            json_backend,
+            heartbeat_timeout=heartbeat_timeout,
+        )
 
     @property
     def name(self) -> str:
@@ -65,25 +78,29 @@ class CoinBaseWebsocketTradeAPI(BaseExchangeWebSocket):
         list[dict]: A list of dictionaries representing the trades.
 
         """
+        # Connection errors are raised, so that `run` reconnects
+        response = await self._recv()
         try:
-            response = await self._ws.recv()
-            json_response = json.loads(response)
+            json_response = self.loads(response)
             if "type" in json_response and json_response["type"] == "heartbeat":
                 logger.info("Received heartbeat from Coinbase.")
                 monitoring.increment_heartbeat_count(self.name)
                 return []
 
             if "type" in json_response and json_response["type"] == "ticker":
-                return [
-                    Trade(
-                        product_id=json_response["product_id"],
-                        side=json_response["side"],
-                        price=float(json_response["price"]),
-                        volume=float(json_response["last_size"]),
-                        timestamp=json_response["time"],
-                        exchange=self.name,
-                    )
-                ]
+                return validate_trades(
+                    [
+                        Trade(
+                            product_id=json_response["product_id"],
+                            side=json_response["side"],
+                            price=float(json_response["price"]),
+                            volume=float(json_response["last_size"]),
+                            timestamp=date_to_ts(json_response["time"]),
+                            exchange=self.name,
+                            trade_id=json_response.get("trade_id"),
+                        )
+                    ]
+                )
         except Exception as e:
             logger.error(f"Error while reading trades: {e}")
         return []
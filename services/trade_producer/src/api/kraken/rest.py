@@ -1,8 +1,14 @@
+import asyncio
+from collections import deque
 from datetime import datetime, timezone
 
 from api.base_rest import BaseExchangeRestAPI
 from api.trade import Trade
+from monitoring.monitoring_metrics import monitoring
 from utils.logging_config import logger
+from utils.rate_limiter import CallCounterRateLimiter
+from utils.timestamps import ts_to_date
+from utils.trade_cache import DAY_MS
 
 
 class KrakenRestAPI(BaseExchangeRestAPI):
@@ -11,7 +17,15 @@ class KrakenRestAPI(BaseExchangeRestAPI):
     URL = "https://api.kraken.com/0/public/Trades"
 
     def __init__(
-        self, product_id: str, last_n_days: int, cache_dir: str | None = None
+        self,
+        product_id: str,
+        last_n_days: int | None = None,
+        cache_dir: str | None = None,
+        from_ms: int | None = None,
+        to_ms: int | None = None,
+        n_shards: int = 1,
+        max_concurrent_shards: int = 4,
+        rate_limiter: CallCounterRateLimiter | None = None,
     ) -> None:
         """Initialize the KrakenRestAPI with the provided REST URL.
 
@@ -20,10 +34,27 @@ class KrakenRestAPI(BaseExchangeRestAPI):
         product_id: The product ID to fetch trades for.
         last_n_days: The number of days from which we want to get trades.
         cache_dir: The directory to store the cached trade data.
+        from_ms: Unix milliseconds to fetch trades from, instead of
+            `last_n_days` ago.
+        to_ms: Unix milliseconds to fetch trades up to, instead of today at
+            midnight.
+        n_shards: Number of time shards `[from_ms, to_ms)` is split into.
+            With more than one, the shards are downloaded concurrently.
+        max_concurrent_shards: Max number of shards downloaded at once.
+        rate_limiter: Rate limiter shared by all the Kraken REST clients.
 
         """
-        super().__init__(self.URL, product_id, last_n_days, cache_dir)
-        self.from_ms, self.to_ms = self._init_from_to_ms(last_n_days)
+        super().__init__(
+            self.URL,
+            product_id,
+            last_n_days,
+            cache_dir,
+            rate_limiter=rate_limiter,
+        )
+        if from_ms is None or to_ms is None:
+            self.from_ms, self.to_ms = self._init_from_to_ms(last_n_days)
+        else:
+            self.from_ms, self.to_ms = from_ms, to_ms
 
         logger.info(
             f"Initializing KrakenRestAPI for product_id={self.product_id}, "
@@ -31,11 +62,18 @@ class KrakenRestAPI(BaseExchangeRestAPI):
             f"to_ms={ts_to_date(self.to_ms)}"
         )
 
-        # Initialize trade ID with 'since' parameter (start from desired time)
-        # This will be updated after each batch of trades fetched from the API
-        self.last_trade_id = self.from_ms * 1_000_000
+        # Start of the next page of trades, in Unix milliseconds. This will be
+        # updated after each batch of trades fetched from the API
         self.last_trade_ms = self.from_ms
-        self.last_trade_data = None
+
+        self.n_shards = n_shards
+        self.max_concurrent_shards = max_concurrent_shards
+        self._pending_shards: deque[tuple[int, int]] | None = None
+        self._running_shards: deque[tuple[int, asyncio.Task]] = deque()
+
+        # Trades read from the cache and from the api
+        self.cached_trades = 0
+        self.downloaded_trades = 0
 
     @property
     def name(self) -> str:
@@ -46,6 +84,23 @@ class KrakenRestAPI(BaseExchangeRestAPI):
         """Check if all trades have been fetched."""
         return self.last_trade_ms >= self.to_ms
 
+    async def __aenter__(self):
+        """Open the session and report how much of the range is cached."""
+        await super().__aenter__()
+        if self.use_cache:
+            missing = self._missing_ranges()
+            missing_ms = sum(to_ms - from_ms for from_ms, to_ms in missing)
+            coverage = 1 - missing_ms / max(self.to_ms - self.from_ms, 1)
+            monitoring.set_historical_coverage(
+                self.name, self.product_id, coverage
+            )
+            logger.info(
+                f"{coverage:.1%} of the {self.product_id} trades are cached,"
+                f" downloading {len(missing)} missing ranges"
+                f" ({missing_ms / 3_600_000:.1f} hours)"
+            )
+        return self
+
     @staticmethod
     def _init_from_to_ms(last_n_days: int) -> tuple[int, int]:
         """Return the from_ms and to_ms timestamps for the historical data.
@@ -75,89 +130,221 @@ class KrakenRestAPI(BaseExchangeRestAPI):
     async def get_historical_trades(
         self,
     ) -> list[Trade]:
-        """Read historical trades from the Kraken REST API."""
-        since_id = self.last_trade_id
+        """Read historical trades from the Kraken REST API.
 
-        params = {"pair": self.product_id, "since": since_id}
+        Sequentially, every call returns the next page of trades. With
+        several shards, every call returns the trades of the next shard.
+        """
+        if self.n_shards > 1:
+            return await self._get_next_shard()
+
+        trades, next_ms = await self._get_page(self.last_trade_ms)
+        if next_ms == self.last_trade_ms:
+            # No trades after the last one: we caught up with Kraken
+            self.last_trade_ms = self.to_ms
+            return trades
+        self.last_trade_ms = next_ms
+        if trades and trades[-1].timestamp >= self.to_ms:
+            trades = [trade for trade in trades if trade.timestamp < self.to_ms]
+        return trades
 
-        url = self.URL + "?" + "&".join([f"{k}={v}" for k, v in params.items()])
-        if self.use_cache and self.cache.has(url):
-            trades, last_trade_id = self.cache.read(url)
-            logger.info(
-                f"Loaded {len(trades)} for {self.product_id} from cache"
-                f" since={trades[0].timestamp} to={trades[-1].timestamp}"
-            )
-            self.last_trade_id = last_trade_id
-            self.last_trade_data = trades[-1]
-        else:
-            trades = await self.get(params)
-            try:
-                self.last_trade_id = trades["result"]["last"]
-            except KeyError:
-                logger.info(trades)
-                logger.error(f"KeyError for {self.product_id}")
-                logger.error(trades)
-                raise KeyError(f"KeyError for {self.product_id}")
-            trades = [
-                Trade(
-                    product_id=self.product_id,
-                    side="buy" if trade[3] == "b" else "sell",
-                    price=float(trade[0]),
-                    volume=float(trade[1]),
-                    timestamp=ts_to_date(int(trade[2] * 1000)),
-                    exchange=self.name,
-                )
-                for trade in trades["result"][self.product_id]
-            ]
+    async def _get_page(self, since_ms: int) -> tuple[list[Trade], int]:
+        """Read a page of trades from `since_ms` on, from the cache if possible.
+
+        Pages cover `[since_ms, next_ms)`: the trades of the millisecond of
+        the last trade of a response may continue on the next response, so
+        they are left to the next page. Cached pages end at most at the end
+        of the day.
+
+        Args:
+        ----
+        since_ms: Start of the page, in Unix milliseconds.
 
-            if trades:
-                # Update the last trade timestamp
-                self.last_trade_ms = date_to_ts(trades[-1].timestamp)
-                if self.last_trade_data == trades[0]:
-                    trades = trades[1:]
-                self.last_trade_data = trades[-1]
+        Returns:
+        -------
+        tuple[list[Trade], int]: The trades and the start of the next page,
+            equal to `since_ms` if there are no trades after it.
 
-            if self.use_cache:
-                self.cache.write(url, trades, self.last_trade_id)
+        """
+        if self.use_cache:
+            covered_until = self.cache.covered_until(
+                self.name, self.product_id, since_ms
+            )
+            if covered_until is not None:
+                next_ms = min(covered_until, (since_ms // DAY_MS + 1) * DAY_MS)
+                trades = self.cache.read(
+                    self.name, self.product_id, since_ms, next_ms
+                )
+                self.cached_trades += len(trades)
+                monitoring.increment_historical_trades(
+                    self.name, self.product_id, "cache", len(trades)
+                )
                 logger.info(
-                    f"Wrote {len(trades)} for {self.product_id} to cache"
-                    f" since={trades[0].timestamp} to={trades[-1].timestamp}"
+                    f"Loaded {len(trades)} for {self.product_id} from cache"
+                    f" since={ts_to_date(since_ms)} to={ts_to_date(next_ms)}"
                 )
-
-            logger.info(
-                f"Fetched {len(trades)} trades for {self.product_id}, "
-                f"since={trades[0].timestamp} "
-                f"to={trades[-1].timestamp} from the Kraken REST API"
+                return trades, next_ms
+
+        params = {"pair": self.product_id, "since": since_ms * 1_000_000}
+        response = await self.get(params)
+        try:
+            result = response["result"][self.product_id]
+        except KeyError:
+            logger.error(f"KeyError for {self.product_id}")
+            logger.error(response)
+            raise KeyError(f"KeyError for {self.product_id}")
+        trades = [
+            Trade(
+                product_id=self.product_id,
+                side="buy" if trade[3] == "b" else "sell",
+                price=float(trade[0]),
+                volume=float(trade[1]),
+                timestamp=int(trade[2] * 1000),
+                exchange=self.name,
+                trade_id=trade[6],
+            )
+            for trade in result
+        ]
+        trades = [trade for trade in trades if trade.timestamp >= since_ms]
+        if not trades:
+            return trades, since_ms
+
+        last_ms = trades[-1].timestamp
+        if last_ms > since_ms:
+            next_ms = last_ms
+            trades = [trade for trade in trades if trade.timestamp < next_ms]
+        else:
+            # Every trade is in the first millisecond: we caught up
+            next_ms = since_ms + 1
+
+        if self.use_cache:
+            # Other shards may have cached part of the page while it was
+            # downloaded: only the range still missing from `since_ms` on is
+            # written and returned, the rest is read from the cache
+            missing = self.cache.missing_ranges(
+                self.name, self.product_id, since_ms, next_ms
+            )
+            if not missing or missing[0][0] > since_ms:
+                return await self._get_page(since_ms)
+            missing_to = missing[0][1]
+            if missing_to < next_ms:
+                next_ms = missing_to
+                trades = [t for t in trades if t.timestamp < next_ms]
+            self.cache.write(
+                self.name, self.product_id, trades, since_ms, next_ms
             )
 
-        return trades
+        self.downloaded_trades += len(trades)
+        monitoring.increment_historical_trades(
+            self.name, self.product_id, "api", len(trades)
+        )
+        logger.info(
+            f"Fetched {len(trades)} trades for {self.product_id}, "
+            f"since={ts_to_date(since_ms)} to={ts_to_date(next_ms)} from the"
+            " Kraken REST API"
+        )
+        return trades, next_ms
+
+    def _missing_ranges(self) -> list[tuple[int, int]]:
+        """Return the ranges of `[from_ms, to_ms)` that must be downloaded."""
+        if not self.use_cache:
+            return [(self.from_ms, self.to_ms)]
+        return self.cache.missing_ranges(
+            self.name, self.product_id, self.from_ms, self.to_ms
+        )
 
+    def _split_range(self) -> deque[tuple[int, int]]:
+        """Split `[from_ms, to_ms)` into consecutive time shards.
 
-def ts_to_date(ts: int) -> str:
-    """Transform a timestamp in Unix milliseconds to a human-readable date.
+        Only the missing ranges are downloaded: they are split into about
+        `n_shards` shards, in proportion to their length. The cached ranges
+        are read from the cache a day per shard.
+        """
+        missing = self._missing_ranges()
+        missing_ms = sum(to_ms - from_ms for from_ms, to_ms in missing)
+        shards = []
+        start = self.from_ms
+        for from_ms, to_ms in [*missing, (self.to_ms, self.to_ms)]:
+            while start < from_ms:
+                day_end = min(from_ms, (start // DAY_MS + 1) * DAY_MS)
+                shards.append((start, day_end))
+                start = day_end
+            if from_ms == to_ms:
+                continue
+            n_shards = max(
+                1, round(self.n_shards * (to_ms - from_ms) / missing_ms)
+            )
+            bounds = [
+                from_ms + (to_ms - from_ms) * i // n_shards
+                for i in range(n_shards + 1)
+            ]
+            shards.extend(zip(bounds[:-1], bounds[1:], strict=True))
+            start = to_ms
+        return deque(shards)
 
-    Args:
-    ----
-    ts (int): A timestamp in Unix milliseconds
+    async def _get_next_shard(self) -> list[Trade]:
+        """Return the trades of the next shard, in timestamp order.
 
-    """
-    return (
-        datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime(
-            "%Y-%m-%dT%H:%M:%S.%f"
-        )
-        + "Z"
-    )
+        Up to `max_concurrent_shards` shards are downloaded ahead of the one
+        returned, so at most that many shards are held in memory.
+        """
+        if self._pending_shards is None:
+            self._pending_shards = self._split_range()
+        while self._pending_shards and (
+            len(self._running_shards) < self.max_concurrent_shards
+        ):
+            from_ms, to_ms = self._pending_shards.popleft()
+            task = asyncio.create_task(self._download_shard(from_ms, to_ms))
+            self._running_shards.append((to_ms, task))
+
+        to_ms, task = self._running_shards.popleft()
+        trades = await task
+        self.last_trade_ms = to_ms
+        return trades
 
+    async def _download_shard(self, from_ms: int, to_ms: int) -> list[Trade]:
+        """Download the trades of `[from_ms, to_ms)`, walking its own cursor.
 
-def date_to_ts(date: str) -> int:
-    """Transform a human-readable date to Unix milliseconds.
+        The trades of the last page from `to_ms` on belong to the next shard,
+        and are dropped so the shards do not overlap when stitched together.
+        """
+        since_ms = from_ms
+        trades: list[Trade] = []
+        while since_ms < to_ms:
+            page, next_ms = await self._get_page(since_ms)
+            if next_ms == since_ms:
+                break
+            if next_ms > to_ms:
+                page = [trade for trade in page if trade.timestamp < to_ms]
+            trades.extend(page)
+            since_ms = next_ms
+        logger.info(
+            f"Downloaded {len(trades)} trades for {self.product_id}, "
+            f"shard since={ts_to_date(from_ms)} to={ts_to_date(to_ms)}"
+        )
+        return trades
 
-    Args:
-    ----
-    date (str): A human-readable date
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        """Cancel the shards still downloading and close the session.
 
-    """
-    dt = datetime.fromisoformat(date.replace("Z", "+00:00"))
-    unix_timestamp_seconds = dt.timestamp()
-    unix_timestamp_ms = int(unix_timestamp_seconds * 1000)
-    return unix_timestamp_ms
+        The pages cached by the download are merged into daily files, and
+        the trades read from the cache are reported with an estimate of the
+        bytes they would have taken to download.
+        """
+        for _, task in self._running_shards:
+            task.cancel()
+        if self.use_cache:
+            self.cache.compact(self.name, self.product_id)
+            report = (
+                f"Read {self.cached_trades} {self.product_id} trades from the"
+                f" cache and downloaded {self.downloaded_trades}"
+                f" ({self.downloaded_bytes / 1e6:.1f} MB)"
+            )
+            if self.cached_trades and self.downloaded_trades:
+                bytes_per_trade = self.downloaded_bytes / self.downloaded_trades
+                report += (
+                    f", saving about"
+                    f" {self.cached_trades * bytes_per_trade / 1e6:.1f} MB"
+                )
+            logger.info(report)
+        await super().__aexit__(exc_type, exc_value, traceback)
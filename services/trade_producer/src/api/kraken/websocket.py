@@ -1,9 +1,13 @@
-import json
+import time
 
 from api.base_websocket import BaseExchangeWebSocket
-from api.trade import Trade
+from api.kraken.rest import KrakenRestAPI
+from api.trade import Trade, validate_trades
 from monitoring.monitoring_metrics import monitoring
+from utils.json_decoder import AUTO
 from utils.logging_config import logger
+from utils.rate_limiter import CallCounterRateLimiter
+from utils.timestamps import date_to_ts
 
 
 class KrakenWebsocketTradeAPI(BaseExchangeWebSocket):
@@ -11,16 +15,35 @@ class KrakenWebsocketTradeAPI(BaseExchangeWebSocket):
 
     URL = "wss://ws.kraken.com/v2"
 
-    def __init__(self, product_ids: list[str], channels: list[str]) -> None:
+    def __init__(
+        self,
+        product_ids: list[str],
+        channels: list[str],
+        json_backend: str = AUTO,
+        heartbeat_timeout: float = 30,
+        rate_limiter: CallCounterRateLimiter | None = None,
+    ) -> None:
         """Initialize the KrakenWebsocketAPI with the provided websocket URL.
 
         Args:
         ----
         product_ids: The product ID to subscribe to.
         channels: The list of channels to subscribe to.
+        json_backend: JSON library decoding the received messages.
+        heartbeat_timeout: Seconds without any message after which the
+            connection is considered stale.
+        rate_limiter: Rate limiter of the Kraken REST requests backfilling
+            the trades missed while disconnected.
 
         """
-        super().__init__(self.URL, product_ids, channels)
+        super().__init__(
+            self.URL,
+            product_ids,
+            channels,
+            json_backend,
+            heartbeat_timeout=heartbeat_timeout,
+        )
+        self.rate_limiter = rate_limiter
 
     @property
     def name(self) -> str:
@@ -66,8 +89,8 @@ class KrakenWebsocketTradeAPI(BaseExchangeWebSocket):
         subscription is sucessful.
         """
         for _ in range(len(self.product_ids)):
-            await self._ws.recv()
-            await self._ws.recv()
+            await self._recv()
+            await self._recv()
 
     async def get_trades(self) -> list[Trade]:
         """Read trades from the Kraken websocket and return a list of dicts.
@@ -77,24 +100,45 @@ class KrakenWebsocketTradeAPI(BaseExchangeWebSocket):
         list[dict]: A list of dictionaries representing the trades.
 
         """
-        response = await self._ws.recv()
-        message = json.loads(response)
+        response = await self._recv()
+        message = self.loads(response)
         if message.get("channel", []) == "heartbeat":
             logger.info("Received heartbeat from Kraken.")
             monitoring.increment_heartbeat_count(self.name)
             return []
 
-        trades = []
-        for trade in message.get("data", []):
-            trades.append(
+        name = self.name
+        return validate_trades(
+            [
                 Trade(
-                    product_id=trade["symbol"],
-                    side=trade["side"],
-                    price=trade["price"],
-                    volume=trade["qty"],
-                    timestamp=trade["timestamp"],
-                    exchange=self.name,
+                    trade["symbol"],
+                    trade["side"],
+                    float(trade["price"]),
+                    float(trade["qty"]),
+                    date_to_ts(trade["timestamp"]),
+                    name,
+                    trade["trade_id"],
                 )
-            )
+                for trade in message.get("data", [])
+            ]
+        )
+
+    async def backfill_gap(self) -> list[Trade]:
+        """Fetch the trades missed since the last trade seen of each product.
 
+        The trades are read from the Kraken REST API, from the timestamp of
+        the last trade seen up to now.
+        """
+        to_ms = time.time_ns() // 1_000_000
+        trades = []
+        for product_id, last_trade in list(self._last_trades.items()):
+            rest_api = KrakenRestAPI(
+                product_id,
+                from_ms=last_trade.timestamp,
+                to_ms=to_ms,
+                rate_limiter=self.rate_limiter,
+            )
+            async with rest_api:
+                while not rest_api.is_done():
+                    trades.extend(await rest_api.run())
         return trades
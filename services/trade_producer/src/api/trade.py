@@ -1,19 +1,142 @@
-from pydantic import BaseModel, field_validator
+from collections.abc import Callable
+from typing import Any, NamedTuple
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from quixstreams.utils.json import dumps
 
-class Trade(BaseModel):
-    """A class representing a trade using Pydantic."""
+from utils.wire_format import BINARY, MAGIC, TRADE_SCHEMA_ID, pack_trade
+
+SIDES = frozenset(("buy", "sell"))
+# Fields of the trades written to Kafka
+MESSAGE_FIELDS = (
+    "product_id",
+    "side",
+    "price",
+    "volume",
+    "timestamp",
+    "exchange",
+)
+
+
+class Trade(NamedTuple):
+    """A trade.
+
+    Trades are plain tuples so they are cheap to build for every trade of a
+    websocket message. They are validated once per batch with
+    `validate_trades` instead of one at a time.
+    """
 
     product_id: str
     side: str
     price: float
     volume: float
-    timestamp: str
+    # Unix milliseconds
+    timestamp: int
     exchange: str
+    # Id of the trade on the exchange, increasing per product. It tells apart
+    # fills with the same side, price and volume in the same millisecond, and
+    # is not written to Kafka
+    trade_id: int | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the trade as a dictionary."""
+        return self._asdict()
+
+
+def validate_trades(trades: list[Trade]) -> list[Trade]:
+    """Validate that the side of every trade is either "buy" or "sell"."""
+    if not {trade.side for trade in trades} <= SIDES:
+        raise ValueError("Trade side must be either 'buy' or 'sell'.")
+    return trades
+
+
+def get_trade_serializer(wire_format: str) -> Callable[[Trade], bytes]:
+    """Return a function writing a trade straight to a Kafka message value.
+
+    The trade fields are encoded directly, without building the dictionary
+    that `topic.serialize` would need.
+
+    Args:
+    ----
+    wire_format (str): Format of the trades, "json" or "binary".
+
+    """
+    if wire_format == BINARY:
+        return lambda trade: pack_trade(*trade[:6])
+    return lambda trade: dumps(
+        dict(zip(MESSAGE_FIELDS, trade, strict=False))
+    )
+
+
+# Fixed-size part of a binary trade: the header and the side, price, volume
+# and timestamp of `wire_format.TRADE`
+BINARY_TRADE_ROW = np.dtype(
+    [
+        ("magic", "u1"),
+        ("schema_id", "u1"),
+        ("side", "i1"),
+        ("price", "<f8"),
+        ("volume", "<f8"),
+        ("timestamp", "<i8"),
+    ]
+)
+
+
+def serialize_trade_columns(
+    trades: pa.Table | pa.RecordBatch, wire_format: str
+) -> list[bytes]:
+    """Write the rows of a table of trades straight to Kafka message values.
+
+    The values are built from the columns, without creating a `Trade` per
+    row. The messages are the same as the ones written by
+    `get_trade_serializer`: binary messages are packed a column at a time,
+    and JSON messages are encoded by the same serializer from the rows of
+    the table.
+
+    Args:
+    ----
+    trades (pa.Table | pa.RecordBatch): Trades with the `Trade` columns.
+    wire_format (str): Format of the trades, "json" or "binary".
+
+    """
+    if not len(trades):
+        return []
+    if wire_format == BINARY:
+        return _serialize_binary_columns(trades)
+
+    return [
+        dumps(row) for row in trades.select(list(MESSAGE_FIELDS)).to_pylist()
+    ]
+
+
+def _serialize_binary_columns(trades: pa.Table | pa.RecordBatch) -> list[bytes]:
+    """Write the trades with the binary wire format, a column at a time."""
+    n_trades = len(trades)
+    rows = np.empty(n_trades, dtype=BINARY_TRADE_ROW)
+    rows["magic"] = MAGIC
+    rows["schema_id"] = TRADE_SCHEMA_ID
+    rows["side"] = np.where(
+        pc.equal(trades["side"], "buy").to_numpy(zero_copy_only=False), 1, -1
+    )
+    rows["price"] = trades["price"].to_numpy()
+    rows["volume"] = trades["volume"].to_numpy()
+    # Binary timestamps are epoch microseconds
+    rows["timestamp"] = trades["timestamp"].to_numpy() * 1000
+    fixed = rows.tobytes()
+    row_size = BINARY_TRADE_ROW.itemsize
 
-    @field_validator("side")
-    def validate_side(cls, v):
-        """Validate that the trade side is either "buy" or "sell"."""
-        if v not in ["buy", "sell"]:
-            raise ValueError("Trade side must be either 'buy' or 'sell'.")
-        return v
+    # The product id and the exchange follow the fixed-size part
+    suffixes = [
+        pack_trade(product_id, "buy", 0, 0, 0, exchange)[row_size:]
+        for product_id, exchange in zip(
+            trades["product_id"].to_pylist(),
+            trades["exchange"].to_pylist(),
+            strict=True,
+        )
+    ]
+    return [
+        fixed[i * row_size : (i + 1) * row_size] + suffix
+        for i, suffix in enumerate(suffixes)
+    ]
@@ -1,13 +1,18 @@
 import asyncio
 import time
-from typing import Any
 
 from api.base_rest import BaseExchangeRestAPI
 from api.base_websocket import BaseExchangeWebSocket
+from api.kraken.rest import KrakenRestAPI
+from api.trade import get_trade_serializer
 from monitoring.monitoring_metrics import monitoring
 from quixstreams import Application
-from settings.config import settings
+from settings.config import SupportedExchanges, settings
 from utils.logging_config import logger
+from utils.producer_thread import Message, ProducerThread
+from utils.trade_cache import TradeCache
+from utils.trade_queue import TradeQueue
+from utils.trade_replay import replay_cached_trades
 
 from utils.helpers import instanteate_apis  # isort:skip
 
@@ -15,7 +20,11 @@ from utils.helpers import instanteate_apis  # isort:skip
 async def produce_trades() -> None:
     """Read trades from from api and send them to a Kafka topic.
 
-    Supports both websocket and rest apis.
+    Supports both websocket and rest apis. Every api gets its own receiver
+    task that puts the trades in a bounded queue, and a single producer task
+    drains that queue in batches and hands them to the producer thread, so
+    the event loop only does network I/O and a slow producer never blocks
+    the websocket readers.
 
     Args:
     ----
@@ -23,53 +32,150 @@ async def produce_trades() -> None:
 
     """
     app = Application(broker_address=settings.kafka.kafka_broker_address)
-    topic = app.topic(name=settings.kafka.kafka_topic, value_serializer="json")
+    topic = app.topic(name=settings.kafka.kafka_topic)
 
     kraken_apis, coinbase_apis = instanteate_apis()
 
-    # Producer write to kafka - send message to Kafka topic
-    tasks = [run_apis(api, app, topic) for api in kraken_apis + coinbase_apis]
+    queue = TradeQueue(
+        maxsize=settings.queue.trade_queue_size,
+        backpressure_policy=settings.queue.backpressure_policy,
+    )
+    # One Kafka producer for the whole process, owned by a background thread
+    producer = ProducerThread(
+        app.get_producer(),
+        topic.name,
+        max_pending_batches=settings.queue.producer_max_pending_batches,
+    )
+    producer.start()
+    producer_task = asyncio.create_task(produce_from_queue(queue, producer))
+
+    # Receivers read from the apis - put trades in the queue
+    receivers = [run_apis(api, queue) for api in kraken_apis + coinbase_apis]
+    try:
+        await asyncio.gather(*receivers)
+    finally:
+        await queue.close()
+    await producer_task
+
+
+async def replay_trades() -> None:
+    """Replay the cached historical Kraken trades to a Kafka topic.
+
+    The trades of the last `last_n_days` are streamed from the cache of the
+    historical mode, all the products at once, and nothing is downloaded.
+    """
+    historical_settings = settings.live_or_historical_settings
+    if historical_settings.cache_dir_historical_data is None:
+        raise ValueError("The replay mode needs cache_dir_historical_data.")
+    cache = TradeCache(historical_settings.cache_dir_historical_data)
+    from_ms, to_ms = KrakenRestAPI._init_from_to_ms(
+        historical_settings.last_n_days
+    )
+    product_ids = [
+        product_id
+        for exchange in settings.exchanges
+        if exchange.name == SupportedExchanges.KRAKEN
+        for product_id in exchange.product_ids
+    ]
 
-    await asyncio.gather(*tasks)
+    app = Application(broker_address=settings.kafka.kafka_broker_address)
+    topic = app.topic(name=settings.kafka.kafka_topic)
+    producer = ProducerThread(
+        app.get_producer(),
+        topic.name,
+        max_pending_batches=settings.queue.producer_max_pending_batches,
+    )
+    producer.start()
+    try:
+        await asyncio.gather(
+            *(
+                replay_cached_trades(
+                    cache,
+                    "Kraken",
+                    product_id,
+                    from_ms,
+                    to_ms,
+                    producer,
+                    settings.kafka.kafka_wire_format,
+                    settings.queue.produce_batch_size,
+                    historical_settings.replay_speed,
+                )
+                for product_id in product_ids
+            )
+        )
+    finally:
+        await producer.stop()
+    logger.info("Replay done, producer stopped.")
 
 
 async def run_apis(
     api: BaseExchangeWebSocket | BaseExchangeRestAPI,
-    app: Application,
-    topic: Any,
+    queue: TradeQueue,
 ):
-    """Run the websocket API.
+    """Run the websocket API and put its trades in the queue.
 
     Args:
     ----
     api: The websocket/rest API to run.
-    app: The Quix application.
-    topic: The Kafka topic.
+    queue: The queue the producer reads the trades from.
 
     """
     async with api:
-        with app.get_producer() as producer:
-            while not api.is_done():
+        while not api.is_done():
 
-                # Monitor performance
-                start_time = time.time()
-                trades = await api.run()
-                latency = time.time() - start_time
-                monitoring.observe_request(exchange=api.name, metric=latency)
-                monitoring.increment_request_count(exchange=api.name)
+            # Monitor performance
+            start_time = time.time()
+            trades = await api.run()
+            latency = time.time() - start_time
+            monitoring.observe_request(exchange=api.name, metric=latency)
+            monitoring.increment_request_count(exchange=api.name)
 
-                # Send trades to redpanda
+            if trades:
+                received_at = time.time()
                 for trade in trades:
-                    #logger.info(f"Sending {trade} to redpanda")
-                    message = topic.serialize(
-                        trade.product_id, value=trade.model_dump()
+                    monitoring.observe_receive_latency(
+                        api.name,
+                        trade.product_id,
+                        received_at - trade.timestamp / 1000,
                     )
-                    producer.produce(
-                        topic.name, value=message.value, key=message.key
+                await queue.put(trades, api.name, received_at)
+
+
+async def produce_from_queue(queue: TradeQueue, producer: ProducerThread):
+    """Serialize the trades in the queue and hand them to the producer.
+
+    Args:
+    ----
+    queue: The queue the receivers put the trades in.
+    producer: The thread sending the messages to the Kafka topic.
+
+    """
+    serialize_trade = get_trade_serializer(settings.kafka.kafka_wire_format)
+    batch_size = settings.queue.produce_batch_size
+    try:
+        while (trades := await queue.get_batch(batch_size)) is not None:
+            # Send trades to redpanda
+            await producer.send(
+                [
+                    Message(
+                        trade.product_id,
+                        serialize_trade(trade),
+                        trade.exchange,
+                        trade.timestamp,
+                        received_at,
                     )
+                    for trade, received_at in trades
+                ]
+            )
+    finally:
+        await producer.stop()
+    logger.info("Trade queue closed, producer stopped.")
 
 
 if __name__ == "__main__":
     logger.info(f"{settings}")
     logger.info("Configuration parameters logged.")
-    asyncio.run(produce_trades())
+    if settings.live_or_historical_settings.live_or_historical == "replay":
+        asyncio.run(replay_trades())
+    else:
+        asyncio.run(produce_trades())
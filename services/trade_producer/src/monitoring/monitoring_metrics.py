@@ -1,4 +1,29 @@
-from prometheus_client import Counter, Summary, start_http_server
+from prometheus_client import (
+    Counter,
+    Gauge,
+    Histogram,
+    Summary,
+    start_http_server,
+)
+
+from monitoring.pipeline_metrics import PipelineMetrics
+
+# Buckets of the trade latency histograms, in seconds
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
 
 
 class MonitoringMetrics:
@@ -21,6 +46,72 @@ class MonitoringMetrics:
             ["exchange"],
         )
 
+        self.reconnections = Counter(
+            "websocket_reconnections",
+            "Total number of websocket reconnections",
+            ["exchange"],
+        )
+        self.backfilled_trades = Counter(
+            "backfilled_trades",
+            "Total number of trades missed while disconnected and backfilled",
+            ["exchange"],
+        )
+
+        self.queue_depth = Gauge(
+            "trade_queue_depth",
+            "Number of trades waiting to be produced to Kafka",
+        )
+        self.dropped_trades = Counter(
+            "dropped_trades",
+            "Total number of trades dropped because the trade queue was full",
+            ["exchange"],
+        )
+
+        self.receive_latency = Histogram(
+            "trade_receive_latency_seconds",
+            "Time from the exchange trade timestamp to receiving the trade",
+            ["exchange", "product_id"],
+            buckets=LATENCY_BUCKETS,
+        )
+        self.produce_latency = Histogram(
+            "trade_produce_latency_seconds",
+            "Time from receiving a trade to producing it to Kafka",
+            ["exchange", "product_id"],
+            buckets=LATENCY_BUCKETS,
+        )
+        self.delivery_latency = Histogram(
+            "trade_delivery_latency_seconds",
+            "Time from producing a trade to its Kafka delivery ack",
+            ["exchange", "product_id"],
+            buckets=LATENCY_BUCKETS,
+        )
+        self.delivered_trades = Counter(
+            "delivered_trades",
+            "Total number of trades delivered to Kafka",
+            ["exchange", "product_id"],
+        )
+        self.delivered_bytes = Counter(
+            "delivered_bytes",
+            "Total number of message bytes delivered to Kafka",
+            ["exchange", "product_id"],
+        )
+        self.failed_deliveries = Counter(
+            "failed_deliveries",
+            "Total number of trades that could not be delivered to Kafka",
+            ["exchange", "product_id"],
+        )
+
+        self.historical_coverage = Gauge(
+            "historical_cache_coverage_ratio",
+            "Part of the historical range already cached when it was started",
+            ["exchange", "product_id"],
+        )
+        self.historical_trades = Counter(
+            "historical_trades",
+            "Total number of historical trades read, by source",
+            ["exchange", "product_id", "source"],
+        )
+
         # Start the HTTP server to expose metrics
         start_http_server(port)
 
@@ -36,5 +127,75 @@ class MonitoringMetrics:
         """Increment the number of heartbeat responses."""
         self.heartbeat_responses.labels(exchange=exchange).inc()
 
+    def increment_reconnect_count(self, exchange: str):
+        """Count a websocket reconnection."""
+        self.reconnections.labels(exchange=exchange).inc()
+
+    def increment_backfilled_trades(self, exchange: str, count: int):
+        """Count the trades backfilled after a reconnection."""
+        self.backfilled_trades.labels(exchange=exchange).inc(count)
+
+    def set_historical_coverage(
+        self, exchange: str, product_id: str, ratio: float
+    ):
+        """Set the part of the historical range found in the cache."""
+        self.historical_coverage.labels(
+            exchange=exchange, product_id=product_id
+        ).set(ratio)
+
+    def increment_historical_trades(
+        self, exchange: str, product_id: str, source: str, count: int
+    ):
+        """Count the historical trades read from the cache or the api."""
+        self.historical_trades.labels(
+            exchange=exchange, product_id=product_id, source=source
+        ).inc(count)
+
+    def set_queue_depth(self, depth: int):
+        """Set the number of trades waiting to be produced."""
+        self.queue_depth.set(depth)
+
+    def increment_dropped_trades(self, exchange: str, count: int):
+        """Count the trades dropped because the trade queue was full."""
+        self.dropped_trades.labels(exchange=exchange).inc(count)
+
+    def observe_receive_latency(
+        self, exchange: str, product_id: str, latency: float
+    ):
+        """Observe the time from the trade timestamp to receiving it."""
+        self.receive_latency.labels(
+            exchange=exchange, product_id=product_id
+        ).observe(latency)
+
+    def observe_produce_latency(
+        self, exchange: str, product_id: str, latency: float
+    ):
+        """Observe the time from receiving a trade to producing it."""
+        self.produce_latency.labels(
+            exchange=exchange, product_id=product_id
+        ).observe(latency)
+
+    def observe_delivery(
+        self, exchange: str, product_id: str, latency: float, size: int
+    ):
+        """Observe a trade delivered to Kafka and its delivery latency."""
+        self.delivery_latency.labels(
+            exchange=exchange, product_id=product_id
+        ).observe(latency)
+        self.delivered_trades.labels(
+            exchange=exchange, product_id=product_id
+        ).inc()
+        self.delivered_bytes.labels(
+            exchange=exchange, product_id=product_id
+        ).inc(size)
+
+    def increment_failed_deliveries(self, exchange: str, product_id: str):
+        """Count a trade that could not be delivered to Kafka."""
+        self.failed_deliveries.labels(
+            exchange=exchange, product_id=product_id
+        ).inc()
+
 
 monitoring = MonitoringMetrics(port=8000)
+# Exposed by the HTTP server started by `monitoring`
+pipeline_monitoring = PipelineMetrics(service="trade_producer")
@@ -2,6 +2,10 @@ from typing import Optional
 
 from pydantic import field_validator
 
+from utils.json_decoder import JSON_BACKENDS
+from utils.trade_queue import BACKPRESSURE_POLICIES
+from utils.wire_format import WIRE_FORMATS
+
 from pydantic_settings import (  # isort:skip
     BaseSettings,
     PydanticBaseSettingsSource,
@@ -38,6 +42,105 @@ class KafkaSettings(BaseSettings):
 
     kafka_broker_address: str | None = None
     kafka_topic: str
+    # Format of the trades written to Kafka: "json" or "binary"
+    kafka_wire_format: str = "json"
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_path=None,
+        env_nested_delimiter="__",
+        extra="ignore",
+    )
+
+    @field_validator("kafka_wire_format")
+    def validate_wire_format(cls, value):
+        """Validate the wire format of the messages."""
+        if value not in WIRE_FORMATS:
+            raise ValueError(
+                f"Unsupported wire format: {value}. Supported wire formats"
+                f" are: {WIRE_FORMATS}"
+            )
+        return value
+
+
+class WebsocketSettings(BaseSettings):
+    """Websocket settings."""
+
+    # JSON library decoding the websocket messages: "auto" uses the fastest
+    # installed one
+    json_backend: str = "auto"
+    # Seconds without any message (trade or heartbeat) after which the
+    # connection is considered stale and reopened
+    heartbeat_timeout: float = 30
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_path=None,
+        env_nested_delimiter="__",
+        extra="ignore",
+    )
+
+    @field_validator("json_backend")
+    def validate_json_backend(cls, value):
+        """Validate the JSON backend."""
+        if value not in JSON_BACKENDS:
+            raise ValueError(
+                f"Unsupported JSON backend: {value}. Supported JSON backends"
+                f" are: {JSON_BACKENDS}"
+            )
+        return value
+
+
+class QueueSettings(BaseSettings):
+    """Settings of the queue between the websockets and the producer."""
+
+    # Max number of trades waiting to be produced
+    trade_queue_size: int = 10_000
+    # What to do when the queue is full: "block" or "drop-oldest"
+    backpressure_policy: str = "block"
+    # Max number of trades produced per batch
+    produce_batch_size: int = 500
+    # Max number of batches waiting for the Kafka producer thread
+    producer_max_pending_batches: int = 100
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_path=None,
+        env_nested_delimiter="__",
+        extra="ignore",
+    )
+
+    @field_validator("backpressure_policy")
+    def validate_backpressure_policy(cls, value):
+        """Validate the backpressure policy."""
+        if value not in BACKPRESSURE_POLICIES:
+            raise ValueError(
+                f"Unsupported backpressure policy: {value}. Supported"
+                f" policies are: {BACKPRESSURE_POLICIES}"
+            )
+        return value
+
+    @field_validator(
+        "trade_queue_size", "produce_batch_size", "producer_max_pending_batches"
+    )
+    def validate_positive(cls, value):
+        """Validate that the queue sizes are positive."""
+        if value <= 0:
+            raise ValueError(f"Queue sizes must be > 0, got {value}.")
+        return value
+
+
+class RateLimitSettings(BaseSettings):
+    """Settings of the rate limiter shared by the REST clients."""
+
+    # Kraken call counter: every request adds 1, and the counter decays by
+    # `kraken_decay_per_sec` every second. Requests wait while the counter
+    # would exceed `kraken_max_counter`.
+    kraken_max_counter: float = 5
+    kraken_decay_per_sec: float = 1
+    # File sharing the counter across processes. The counter is only shared
+    # within the process if None.
+    lock_file: Optional[str] = None
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -46,6 +149,13 @@ class KafkaSettings(BaseSettings):
         extra="ignore",
     )
 
+    @field_validator("kraken_max_counter", "kraken_decay_per_sec")
+    def validate_positive(cls, value):
+        """Validate that the call counter settings are positive."""
+        if value <= 0:
+            raise ValueError(f"Rate limit settings must be > 0, got {value}.")
+        return value
+
 
 class Exchange(BaseSettings):
     """Exchange settings."""
@@ -72,6 +182,14 @@ class LiveHistoricalSettings(BaseSettings):
     live_or_historical: str
     last_n_days: Optional[int] = None
     cache_dir_historical_data: Optional[str] = None
+    # Number of time shards the range of each product is split into and
+    # downloaded concurrently. 1 downloads the range sequentially.
+    download_shards: int = 1
+    # Max number of shards of a product downloaded at once
+    max_concurrent_shards: int = 4
+    # Speed of the replay of the cached trades, as a multiple of real time.
+    # 0 replays them as fast as Kafka takes them.
+    replay_speed: float = 0
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -83,18 +201,35 @@ class LiveHistoricalSettings(BaseSettings):
     @field_validator("live_or_historical")
     def validate_live_or_historical(cls, value):
         """Validate live_or_historical."""
-        if value not in ["live", "historical"]:
+        if value not in ["live", "historical", "replay"]:
             raise ValueError(
                 f"Unsupported value: {value}. Supported values"
-                f"are: live, historical"
+                f"are: live, historical, replay"
             )
         return value
 
+    @field_validator("download_shards", "max_concurrent_shards")
+    def validate_shards(cls, value):
+        """Validate that the shard settings are positive."""
+        if value <= 0:
+            raise ValueError(f"Shard settings must be > 0, got {value}.")
+        return value
+
+    @field_validator("replay_speed")
+    def validate_replay_speed(cls, value):
+        """Validate that the replay speed is not negative."""
+        if value < 0:
+            raise ValueError(f"Replay speed must be >= 0, got {value}.")
+        return value
+
 
 class Settings(BaseSettings):
     """Settings."""
 
     kafka: KafkaSettings = KafkaSettings()
+    websocket: WebsocketSettings = WebsocketSettings()
+    queue: QueueSettings = QueueSettings()
+    rate_limit: RateLimitSettings = RateLimitSettings()
     exchanges: list[Exchange]
     live_or_historical_settings: LiveHistoricalSettings = (
         LiveHistoricalSettings()
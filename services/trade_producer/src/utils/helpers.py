@@ -4,6 +4,7 @@ from api.coinbase.websocket import CoinBaseWebsocketTradeAPI
 from api.kraken.rest import KrakenRestAPI
 from api.kraken.websocket import KrakenWebsocketTradeAPI
 from settings.config import HighVolumeCoinPairs, SupportedExchanges, settings
+from utils.rate_limiter import CallCounterRateLimiter
 
 
 def instanteate_apis() -> (
@@ -21,9 +22,18 @@ def instanteate_apis() -> (
         else:
             raise ValueError("Exchange not supported.")
 
+    # Shared by every Kraken REST client of the process
+    kraken_rate_limiter = CallCounterRateLimiter(
+        settings.rate_limit.kraken_max_counter,
+        settings.rate_limit.kraken_decay_per_sec,
+        settings.rate_limit.lock_file,
+    )
+
     if settings.live_or_historical_settings.live_or_historical == "live":
         kraken_apis = (
-            create_kraken_websocket_api(kraken_product_ids, kraken_channel)
+            create_kraken_websocket_api(
+                kraken_product_ids, kraken_channel, kraken_rate_limiter
+            )
             if kraken_product_ids
             else []
         )
@@ -41,13 +51,18 @@ def instanteate_apis() -> (
             kraken_product_ids,
             settings.live_or_historical_settings.last_n_days,
             settings.live_or_historical_settings.cache_dir_historical_data,
+            settings.live_or_historical_settings.download_shards,
+            settings.live_or_historical_settings.max_concurrent_shards,
+            kraken_rate_limiter,
         )
         coinbase_apis = []
     return kraken_apis, coinbase_apis
 
 
 def create_kraken_websocket_api(
-    product_ids: list[str], channels: list[str]
+    product_ids: list[str],
+    channels: list[str],
+    rate_limiter: CallCounterRateLimiter | None = None,
 ) -> KrakenWebsocketTradeAPI:
     """Create a KrakenWebsocketTradeAPI instance for the given product_id.
 
@@ -58,6 +73,7 @@ def create_kraken_websocket_api(
     ----
     product_ids: The product ID to subscribe to.
     channels: The list of channels to subscribe to.
+    rate_limiter: Rate limiter of the Kraken REST requests backfilling gaps.
 
     """
     kraken_apis = []
@@ -69,7 +85,11 @@ def create_kraken_websocket_api(
         ):
             kraken_apis.append(
                 KrakenWebsocketTradeAPI(
-                    product_ids=[product_id], channels=channels
+                    product_ids=[product_id],
+                    channels=channels,
+                    json_backend=settings.websocket.json_backend,
+                    heartbeat_timeout=settings.websocket.heartbeat_timeout,
+                    rate_limiter=rate_limiter,
                 )
             )
         else:
@@ -79,6 +99,9 @@ def create_kraken_websocket_api(
             KrakenWebsocketTradeAPI(
                 product_ids=low_volume_coins,
                 channels=channels,
+                json_backend=settings.websocket.json_backend,
+                heartbeat_timeout=settings.websocket.heartbeat_timeout,
+                rate_limiter=rate_limiter,
             )
         )
     return kraken_apis
@@ -107,7 +130,10 @@ def create_coinbase_websocket_api(
         ):
             coinbase_apis.append(
                 CoinBaseWebsocketTradeAPI(
-                    product_ids=[product_id], channels=channels
+                    product_ids=[product_id],
+                    channels=channels,
+                    json_backend=settings.websocket.json_backend,
+                    heartbeat_timeout=settings.websocket.heartbeat_timeout,
                 )
             )
         else:
@@ -117,13 +143,20 @@ def create_coinbase_websocket_api(
             CoinBaseWebsocketTradeAPI(
                 product_ids=low_volume_coins,
                 channels=channels,
+                json_backend=settings.websocket.json_backend,
+                heartbeat_timeout=settings.websocket.heartbeat_timeout,
             )
         )
     return coinbase_apis
 
 
 def create_kraken_rest_api(
-    product_ids: list[str], last_n_days: int, cache_dir: str | None = None
+    product_ids: list[str],
+    last_n_days: int,
+    cache_dir: str | None = None,
+    n_shards: int = 1,
+    max_concurrent_shards: int = 4,
+    rate_limiter: CallCounterRateLimiter | None = None,
 ) -> KrakenRestAPI:
     """Create a KrakenRestAPI instance for the given product_id.
 
@@ -132,10 +165,20 @@ def create_kraken_rest_api(
     product_ids: The product ID to subscribe to.
     last_n_days: The number of days from which we want to get trades.
     cache_dir: The directory to store the cached trade data.
+    n_shards: Number of time shards downloaded concurrently per product.
+    max_concurrent_shards: Max number of shards downloaded at once.
+    rate_limiter: Rate limiter shared by the Kraken REST clients.
 
     """
     kraken_rest_apis = []
     for product_id in product_ids:
-        kraken_api_instance = KrakenRestAPI(product_id, last_n_days, cache_dir)
+        kraken_api_instance = KrakenRestAPI(
+            product_id,
+            last_n_days,
+            cache_dir,
+            n_shards=n_shards,
+            max_concurrent_shards=max_concurrent_shards,
+            rate_limiter=rate_limiter,
+        )
         kraken_rest_apis.append(kraken_api_instance)
     return kraken_rest_apis
@@ -0,0 +1,60 @@
+import json
+from collections.abc import Callable
+from typing import Any
+
+from utils.logging_config import logger
+
+AUTO = "auto"
+JSON_BACKENDS = (AUTO, "msgspec", "orjson", "json")
+
+
+def _msgspec_loads() -> Callable[[str | bytes], Any]:
+    import msgspec
+
+    return msgspec.json.Decoder().decode
+
+
+def _orjson_loads() -> Callable[[str | bytes], Any]:
+    import orjson
+
+    return orjson.loads
+
+
+def _json_loads() -> Callable[[str | bytes], Any]:
+    return json.loads
+
+
+LOADERS = {
+    "msgspec": _msgspec_loads,
+    "orjson": _orjson_loads,
+    "json": _json_loads,
+}
+
+
+def get_json_loads(backend: str = AUTO) -> Callable[[str | bytes], Any]:
+    """Return the function decoding the websocket frames.
+
+    With "auto", the fastest installed backend is used: msgspec, then orjson,
+    then the standard library json module.
+
+    Args:
+    ----
+    backend (str): One of `JSON_BACKENDS`.
+
+    """
+    if backend not in JSON_BACKENDS:
+        raise ValueError(
+            f"Unsupported JSON backend: {backend}. Supported JSON backends"
+            f" are: {JSON_BACKENDS}"
+        )
+    if backend != AUTO:
+        return LOADERS[backend]()
+
+    for name, loader in LOADERS.items():
+        try:
+            loads = loader()
+        except ImportError:
+            continue
+        logger.info(f"Decoding websocket messages with {name}.")
+        return loads
+    raise RuntimeError("No JSON backend available.")
@@ -0,0 +1,152 @@
+import asyncio
+import queue
+import threading
+import time
+from functools import partial
+from typing import NamedTuple
+
+from quixstreams.kafka import Producer
+
+from monitoring.monitoring_metrics import monitoring, pipeline_monitoring
+from utils.logging_config import logger
+
+
+class Message(NamedTuple):
+    """A serialized trade ready to be produced."""
+
+    # The product id of the trade
+    key: str
+    value: bytes
+    exchange: str
+    # Unix milliseconds of the trade
+    timestamp: int
+    # Seconds since the epoch
+    received_at: float
+
+
+class ProducerThread(threading.Thread):
+    """Background thread owning the single Kafka producer of the process.
+
+    The coroutines hand batches of serialized messages to the thread, which
+    produces them and polls the producer for delivery callbacks, so the
+    blocking producer calls never run on the event loop. The latency of
+    every trade is recorded when it is produced and when Kafka acks it.
+    """
+
+    def __init__(
+        self,
+        producer: Producer,
+        topic_name: str,
+        max_pending_batches: int,
+        poll_interval: float = 0.1,
+    ) -> None:
+        """Initialize the producer thread.
+
+        Args:
+        ----
+        producer: The Kafka producer, only used from this thread.
+        topic_name: The Kafka topic the messages are sent to.
+        max_pending_batches: Max number of batches waiting to be produced.
+        poll_interval: Seconds to wait for a batch before polling the
+            producer for delivery callbacks.
+
+        """
+        super().__init__(name="kafka-producer", daemon=True)
+        self.producer = producer
+        self.topic_name = topic_name
+        self.poll_interval = poll_interval
+        self._batches: queue.Queue[list[Message] | None] = queue.Queue(
+            max_pending_batches
+        )
+        self._error: BaseException | None = None
+
+    async def send(self, messages: list[Message]) -> None:
+        """Hand a batch of messages to the thread.
+
+        Waits in a worker thread when too many batches are pending, so the
+        event loop keeps running.
+        """
+        self._raise_if_failed()
+        try:
+            self._batches.put_nowait(messages)
+        except queue.Full:
+            await asyncio.to_thread(self._put, messages)
+        self._raise_if_failed()
+
+    async def stop(self) -> None:
+        """Produce the pending batches, flush the producer and stop."""
+        await asyncio.to_thread(self._put, None)
+        await asyncio.to_thread(self.join)
+        self._raise_if_failed()
+
+    def _put(self, messages: list[Message] | None) -> None:
+        """Wait for room in the queue, unless the thread stopped."""
+        while self.is_alive():
+            try:
+                self._batches.put(messages, timeout=self.poll_interval)
+                return
+            except queue.Full:
+                continue
+
+    def run(self) -> None:
+        """Produce the batches until `stop` is called."""
+        try:
+            with self.producer:
+                self._produce_batches()
+        except BaseException as e:
+            logger.error(f"Kafka producer thread failed: {e}")
+            self._error = e
+
+    def _produce_batches(self) -> None:
+        """Produce the batches and serve the delivery callbacks."""
+        while True:
+            try:
+                messages = self._batches.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self.producer.poll(0)
+                continue
+            if messages is None:
+                return
+            produced_at = time.time()
+            for key, value, exchange, timestamp, received_at in messages:
+                monitoring.observe_produce_latency(
+                    exchange, key, produced_at - received_at
+                )
+                self.producer.produce(
+                    self.topic_name,
+                    value=value,
+                    key=key,
+                    on_delivery=partial(
+                        self._on_delivery, exchange, key, timestamp, produced_at
+                    ),
+                )
+            self.producer.poll(0)
+
+    @staticmethod
+    def _on_delivery(
+        exchange: str,
+        product_id: str,
+        timestamp: int,
+        produced_at: float,
+        error,
+        message,
+    ) -> None:
+        """Record the delivery latency of a message, or its failure."""
+        if error is not None:
+            logger.error(f"Failed to deliver message to Kafka: {error}")
+            monitoring.increment_failed_deliveries(exchange, product_id)
+            return
+        monitoring.observe_delivery(
+            exchange,
+            product_id,
+            time.time() - produced_at,
+            len(message.value()),
+        )
+        pipeline_monitoring.observe_since(
+            "trade_to_kafka", product_id, timestamp
+        )
+
+    def _raise_if_failed(self) -> None:
+        """Re-raise the error that stopped the thread, if any."""
+        if self._error is not None:
+            raise RuntimeError("Kafka producer thread failed") from self._error
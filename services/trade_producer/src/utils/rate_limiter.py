@@ -0,0 +1,107 @@
+import asyncio
+import fcntl
+import time
+from pathlib import Path
+
+from utils.logging_config import logger
+
+
+class CallCounterRateLimiter:
+    """Rate limiter modeled on Kraken's API call counter.
+
+    Every request adds its cost to a counter that decays at a constant rate,
+    and a request is only sent if it does not push the counter above its max.
+    Requests wait for the counter to decay instead of being rejected by the
+    exchange, so the clients run at the max permitted rate without ever
+    hitting the limit.
+
+    A single instance is shared by all the REST clients of the process. With
+    a lock file, the counter is kept in the file and locked while it is
+    updated, so it is shared by all the processes using the same file.
+    """
+
+    def __init__(
+        self,
+        max_counter: float,
+        decay_per_sec: float,
+        lock_file: str | None = None,
+    ) -> None:
+        """Initialize the rate limiter.
+
+        Args:
+        ----
+        max_counter: Max value of the call counter.
+        decay_per_sec: How much the counter decreases every second.
+        lock_file: File sharing the counter across processes.
+
+        """
+        if max_counter <= 0 or decay_per_sec <= 0:
+            raise ValueError(
+                "The max counter and its decay must be > 0, got"
+                f" max_counter={max_counter}, decay_per_sec={decay_per_sec}."
+            )
+        self.max_counter = max_counter
+        self.decay_per_sec = decay_per_sec
+        self.lock_file = Path(lock_file) if lock_file else None
+        self._counter = 0.0
+        self._updated_at = time.time()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, cost: float = 1) -> None:
+        """Wait until a request of the given cost can be sent.
+
+        Waiting requests are served in order.
+        """
+        async with self._lock:
+            while (wait := self._reserve(cost)) > 0:
+                logger.debug(f"Rate limited, waiting {wait:.2f} seconds.")
+                await asyncio.sleep(wait)
+
+    def _reserve(self, cost: float) -> float:
+        """Add the cost to the counter if there is room for it.
+
+        Returns
+        -------
+        float: 0 if the cost was added, otherwise the seconds to wait.
+
+        """
+        if self.lock_file is None:
+            self._counter, self._updated_at, wait = self._decay_and_add(
+                self._counter, self._updated_at, cost
+            )
+            return wait
+
+        with open(self.lock_file, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            content = f.read().split()
+            counter, updated_at = (
+                (float(content[0]), float(content[1]))
+                if len(content) == 2
+                else (0.0, time.time())
+            )
+            counter, updated_at, wait = self._decay_and_add(
+                counter, updated_at, cost
+            )
+            f.seek(0)
+            f.truncate()
+            f.write(f"{counter} {updated_at}")
+        return wait
+
+    def _decay_and_add(
+        self, counter: float, updated_at: float, cost: float
+    ) -> tuple[float, float, float]:
+        """Decay the counter to now and add the cost if there is room.
+
+        Returns
+        -------
+        tuple[float, float, float]: The new counter, the time it was updated
+            at, and the seconds to wait (0 if the cost was added).
+
+        """
+        now = time.time()
+        counter = max(0.0, counter - (now - updated_at) * self.decay_per_sec)
+        excess = counter + cost - self.max_counter
+        if excess > 0:
+            return counter, now, excess / self.decay_per_sec
+        return counter + cost, now, 0.0
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MILLISECOND = timedelta(milliseconds=1)
+
+
+def ts_to_date(ts: int) -> str:
+    """Transform a timestamp in Unix milliseconds to a human-readable date.
+
+    Args:
+    ----
+    ts (int): A timestamp in Unix milliseconds
+
+    """
+    return (EPOCH + ts * ONE_MILLISECOND).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def date_to_ts(date: str) -> int:
+    """Transform a human-readable date to Unix milliseconds.
+
+    Args:
+    ----
+    date (str): A human-readable date
+
+    """
+    dt = datetime.fromisoformat(date)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // ONE_MILLISECOND
@@ -0,0 +1,302 @@
+import json
+import os
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from itertools import starmap
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from api.trade import Trade
+from utils.logging_config import logger
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+TRADE_SCHEMA = pa.schema(
+    [
+        ("product_id", pa.string()),
+        ("side", pa.string()),
+        ("price", pa.float64()),
+        ("volume", pa.float64()),
+        # Unix milliseconds
+        ("timestamp", pa.int64()),
+        ("exchange", pa.string()),
+        ("trade_id", pa.int64()),
+    ]
+)
+DATE_PARTITIONING = ds.partitioning(
+    pa.schema([("date", pa.string())]), flavor="hive"
+)
+COVERAGE_FILE = "_coverage.json"
+
+
+def ms_to_day(ts: int) -> str:
+    """Return the UTC day of a Unix milliseconds timestamp."""
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime(
+        "%Y-%m-%d"
+    )
+
+
+def drop_duplicate_trades(table: pa.Table) -> pa.Table:
+    """Keep the first of the identical rows of a table of trades, in order.
+
+    Trades carry the id of the exchange, so distinct trades are never equal.
+    """
+    rows = pa.array(np.arange(len(table)))
+    first_rows = (
+        table.append_column("row", rows)
+        .group_by(table.column_names, use_threads=False)
+        .aggregate([("row", "min")])["row_min"]
+    )
+    if len(first_rows) == len(table):
+        return table
+    return table.take(np.sort(first_rows.to_numpy()))
+
+
+class TradeCache:
+    """Columnar cache of historical trades.
+
+    Trades are stored per exchange and product as parquet files partitioned
+    by UTC day (`<exchange>/<product>/date=<YYYY-MM-DD>/*.parquet`). Every
+    write records the time range `[from_ms, to_ms)` it covers in a coverage
+    index, even if it holds no trades, so any range already downloaded is
+    served from the cache whatever the request it was downloaded for.
+
+    Writes add small page files, which `compact` merges into one file per
+    day.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        """Initialize the cache.
+
+        Args:
+        ----
+        cache_dir: The directory to store the cached trade data.
+
+        """
+        self.cache_dir = Path(cache_dir)
+        if not self.cache_dir.exists():
+            self.cache_dir.mkdir(parents=True)
+        self._coverage: dict[Path, list[list[int]]] = {}
+
+    def _product_dir(self, exchange: str, product_id: str) -> Path:
+        """Return the directory of the trades of a product."""
+        return self.cache_dir / exchange / product_id.replace("/", "-")
+
+    def coverage(self, exchange: str, product_id: str) -> list[list[int]]:
+        """Return the sorted, disjoint `[from_ms, to_ms)` ranges cached."""
+        product_dir = self._product_dir(exchange, product_id)
+        if product_dir not in self._coverage:
+            coverage_file = product_dir / COVERAGE_FILE
+            self._coverage[product_dir] = (
+                json.loads(coverage_file.read_text())
+                if coverage_file.exists()
+                else []
+            )
+        return self._coverage[product_dir]
+
+    def covered_until(
+        self, exchange: str, product_id: str, from_ms: int
+    ) -> int | None:
+        """Return the end of the cached range starting at `from_ms`.
+
+        Returns None if the trades at `from_ms` are not cached.
+        """
+        for start, end in self.coverage(exchange, product_id):
+            if start <= from_ms < end:
+                return end
+        return None
+
+    def missing_ranges(
+        self, exchange: str, product_id: str, from_ms: int, to_ms: int
+    ) -> list[tuple[int, int]]:
+        """Return the sorted `[from_ms, to_ms)` ranges not cached yet."""
+        missing = []
+        start = from_ms
+        for covered_from, covered_to in self.coverage(exchange, product_id):
+            if covered_to <= start:
+                continue
+            if covered_from >= to_ms:
+                break
+            if covered_from > start:
+                missing.append((start, covered_from))
+            start = covered_to
+        if start < to_ms:
+            missing.append((start, to_ms))
+        return missing
+
+    def _add_coverage(
+        self, exchange: str, product_id: str, from_ms: int, to_ms: int
+    ) -> None:
+        """Add a range to the coverage index, merging adjacent ranges."""
+        ranges: list[list[int]] = []
+        for start, end in sorted(
+            [*self.coverage(exchange, product_id), [from_ms, to_ms]]
+        ):
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([start, end])
+
+        product_dir = self._product_dir(exchange, product_id)
+        product_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = product_dir / f"{COVERAGE_FILE}.tmp"
+        tmp_file.write_text(json.dumps(ranges))
+        os.replace(tmp_file, product_dir / COVERAGE_FILE)
+        self._coverage[product_dir] = ranges
+
+    def write(
+        self,
+        exchange: str,
+        product_id: str,
+        trades: list[Trade],
+        from_ms: int,
+        to_ms: int,
+    ) -> None:
+        """Write all the trades of `[from_ms, to_ms)` to the cache.
+
+        Args:
+        ----
+        exchange: The exchange of the trades.
+        product_id: The product of the trades.
+        trades: Every trade of the range, in timestamp order.
+        from_ms: Start of the range, in Unix milliseconds.
+        to_ms: End of the range (excluded), in Unix milliseconds.
+
+        """
+        if to_ms <= from_ms:
+            return
+        if trades:
+            table = pa.Table.from_arrays(
+                [pa.array(column) for column in zip(*trades, strict=True)],
+                schema=TRADE_SCHEMA,
+            )
+            days = table["timestamp"].to_numpy() // DAY_MS
+            # Trades are sorted, so each day is a contiguous slice
+            day_values, day_starts = np.unique(days, return_index=True)
+            day_ends = [*day_starts[1:], len(days)]
+            product_dir = self._product_dir(exchange, product_id)
+            for day, start, end in zip(
+                day_values, day_starts, day_ends, strict=True
+            ):
+                day_dir = product_dir / f"date={ms_to_day(day * DAY_MS)}"
+                day_dir.mkdir(parents=True, exist_ok=True)
+                page_from = max(from_ms, day * DAY_MS)
+                page_to = min(to_ms, (day + 1) * DAY_MS)
+                pq.write_table(
+                    table.slice(start, end - start),
+                    day_dir / f"page-{page_from}-{page_to}.parquet",
+                )
+        self._add_coverage(exchange, product_id, from_ms, to_ms)
+
+    def read_table(
+        self,
+        exchange: str,
+        product_id: str,
+        from_ms: int,
+        to_ms: int,
+        columns: list[str] | None = None,
+    ) -> pa.Table:
+        """Read the cached trades of `[from_ms, to_ms)` as an Arrow table.
+
+        Only the day partitions of the range are read, and the columns are
+        returned as Arrow buffers without converting them to Python objects.
+        """
+        product_dir = self._product_dir(exchange, product_id)
+        if not product_dir.exists():
+            return TRADE_SCHEMA.empty_table().select(
+                columns or TRADE_SCHEMA.names
+            )
+        dataset = ds.dataset(
+            product_dir,
+            schema=TRADE_SCHEMA.append(pa.field("date", pa.string())),
+            format="parquet",
+            partitioning=DATE_PARTITIONING,
+        )
+        table = dataset.to_table(
+            columns=columns or TRADE_SCHEMA.names,
+            filter=(
+                (ds.field("date") >= ms_to_day(from_ms))
+                & (ds.field("date") <= ms_to_day(to_ms - 1))
+                & (ds.field("timestamp") >= from_ms)
+                & (ds.field("timestamp") < to_ms)
+            ),
+        )
+        # Files are not read in order within a day
+        if columns is None or "timestamp" in columns:
+            table = table.sort_by("timestamp")
+        return table
+
+    def iter_batches(
+        self,
+        exchange: str,
+        product_id: str,
+        from_ms: int,
+        to_ms: int,
+        batch_size: int,
+    ) -> Iterator[pa.RecordBatch]:
+        """Stream the cached trades of `[from_ms, to_ms)` in record batches.
+
+        The range is read one day at a time, so only a day of trades is held
+        in memory, and the batches are yielded in timestamp order.
+        """
+        day_start = from_ms - from_ms % DAY_MS
+        while day_start < to_ms:
+            table = self.read_table(
+                exchange,
+                product_id,
+                max(from_ms, day_start),
+                min(to_ms, day_start + DAY_MS),
+            )
+            yield from table.to_batches(max_chunksize=batch_size)
+            day_start += DAY_MS
+
+    def read(
+        self, exchange: str, product_id: str, from_ms: int, to_ms: int
+    ) -> list[Trade]:
+        """Read the cached trades of `[from_ms, to_ms)`."""
+        table = self.read_table(exchange, product_id, from_ms, to_ms)
+        columns = [table[name].to_pylist() for name in Trade._fields]
+        return list(starmap(Trade, zip(*columns, strict=True)))
+
+    def compact(self, exchange: str, product_id: str) -> int:
+        """Merge the page files of every day into a single file.
+
+        Trades cached twice, by pages written over the same range, are only
+        kept once.
+
+        Returns
+        -------
+        int: The number of page files merged.
+
+        """
+        product_dir = self._product_dir(exchange, product_id)
+        n_merged = 0
+        for day_dir in sorted(product_dir.glob("date=*")):
+            files = sorted(day_dir.glob("*.parquet"))
+            if len(files) <= 1:
+                continue
+            table = drop_duplicate_trades(
+                pa.concat_tables(
+                    pq.read_table(file, schema=TRADE_SCHEMA) for file in files
+                )
+            ).sort_by("timestamp")
+            timestamps = table["timestamp"]
+            compacted = (
+                day_dir / f"day-{timestamps[0]}-{timestamps[-1]}.parquet"
+            )
+            tmp_file = day_dir / "_compacting.parquet"
+            pq.write_table(table, tmp_file)
+            os.replace(tmp_file, compacted)
+            for file in files:
+                if file != compacted:
+                    file.unlink()
+            n_merged += len(files)
+        if n_merged:
+            logger.info(
+                f"Compacted {n_merged} cache files of {exchange} {product_id}"
+            )
+        return n_merged
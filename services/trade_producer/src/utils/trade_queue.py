@@ -0,0 +1,100 @@
+import asyncio
+
+from api.trade import Trade
+from monitoring.monitoring_metrics import monitoring
+
+BLOCK = "block"
+DROP_OLDEST = "drop-oldest"
+BACKPRESSURE_POLICIES = (BLOCK, DROP_OLDEST)
+
+# A trade and the time it was received at, in seconds since the epoch
+ReceivedTrade = tuple[Trade, float]
+
+
+class TradeQueue:
+    """Bounded queue of trades between the websocket receivers and producer.
+
+    When the queue is full, the backpressure policy decides what happens:
+    with "block" the receivers wait until the producer catches up, and with
+    "drop-oldest" the oldest trades are dropped to make room for the new
+    ones, so the receivers never stop reading from the websockets.
+    """
+
+    def __init__(self, maxsize: int, backpressure_policy: str = BLOCK) -> None:
+        """Initialize the queue.
+
+        Args:
+        ----
+        maxsize: Max number of trades in the queue.
+        backpressure_policy: What to do when the queue is full, one of
+            `BACKPRESSURE_POLICIES`.
+
+        """
+        if backpressure_policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(
+                f"Unsupported backpressure policy: {backpressure_policy}."
+                f" Supported policies are: {BACKPRESSURE_POLICIES}"
+            )
+        self.backpressure_policy = backpressure_policy
+        self._queue: asyncio.Queue[ReceivedTrade | None] = asyncio.Queue(
+            maxsize
+        )
+        self._closed = False
+
+    def qsize(self) -> int:
+        """Return the number of trades in the queue."""
+        return self._queue.qsize()
+
+    async def put(
+        self, trades: list[Trade], exchange: str, received_at: float
+    ) -> None:
+        """Add the trades received from an exchange to the queue.
+
+        Args:
+        ----
+        trades: The trades received from the exchange.
+        exchange: The name of the exchange.
+        received_at: The time the trades were received at.
+
+        """
+        if self.backpressure_policy == BLOCK:
+            for trade in trades:
+                await self._queue.put((trade, received_at))
+        else:
+            dropped = 0
+            for trade in trades:
+                if self._queue.full():
+                    self._queue.get_nowait()
+                    dropped += 1
+                self._queue.put_nowait((trade, received_at))
+            if dropped:
+                monitoring.increment_dropped_trades(exchange, dropped)
+        monitoring.set_queue_depth(self._queue.qsize())
+
+    async def get_batch(self, max_trades: int) -> list[ReceivedTrade] | None:
+        """Wait for trades and return up to `max_trades` of them.
+
+        Every trade comes with the time it was received at.
+
+        Returns None once the queue is closed and all its trades were
+        returned.
+        """
+        if self._closed:
+            return None
+        trade = await self._queue.get()
+        trades = []
+        while trade is not None:
+            trades.append(trade)
+            if len(trades) >= max_trades or self._queue.empty():
+                break
+            trade = self._queue.get_nowait()
+        else:
+            self._closed = True
+            if not trades:
+                return None
+        monitoring.set_queue_depth(self._queue.qsize())
+        return trades
+
+    async def close(self) -> None:
+        """Signal the producer that no more trades will be added."""
+        await self._queue.put(None)
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+from api.trade import serialize_trade_columns
+from utils.logging_config import logger
+from utils.producer_thread import Message, ProducerThread
+from utils.trade_cache import TradeCache
+
+
+async def replay_cached_trades(
+    cache: TradeCache,
+    exchange: str,
+    product_id: str,
+    from_ms: int,
+    to_ms: int,
+    producer: ProducerThread,
+    wire_format: str,
+    batch_size: int,
+    speed: float = 0,
+) -> int:
+    """Replay the cached trades of a product to Kafka.
+
+    The trades are streamed from the cache in record batches and serialized
+    straight from their columns, so no `Trade` is created. With a speed of 0
+    the batches are sent as fast as the producer takes them, otherwise they
+    are sent at `speed` times the pace they were traded at, `from_ms` being
+    replayed when the replay starts.
+
+    Args:
+    ----
+    cache: The cache of the historical trades.
+    exchange: The exchange of the trades.
+    product_id: The product of the trades.
+    from_ms: Start of the range replayed, in Unix milliseconds.
+    to_ms: End of the range replayed (excluded), in Unix milliseconds.
+    producer: The thread sending the messages to the Kafka topic.
+    wire_format: Format of the trades, "json" or "binary".
+    batch_size: Max number of trades sent at once.
+    speed: Speed of the replay, as a multiple of real time.
+
+    Returns:
+    -------
+    int: The number of trades replayed.
+
+    """
+    missing = to_ms - from_ms - sum(
+        min(end, to_ms) - max(start, from_ms)
+        for start, end in cache.coverage(exchange, product_id)
+        if start < to_ms and end > from_ms
+    )
+    if missing > 0:
+        logger.warning(
+            f"{missing / 1000:.0f} seconds of the {exchange} {product_id}"
+            " trades to replay are not cached, they are skipped."
+        )
+
+    started_at = time.time()
+    n_trades = 0
+    for batch in cache.iter_batches(
+        exchange, product_id, from_ms, to_ms, batch_size
+    ):
+        timestamps = batch["timestamp"].to_pylist()
+        if speed:
+            replay_at = started_at + (timestamps[0] - from_ms) / 1000 / speed
+            await asyncio.sleep(max(0, replay_at - time.time()))
+
+        received_at = time.time()
+        values = serialize_trade_columns(batch, wire_format)
+        await producer.send(
+            [
+                Message(product_id, value, exchange, timestamp, received_at)
+                for value, timestamp in zip(values, timestamps, strict=True)
+            ]
+        )
+        n_trades += len(values)
+
+    logger.info(
+        f"Replayed {n_trades} {exchange} {product_id} trades in"
+        f" {time.time() - started_at:.1f} seconds."
+    )
+    return n_trades
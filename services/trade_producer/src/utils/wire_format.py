@@ -0,0 +1,221 @@
+"""Compact binary wire format of the trades and bars written to Kafka.
+
+Binary messages start with a two byte header: a magic byte, so they can be
+told apart from JSON messages, and the id of the schema of the payload.
+Timestamps are sent as int64 epoch microseconds.
+
+- Trades use a fixed layout: side, price, volume and timestamp, followed by
+  the length-prefixed product id and exchange. Trade timestamps are Unix
+  milliseconds in memory.
+- Any other flat record (e.g. bars) is sent as a field count followed by
+  the length-prefixed name, a type tag and the value of every field.
+
+This module is shared by trade_producer, processing_trades and
+kafka_to_feature_store, and must be kept identical across the services.
+"""
+
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from quixstreams.models.serializers import (
+    Deserializer,
+    SerializationContext,
+    Serializer,
+)
+
+JSON = "json"
+BINARY = "binary"
+WIRE_FORMATS = (JSON, BINARY)
+
+MAGIC = 0xB1
+TRADE_SCHEMA_ID = 1
+RECORD_SCHEMA_ID = 2
+
+HEADER = struct.Struct("<BB")
+TRADE = struct.Struct("<bddq")
+LENGTH = struct.Struct("<B")
+STR_LENGTH = struct.Struct("<H")
+FLOAT = struct.Struct("<d")
+INT = struct.Struct("<q")
+
+TRADE_FIELDS = frozenset(
+    ("product_id", "side", "price", "volume", "timestamp", "exchange")
+)
+# Fields that may hold ISO timestamps, sent as int64 epoch microseconds
+TIMESTAMP_FIELDS = frozenset(("timestamp", "start_time", "end_time"))
+
+SIDE_TO_CODE = {"buy": 1, "sell": -1}
+CODE_TO_SIDE = {code: side for side, code in SIDE_TO_CODE.items()}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def iso_to_us(iso_str: str) -> int:
+    """Convert an ISO timestamp (UTC if naive) to epoch microseconds."""
+    dt = datetime.fromisoformat(iso_str.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // ONE_MICROSECOND
+
+
+def us_to_iso(ts: int) -> str:
+    """Convert epoch microseconds to an ISO timestamp in UTC."""
+    return (EPOCH + timedelta(microseconds=ts)).strftime(
+        "%Y-%m-%dT%H:%M:%S.%fZ"
+    )
+
+
+def _pack_str(value: str, length: struct.Struct = LENGTH) -> bytes:
+    encoded = value.encode("utf-8")
+    return length.pack(len(encoded)) + encoded
+
+
+def _unpack_str(
+    data: bytes, offset: int, length: struct.Struct = LENGTH
+) -> tuple[str, int]:
+    (size,) = length.unpack_from(data, offset)
+    offset += length.size
+    return data[offset : offset + size].decode("utf-8"), offset + size
+
+
+def pack_trade(
+    product_id: str,
+    side: str,
+    price: float,
+    volume: float,
+    timestamp: int,
+    exchange: str,
+) -> bytes:
+    """Encode the fields of a trade with the fixed trade layout."""
+    return b"".join(
+        (
+            HEADER.pack(MAGIC, TRADE_SCHEMA_ID),
+            TRADE.pack(SIDE_TO_CODE[side], price, volume, timestamp * 1000),
+            _pack_str(product_id),
+            _pack_str(exchange),
+        )
+    )
+
+
+def encode_trade(trade: dict[str, Any]) -> bytes:
+    """Encode a trade with the fixed trade layout."""
+    return pack_trade(**trade)
+
+
+def decode_trade(data: bytes) -> dict[str, Any]:
+    """Decode a trade encoded with `encode_trade`."""
+    side, price, volume, ts = TRADE.unpack_from(data, HEADER.size)
+    product_id, offset = _unpack_str(data, HEADER.size + TRADE.size)
+    exchange, _ = _unpack_str(data, offset)
+    return {
+        "product_id": product_id,
+        "side": CODE_TO_SIDE[side],
+        "price": price,
+        "volume": volume,
+        "timestamp": ts // 1000,
+        "exchange": exchange,
+    }
+
+
+def encode_record(record: dict[str, Any]) -> bytes:
+    """Encode a flat record of numbers, strings, booleans and None."""
+    parts = [HEADER.pack(MAGIC, RECORD_SCHEMA_ID), LENGTH.pack(len(record))]
+    for name, value in record.items():
+        parts.append(_pack_str(name))
+        if value is None:
+            parts.append(b"n")
+        elif isinstance(value, bool):
+            parts.append(b"?" + LENGTH.pack(value))
+        elif isinstance(value, int):
+            parts.append(b"q" + INT.pack(value))
+        elif isinstance(value, float):
+            parts.append(b"d" + FLOAT.pack(value))
+        elif name in TIMESTAMP_FIELDS and isinstance(value, str):
+            parts.append(b"t" + INT.pack(iso_to_us(value)))
+        elif isinstance(value, str):
+            parts.append(b"s" + _pack_str(value, STR_LENGTH))
+        else:
+            raise TypeError(
+                f"Unsupported type {type(value).__name__} of field {name}"
+            )
+    return b"".join(parts)
+
+
+def decode_record(data: bytes) -> dict[str, Any]:
+    """Decode a record encoded with `encode_record`."""
+    (n_fields,) = LENGTH.unpack_from(data, HEADER.size)
+    offset = HEADER.size + LENGTH.size
+    record: dict[str, Any] = {}
+    for _ in range(n_fields):
+        name, offset = _unpack_str(data, offset)
+        tag = data[offset : offset + 1]
+        offset += 1
+        if tag == b"n":
+            record[name] = None
+        elif tag == b"?":
+            record[name] = bool(data[offset])
+            offset += LENGTH.size
+        elif tag == b"q":
+            (record[name],) = INT.unpack_from(data, offset)
+            offset += INT.size
+        elif tag == b"d":
+            (record[name],) = FLOAT.unpack_from(data, offset)
+            offset += FLOAT.size
+        elif tag == b"t":
+            (ts,) = INT.unpack_from(data, offset)
+            record[name] = us_to_iso(ts)
+            offset += INT.size
+        elif tag == b"s":
+            record[name], offset = _unpack_str(data, offset, STR_LENGTH)
+        else:
+            raise ValueError(f"Unknown type tag {tag!r} of field {name}")
+    return record
+
+
+def encode(value: dict[str, Any]) -> bytes:
+    """Encode a trade or a flat record with the binary wire format."""
+    if value.keys() == TRADE_FIELDS:
+        return encode_trade(value)
+    return encode_record(value)
+
+
+def decode(data: bytes) -> dict[str, Any]:
+    """Decode a binary or JSON message."""
+    if not data or data[0] != MAGIC:
+        return json.loads(data)
+    schema_id = data[1]
+    if schema_id == TRADE_SCHEMA_ID:
+        return decode_trade(data)
+    if schema_id == RECORD_SCHEMA_ID:
+        return decode_record(data)
+    raise ValueError(f"Unknown wire schema id: {schema_id}")
+
+
+class BinarySerializer(Serializer):
+    """Quixstreams serializer of the binary wire format."""
+
+    def __call__(self, value: Any, ctx: SerializationContext) -> bytes:
+        """Serialize a trade or a bar."""
+        return encode(value)
+
+
+class WireDeserializer(Deserializer):
+    """Quixstreams deserializer of both binary and JSON messages.
+
+    Consumers accept both formats, so producers can switch format without
+    coordinating a restart of every downstream service.
+    """
+
+    def __call__(self, value: bytes, ctx: SerializationContext) -> Any:
+        """Deserialize a trade or a bar."""
+        return decode(value)
+
+
+def get_serializer(wire_format: str) -> str | Serializer:
+    """Return the quixstreams value serializer of a wire format."""
+    if wire_format == BINARY:
+        return BinarySerializer()
+    return JSON
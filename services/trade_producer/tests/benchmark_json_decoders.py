@@ -0,0 +1,65 @@
+"""Benchmark of the JSON backends decoding the websocket messages.
+
+Replays Kraken websocket messages through
+`KrakenWebsocketTradeAPI.get_trades` with each installed JSON backend and
+reports the per-message latency of decoding the message into trades.
+
+Messages are read from a file with one recorded message per line, or
+synthetic messages are used if no file is given.
+
+Usage: PYTHONPATH=src python -m tests.benchmark_json_decoders
+    [recorded_messages_file]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from api.kraken.websocket import KrakenWebsocketTradeAPI
+from tests.benchmark_trades import ReplayWebsocket, kraken_trade_messages
+from utils.json_decoder import JSON_BACKENDS, LOADERS
+
+
+def read_messages(path: str) -> list[str]:
+    """Read the messages of a file with one message per line."""
+    with open(path) as f:
+        return [line for line in f if line.strip()]
+
+
+async def benchmark(
+    json_backend: str, messages: list[str], n_rounds: int
+) -> list[float]:
+    """Return the latency in microseconds of each message."""
+    api = KrakenWebsocketTradeAPI(
+        product_ids=["BTC/USD"], channels=["trade"], json_backend=json_backend
+    )
+    api._ws = ReplayWebsocket(messages)
+    latencies = []
+    for _ in range(n_rounds * len(messages)):
+        start = time.perf_counter()
+        await api.get_trades()
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        messages = read_messages(sys.argv[1])
+    else:
+        messages = kraken_trade_messages(trades_per_message=100, n_distinct=50)
+    n_rounds = max(1, 20_000 // len(messages))
+
+    for json_backend in JSON_BACKENDS[1:]:
+        try:
+            LOADERS[json_backend]()
+        except ImportError:
+            print(f"{json_backend:>8}: not installed")
+            continue
+        latencies = asyncio.run(benchmark(json_backend, messages, n_rounds))
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"{json_backend:>8}: p50={quantiles[49]:.1f}us"
+            f" p99={quantiles[98]:.1f}us"
+            f" mean={statistics.fmean(latencies):.1f}us per message"
+        )
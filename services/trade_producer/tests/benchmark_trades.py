@@ -0,0 +1,91 @@
+"""Benchmark of the producer hot path.
+
+Measures the trades per second going through
+`KrakenWebsocketTradeAPI.get_trades` and the trade serialization, replaying
+synthetic Kraken websocket messages without a network connection or a Kafka
+broker.
+
+Usage: PYTHONPATH=src python -m tests.benchmark_trades [trades_per_message]
+    [n_messages]
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+from api.kraken.websocket import KrakenWebsocketTradeAPI
+from api.trade import get_trade_serializer
+from utils.timestamps import ts_to_date
+from utils.wire_format import WIRE_FORMATS
+
+
+class ReplayWebsocket:
+    """Websocket replaying the same messages forever."""
+
+    def __init__(self, messages: list[str]) -> None:
+        """Initialize the websocket with the messages to replay."""
+        self._messages = itertools.cycle(messages)
+
+    async def recv(self) -> str:
+        """Return the next message."""
+        return next(self._messages)
+
+
+def kraken_trade_messages(
+    trades_per_message: int, n_distinct: int = 10
+) -> list[str]:
+    """Build Kraken websocket v2 trade messages."""
+    ts = 1_700_000_000_000
+    messages = []
+    for _ in range(n_distinct):
+        data = []
+        for _ in range(trades_per_message):
+            ts += random.randint(0, 50)
+            data.append(
+                {
+                    "symbol": "BTC/USD",
+                    "side": random.choice(("buy", "sell")),
+                    "price": round(60_000 + random.random() * 100, 1),
+                    "qty": round(random.random(), 8),
+                    "ord_type": "market",
+                    "trade_id": ts,
+                    "timestamp": ts_to_date(ts),
+                }
+            )
+        messages.append(
+            json.dumps({"channel": "trade", "type": "update", "data": data})
+        )
+    return messages
+
+
+async def benchmark(
+    wire_format: str, trades_per_message: int, n_messages: int
+) -> float:
+    """Return the trades per second read and serialized."""
+    api = KrakenWebsocketTradeAPI(product_ids=["BTC/USD"], channels=["trade"])
+    api._ws = ReplayWebsocket(kraken_trade_messages(trades_per_message))
+    serialize_trade = get_trade_serializer(wire_format)
+
+    n_trades = 0
+    start = time.perf_counter()
+    for _ in range(n_messages):
+        for trade in await api.get_trades():
+            serialize_trade(trade)
+            n_trades += 1
+    return n_trades / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    trades_per_message = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_messages = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    for wire_format in WIRE_FORMATS:
+        trades_per_sec = asyncio.run(
+            benchmark(wire_format, trades_per_message, n_messages)
+        )
+        print(
+            f"{wire_format:>6}: {trades_per_sec:,.0f} trades/s"
+            f" ({trades_per_message} trades per message)"
+        )
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from api import base_websocket
+from api.base_websocket import BaseExchangeWebSocket
+from api.trade import Trade
+
+
+def make_trade(trade_id: int | None, product_id: str = "BTC/USD") -> Trade:
+    """Return a trade, identical to the others but for its id."""
+    return Trade(product_id, "buy", 100.0, 1.0, 1_000, "Kraken", trade_id)
+
+
+class FakeWebSocket(BaseExchangeWebSocket):
+    """Websocket replaying batches of trades, failing on None."""
+
+    def __init__(self, batches: list, backfill: list[Trade]) -> None:
+        """Initialize the websocket with the batches to receive."""
+        super().__init__("wss://fake", ["BTC/USD", "ETH/USD"], ["trade"])
+        self.batches = iter(batches)
+        self.backfill = backfill
+
+    @property
+    def name(self) -> str:
+        """Return the name of the exchange."""
+        return "Kraken"
+
+    async def connect(self, url: str) -> None:
+        """Connect without any network."""
+
+    async def get_trades(self) -> list[Trade]:  # type: ignore[override]
+        """Return the next batch of trades."""
+        batch = next(self.batches)
+        if batch is None:
+            raise ConnectionError("connection dropped")
+        return batch
+
+    async def backfill_gap(self) -> list[Trade]:
+        """Return the trades of the gap."""
+        return self.backfill
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Reconnect without waiting."""
+    monkeypatch.setattr(base_websocket.random, "uniform", lambda a, b: 0)
+
+
+def trade_ids(trades: list[Trade]) -> list[int | None]:
+    """Return the ids of the trades."""
+    return [trade.trade_id for trade in trades]
+
+
+def run(ws: FakeWebSocket, n_batches: int) -> list[list[Trade]]:
+    """Return the trades of the first runs of the websocket."""
+
+    async def main():
+        return [await ws.run() for _ in range(n_batches)]
+
+    return asyncio.run(main())
+
+
+def test_identical_fills_are_kept():
+    """Distinct trades with the same fields are all produced."""
+    ws = FakeWebSocket([[make_trade(1), make_trade(2), make_trade(3)]], [])
+
+    assert trade_ids(run(ws, 1)[0]) == [1, 2, 3]
+
+
+def test_overlap_of_backfill_and_live_feed_is_dropped():
+    """Trades seen before the reconnection are not produced twice."""
+    ws = FakeWebSocket(
+        [
+            [make_trade(1), make_trade(2)],
+            None,
+            # The live feed resumes with trades of the backfill
+            [make_trade(4), make_trade(5), make_trade(6)],
+            [make_trade(6), make_trade(7)],
+        ],
+        backfill=[make_trade(2), make_trade(3), make_trade(4), make_trade(5)],
+    )
+
+    live, backfill, resumed, later = map(trade_ids, run(ws, 4))
+
+    assert live == [1, 2]
+    assert backfill == [3, 4, 5]
+    assert resumed == [6]
+    # Only the first live trades after the reconnection are deduplicated
+    assert later == [6, 7]
+
+
+def test_products_are_deduplicated_until_their_first_live_trades():
+    """Products without live trades yet are still deduplicated."""
+    eth = "ETH/USD"
+    ws = FakeWebSocket(
+        [
+            [make_trade(1), make_trade(10, eth)],
+            None,
+            [make_trade(2)],
+            [make_trade(10, eth), make_trade(11, eth), make_trade(3)],
+        ],
+        backfill=[],
+    )
+
+    *_, resumed, later = map(trade_ids, run(ws, 4))
+
+    assert resumed == [2]
+    assert later == [11, 3]
+
+
+def test_trades_without_id_are_kept():
+    """Trades of exchanges without trade ids are never dropped."""
+    ws = FakeWebSocket(
+        [[make_trade(None)], None, [make_trade(None)]],
+        backfill=[make_trade(None)],
+    )
+
+    assert list(map(trade_ids, run(ws, 3))) == [[None], [None], [None]]
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from tests import benchmark_json_decoders, benchmark_trades
+from utils.wire_format import WIRE_FORMATS
+
+
+@pytest.mark.parametrize("wire_format", WIRE_FORMATS)
+def test_trades_benchmark_runs(wire_format):
+    """The producer hot path benchmark runs on a few messages."""
+    trades_per_sec = asyncio.run(benchmark_trades.benchmark(wire_format, 5, 3))
+
+    assert trades_per_sec > 0
+
+
+def test_json_decoders_benchmark_runs():
+    """The JSON decoding benchmark times every replayed message."""
+    messages = benchmark_trades.kraken_trade_messages(5, n_distinct=2)
+
+    latencies = asyncio.run(
+        benchmark_json_decoders.benchmark("json", messages, n_rounds=2)
+    )
+
+    assert len(latencies) == 4
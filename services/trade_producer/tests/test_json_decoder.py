@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from utils import json_decoder
+from utils.json_decoder import get_json_loads
+
+
+def missing_backend():
+    """Fail as a backend that is not installed."""
+    raise ImportError("No module named 'fast_json'")
+
+
+def test_unknown_backend_raises():
+    """Only the supported backends are accepted."""
+    with pytest.raises(ValueError, match="Unsupported JSON backend"):
+        get_json_loads("simdjson")
+
+
+def test_json_backend_is_the_standard_library():
+    """The json backend decodes with the standard library."""
+    assert get_json_loads("json") is json.loads
+
+
+def test_auto_falls_back_to_the_next_installed_backend(monkeypatch):
+    """Backends that are not installed are skipped, in order."""
+    monkeypatch.setitem(json_decoder.LOADERS, "msgspec", missing_backend)
+    monkeypatch.setitem(json_decoder.LOADERS, "orjson", lambda: "orjson")
+
+    assert get_json_loads() == "orjson"
+
+
+def test_auto_falls_back_to_the_standard_library(monkeypatch):
+    """Without msgspec and orjson, frames are decoded with json."""
+    monkeypatch.setitem(json_decoder.LOADERS, "msgspec", missing_backend)
+    monkeypatch.setitem(json_decoder.LOADERS, "orjson", missing_backend)
+
+    loads = get_json_loads()
+
+    assert loads is json.loads
+    assert loads(b'{"channel": "heartbeat"}') == {"channel": "heartbeat"}
+
+
+def test_explicit_backend_that_is_not_installed_raises(monkeypatch):
+    """An explicit backend is never replaced by another one."""
+    monkeypatch.setitem(json_decoder.LOADERS, "orjson", missing_backend)
+
+    with pytest.raises(ImportError):
+        get_json_loads("orjson")
+
+
+def test_no_backend_available_raises(monkeypatch):
+    """Auto fails if no backend at all can be imported."""
+    for name in list(json_decoder.LOADERS):
+        monkeypatch.setitem(json_decoder.LOADERS, name, missing_backend)
+
+    with pytest.raises(RuntimeError, match="No JSON backend"):
+        get_json_loads()
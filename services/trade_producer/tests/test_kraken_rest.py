@@ -0,0 +1,90 @@
+import asyncio
+
+from api.kraken.rest import KrakenRestAPI
+from api.trade import Trade
+from utils.trade_cache import DAY_MS
+
+PRODUCT = "BTC/USD"
+# Midnight UTC of 2024-06-10
+DAY = 19_884 * DAY_MS
+
+
+def kraken_trade(timestamp: int, trade_id: int) -> list:
+    """Return a trade as listed by the Kraken Trades endpoint."""
+    return ["100.0", "1.0", timestamp / 1000, "b", "l", "", trade_id]
+
+
+def make_trade(timestamp: int, trade_id: int) -> Trade:
+    """Return the trade parsed from `kraken_trade`."""
+    return Trade(PRODUCT, "buy", 100.0, 1.0, timestamp, "Kraken", trade_id)
+
+
+def make_api(tmp_path) -> KrakenRestAPI:
+    """Return a client of the day, caching the trades."""
+    return KrakenRestAPI(
+        PRODUCT,
+        cache_dir=str(tmp_path / "cache"),
+        from_ms=DAY,
+        to_ms=DAY + DAY_MS,
+    )
+
+
+def test_page_is_downloaded_and_cached(tmp_path):
+    """Downloaded pages end at the last millisecond and are cached."""
+    api = make_api(tmp_path)
+    response = [kraken_trade(DAY + s * 1000, s) for s in range(4)]
+
+    async def get(params):
+        assert params["since"] == DAY * 1_000_000
+        return {"result": {PRODUCT: response}}
+
+    api.get = get
+    trades, next_ms = asyncio.run(api._get_page(DAY))
+
+    # The trades of the last millisecond are left to the next page
+    assert next_ms == DAY + 3000
+    assert trades == [make_trade(DAY + s * 1000, s) for s in range(3)]
+    assert api.cache.coverage(api.name, PRODUCT) == [[DAY, DAY + 3000]]
+    assert api.cache.read(api.name, PRODUCT, DAY, DAY + 3000) == trades
+
+
+def test_page_cached_while_downloading_is_not_written_twice(tmp_path):
+    """A range cached by another shard during the request is read back."""
+    api = make_api(tmp_path)
+    response = [kraken_trade(DAY + s * 1000, s) for s in range(4)]
+    cached = [make_trade(DAY, 0), make_trade(DAY + 1000, 1)]
+
+    async def get(params):
+        # Another shard caches the start of the page meanwhile
+        api.cache.write(api.name, PRODUCT, cached, DAY, DAY + 1500)
+        return {"result": {PRODUCT: response}}
+
+    api.get = get
+    trades, next_ms = asyncio.run(api._get_page(DAY))
+
+    assert (trades, next_ms) == (cached, DAY + 1500)
+    assert api.downloaded_trades == 0
+    assert api.cache.read(api.name, PRODUCT, DAY, DAY + DAY_MS) == cached
+
+
+def test_page_is_clipped_to_the_range_still_missing(tmp_path):
+    """Only the start of the page not cached meanwhile is written."""
+    api = make_api(tmp_path)
+    response = [kraken_trade(DAY + s * 1000, s) for s in range(4)]
+    cached = [make_trade(DAY + 2000, 2)]
+
+    async def get(params):
+        # Another shard caches the end of the page meanwhile
+        api.cache.write(api.name, PRODUCT, cached, DAY + 2000, DAY + 5000)
+        return {"result": {PRODUCT: response}}
+
+    api.get = get
+    trades, next_ms = asyncio.run(api._get_page(DAY))
+
+    assert next_ms == DAY + 2000
+    assert trades == [make_trade(DAY, 0), make_trade(DAY + 1000, 1)]
+    assert api.cache.coverage(api.name, PRODUCT) == [[DAY, DAY + 5000]]
+    assert api.cache.read(api.name, PRODUCT, DAY, DAY + 5000) == [
+        *trades,
+        *cached,
+    ]
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from utils import rate_limiter
+from utils.rate_limiter import CallCounterRateLimiter
+
+
+class FakeClock:
+    """Clock advanced by the sleeps of the rate limiter only."""
+
+    def __init__(self) -> None:
+        """Start the clock, without any sleep."""
+        self.now = 1_000.0
+        self.sleeps: list[float] = []
+
+    def time(self) -> float:
+        """Return the current time."""
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        """Advance the clock instead of waiting."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    """Run the rate limiter on a fake clock."""
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "time", clock.time)
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+def acquire(limiter: CallCounterRateLimiter, *costs: float) -> None:
+    """Acquire the costs one after the other."""
+
+    async def main():
+        for cost in costs:
+            await limiter.acquire(cost)
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("max_counter, decay_per_sec", [(0, 1), (15, 0)])
+def test_invalid_limits_raise(max_counter, decay_per_sec):
+    """The max counter and its decay must be positive."""
+    with pytest.raises(ValueError, match="must be > 0"):
+        CallCounterRateLimiter(max_counter, decay_per_sec)
+
+
+def test_requests_up_to_the_max_counter_do_not_wait(clock):
+    """Requests are sent at once until the counter reaches its max."""
+    limiter = CallCounterRateLimiter(max_counter=3, decay_per_sec=0.5)
+
+    acquire(limiter, 1, 1, 1)
+
+    assert clock.sleeps == []
+
+
+def test_requests_wait_for_the_counter_to_decay(clock):
+    """A request above the max waits until the counter decayed enough."""
+    limiter = CallCounterRateLimiter(max_counter=3, decay_per_sec=0.5)
+
+    acquire(limiter, 1, 1, 1, 1, 2)
+
+    # 1 / 0.5 seconds for the 4th request, then 2 / 0.5 for the 5th
+    assert clock.sleeps == [2.0, 4.0]
+
+
+def test_counter_decays_between_requests(clock):
+    """Time spent without requests makes room for new ones."""
+    limiter = CallCounterRateLimiter(max_counter=3, decay_per_sec=0.5)
+    acquire(limiter, 3)
+
+    clock.now += 4
+    acquire(limiter, 2)
+
+    assert clock.sleeps == []
+
+
+def test_lock_file_shares_the_counter(clock, tmp_path):
+    """Rate limiters with the same lock file share their counter."""
+    lock_file = str(tmp_path / "kraken.lock")
+    first = CallCounterRateLimiter(3, 0.5, lock_file=lock_file)
+    second = CallCounterRateLimiter(3, 0.5, lock_file=lock_file)
+
+    acquire(first, 1, 1)
+    acquire(second, 1, 1)
+
+    assert clock.sleeps == [2.0]
+    # Separate counters would not have waited
+    acquire(CallCounterRateLimiter(3, 0.5), 1, 1)
+    assert clock.sleeps == [2.0]
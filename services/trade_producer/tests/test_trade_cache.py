@@ -0,0 +1,134 @@
+import pyarrow as pa
+import pytest
+
+from api.trade import Trade
+from utils.trade_cache import (
+    DAY_MS,
+    TRADE_SCHEMA,
+    TradeCache,
+    drop_duplicate_trades,
+)
+
+EXCHANGE = "Kraken"
+PRODUCT = "BTC/USD"
+# Midnight UTC of 2024-06-10
+DAY = 19_884 * DAY_MS
+
+
+def make_trade(timestamp: int, trade_id: int, price: float = 100.0) -> Trade:
+    """Return a trade of the cached product."""
+    return Trade(PRODUCT, "buy", price, 1.0, timestamp, EXCHANGE, trade_id)
+
+
+@pytest.fixture
+def cache(tmp_path) -> TradeCache:
+    """Return an empty cache."""
+    return TradeCache(str(tmp_path / "cache"))
+
+
+def test_coverage_merges_adjacent_and_overlapping_ranges(cache):
+    """Written ranges are merged into disjoint, sorted ranges."""
+    cache.write(EXCHANGE, PRODUCT, [], 300, 400)
+    cache.write(EXCHANGE, PRODUCT, [], 100, 200)
+    cache.write(EXCHANGE, PRODUCT, [], 200, 250)
+    cache.write(EXCHANGE, PRODUCT, [], 350, 500)
+
+    assert cache.coverage(EXCHANGE, PRODUCT) == [[100, 250], [300, 500]]
+
+
+def test_empty_ranges_are_not_covered(cache):
+    """Ranges ending at or before their start are ignored."""
+    cache.write(EXCHANGE, PRODUCT, [], 100, 100)
+
+    assert cache.coverage(EXCHANGE, PRODUCT) == []
+
+
+def test_coverage_is_kept_across_instances(cache):
+    """The coverage index is read back from the cache directory."""
+    cache.write(EXCHANGE, PRODUCT, [], 100, 200)
+
+    reopened = TradeCache(str(cache.cache_dir))
+
+    assert reopened.coverage(EXCHANGE, PRODUCT) == [[100, 200]]
+    assert reopened.coverage(EXCHANGE, "ETH/USD") == []
+
+
+def test_covered_until(cache):
+    """Only timestamps inside a covered range are covered."""
+    cache.write(EXCHANGE, PRODUCT, [], 100, 200)
+    cache.write(EXCHANGE, PRODUCT, [], 300, 400)
+
+    assert cache.covered_until(EXCHANGE, PRODUCT, 100) == 200
+    assert cache.covered_until(EXCHANGE, PRODUCT, 199) == 200
+    assert cache.covered_until(EXCHANGE, PRODUCT, 200) is None
+    assert cache.covered_until(EXCHANGE, PRODUCT, 99) is None
+    assert cache.covered_until(EXCHANGE, PRODUCT, 350) == 400
+
+
+@pytest.mark.parametrize(
+    "from_ms, to_ms, missing",
+    [
+        (0, 1000, [(0, 100), (200, 300), (400, 1000)]),
+        (100, 400, [(200, 300)]),
+        (150, 350, [(200, 300)]),
+        (100, 200, []),
+        (120, 180, []),
+        (200, 300, [(200, 300)]),
+        (500, 600, [(500, 600)]),
+        (0, 50, [(0, 50)]),
+    ],
+)
+def test_missing_ranges(cache, from_ms, to_ms, missing):
+    """The gaps of the coverage within the range are missing."""
+    cache.write(EXCHANGE, PRODUCT, [], 100, 200)
+    cache.write(EXCHANGE, PRODUCT, [], 300, 400)
+
+    assert cache.missing_ranges(EXCHANGE, PRODUCT, from_ms, to_ms) == missing
+
+
+def test_write_and_read_across_days(cache):
+    """Trades are partitioned by day and read back in order, with their id."""
+    trades = [
+        make_trade(DAY - 10, 1),
+        make_trade(DAY + 5, 2),
+        make_trade(DAY + DAY_MS + 1, 3),
+    ]
+    cache.write(EXCHANGE, PRODUCT, trades, DAY - 100, DAY + 2 * DAY_MS)
+
+    product_dir = cache._product_dir(EXCHANGE, PRODUCT)
+    day_dirs = sorted(day_dir.name for day_dir in product_dir.glob("date=*"))
+    assert day_dirs == ["date=2024-06-09", "date=2024-06-10", "date=2024-06-11"]
+    assert cache.read(EXCHANGE, PRODUCT, DAY - 100, DAY + 2 * DAY_MS) == trades
+    assert cache.read(EXCHANGE, PRODUCT, DAY, DAY + DAY_MS) == [trades[1]]
+
+
+def test_compact_merges_pages_and_drops_duplicates(cache):
+    """Pages written over the same range are merged without duplicates."""
+    first = [make_trade(DAY + 1, 1), make_trade(DAY + 2, 2)]
+    overlap = [make_trade(DAY + 2, 2), make_trade(DAY + 3, 3)]
+    cache.write(EXCHANGE, PRODUCT, first, DAY, DAY + 3)
+    cache.write(EXCHANGE, PRODUCT, overlap, DAY + 2, DAY + 4)
+
+    assert cache.compact(EXCHANGE, PRODUCT) == 2
+
+    day_dir = cache._product_dir(EXCHANGE, PRODUCT) / "date=2024-06-10"
+    assert len(list(day_dir.glob("*.parquet"))) == 1
+    assert cache.read(EXCHANGE, PRODUCT, DAY, DAY + 4) == [
+        make_trade(DAY + 1, 1),
+        make_trade(DAY + 2, 2),
+        make_trade(DAY + 3, 3),
+    ]
+    # Nothing left to compact
+    assert cache.compact(EXCHANGE, PRODUCT) == 0
+
+
+def test_identical_fills_are_not_duplicates():
+    """Distinct trades with the same fields but their id are all kept."""
+    trades = [make_trade(DAY, 1), make_trade(DAY, 2), make_trade(DAY, 1)]
+    table = pa.Table.from_pylist(
+        [trade._asdict() for trade in trades], schema=TRADE_SCHEMA
+    )
+
+    deduped = drop_duplicate_trades(table)
+
+    assert deduped["trade_id"].to_pylist() == [1, 2]
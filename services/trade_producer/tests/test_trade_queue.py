@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from api.trade import Trade
+from utils.trade_queue import BLOCK, DROP_OLDEST, TradeQueue
+
+
+def make_trades(n: int, start: int = 0) -> list[Trade]:
+    """Return `n` trades with consecutive timestamps."""
+    return [
+        Trade("BTC/USD", "buy", 100.0, 1.0, ts, "Kraken", ts)
+        for ts in range(start, start + n)
+    ]
+
+
+def timestamps(batch: list) -> list[int]:
+    """Return the timestamps of a batch of received trades."""
+    return [trade.timestamp for trade, _ in batch]
+
+
+def test_unsupported_backpressure_policy_raises():
+    """Only the supported backpressure policies are accepted."""
+    with pytest.raises(ValueError, match="backpressure policy"):
+        TradeQueue(10, backpressure_policy="drop-newest")
+
+
+def test_batches_are_at_most_max_trades():
+    """Batches hold up to `max_trades` queued trades, in order."""
+
+    async def main():
+        queue = TradeQueue(10)
+        await queue.put(make_trades(5), "Kraken", received_at=1.5)
+        return [await queue.get_batch(2) for _ in range(3)]
+
+    batches = asyncio.run(main())
+
+    assert [timestamps(batch) for batch in batches] == [[0, 1], [2, 3], [4]]
+    assert {received_at for _, received_at in batches[0]} == {1.5}
+
+
+def test_batch_waits_for_trades():
+    """An empty queue waits for the next trades instead of returning."""
+
+    async def main():
+        queue = TradeQueue(10)
+        batch = asyncio.create_task(queue.get_batch(10))
+        await asyncio.sleep(0)
+        assert not batch.done()
+        await queue.put(make_trades(2), "Kraken", received_at=0.0)
+        return await batch
+
+    assert timestamps(asyncio.run(main())) == [0, 1]
+
+
+def test_block_policy_waits_for_room():
+    """With the block policy, `put` waits until the producer catches up."""
+
+    async def main():
+        queue = TradeQueue(2, backpressure_policy=BLOCK)
+        put = asyncio.create_task(
+            queue.put(make_trades(3), "Kraken", received_at=0.0)
+        )
+        await asyncio.sleep(0)
+        assert not put.done()
+        first = await queue.get_batch(10)
+        await put
+        return first, await queue.get_batch(10)
+
+    first, second = asyncio.run(main())
+
+    assert timestamps(first) + timestamps(second) == [0, 1, 2]
+
+
+def test_drop_oldest_policy_keeps_the_newest_trades():
+    """With the drop-oldest policy, `put` never waits."""
+
+    async def main():
+        queue = TradeQueue(3, backpressure_policy=DROP_OLDEST)
+        await queue.put(make_trades(2), "Kraken", received_at=0.0)
+        await queue.put(make_trades(3, start=2), "Kraken", received_at=0.0)
+        return queue.qsize(), await queue.get_batch(10)
+
+    qsize, batch = asyncio.run(main())
+
+    assert qsize == 3
+    assert timestamps(batch) == [2, 3, 4]
+
+
+def test_close_returns_the_queued_trades_first():
+    """After closing, the queued trades are returned, then None."""
+
+    async def main():
+        queue = TradeQueue(10)
+        await queue.put(make_trades(3), "Kraken", received_at=0.0)
+        await queue.close()
+        return [await queue.get_batch(2) for _ in range(4)]
+
+    batches = asyncio.run(main())
+
+    assert timestamps(batches[0]) == [0, 1]
+    assert timestamps(batches[1]) == [2]
+    assert batches[2:] == [None, None]
+
+
+def test_close_of_an_empty_queue():
+    """Closing an empty queue ends the producer loop."""
+
+    async def main():
+        queue = TradeQueue(10)
+        await queue.close()
+        return await queue.get_batch(10), await queue.get_batch(10)
+
+    assert asyncio.run(main()) == (None, None)
@@ -0,0 +1,91 @@
+import json
+
+import pyarrow as pa
+import pytest
+
+from api.trade import (
+    Trade,
+    get_trade_serializer,
+    serialize_trade_columns,
+)
+from utils import wire_format
+from utils.wire_format import BINARY, JSON, decode, encode, iso_to_us, us_to_iso
+
+TRADE = {
+    "product_id": "BTC/USD",
+    "side": "sell",
+    "price": 64123.4,
+    "volume": 0.00125,
+    "timestamp": 1_718_000_000_123,
+    "exchange": "Kraken",
+}
+
+
+def test_trade_round_trip():
+    """Trades are encoded with the trade layout and decoded unchanged."""
+    data = encode(TRADE)
+
+    assert data[:2] == bytes((wire_format.MAGIC, wire_format.TRADE_SCHEMA_ID))
+    assert decode(data) == TRADE
+
+
+def test_record_round_trip():
+    """Flat records keep their fields, types and order."""
+    record = {
+        "product_id": "ETH/USD",
+        "open": 3500.5,
+        "n_trades": 42,
+        "is_complete": True,
+        "vwap": None,
+        "start_time": "2024-06-10T06:13:20.123456Z",
+    }
+
+    decoded = decode(encode(record))
+
+    assert decoded == record
+    assert list(decoded) == list(record)
+    assert isinstance(decoded["is_complete"], bool)
+
+
+def test_record_timestamps_are_sent_as_utc_microseconds():
+    """ISO timestamps of any offset are decoded in UTC."""
+    record = {"end_time": "2024-06-10T08:13:20.5+02:00"}
+
+    assert decode(encode(record)) == {"end_time": "2024-06-10T06:13:20.500000Z"}
+    assert us_to_iso(iso_to_us("2024-06-10T06:13:20")) == (
+        "2024-06-10T06:13:20.000000Z"
+    )
+
+
+def test_unsupported_record_field_raises():
+    """Fields that are not numbers, strings, booleans or None are refused."""
+    with pytest.raises(TypeError, match="prices"):
+        encode({"prices": [1.0, 2.0]})
+
+
+def test_json_messages_are_decoded():
+    """JSON messages pass through the decoder of the binary format."""
+    assert decode(json.dumps(TRADE).encode()) == TRADE
+
+
+def test_unknown_schema_id_raises():
+    """Binary messages of an unknown schema are refused."""
+    with pytest.raises(ValueError, match="schema id"):
+        decode(bytes((wire_format.MAGIC, 99)))
+
+
+@pytest.mark.parametrize("fmt", [JSON, BINARY])
+def test_trade_serializers_write_the_same_messages(fmt):
+    """Trades written per row or per column give the same messages."""
+    trades = [
+        Trade(**TRADE, trade_id=1),
+        Trade(**{**TRADE, "side": "buy", "price": 64124.0}, trade_id=2),
+    ]
+    table = pa.Table.from_pylist([trade._asdict() for trade in trades])
+    serialize = get_trade_serializer(fmt)
+
+    messages = [serialize(trade) for trade in trades]
+
+    assert serialize_trade_columns(table, fmt) == messages
+    # The trade id of the exchange is not written to Kafka
+    assert decode(messages[0]) == TRADE